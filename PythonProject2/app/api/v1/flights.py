@@ -1,230 +1,268 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Depends
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
 import json
 
+from app.core.cache import response_cache
 from app.core.database import get_db
+from app.core.pagination import encode_cursor, decode_cursor
 from app.models.flight import Flight
-from app.services.parser import TelegramParser
-from app.services.geo_service import GeoService
-from app.services.excel_parser import ExcelParser
-from app.services.shr_parser import SHRDataParser
-from app.schemas.flight import FlightCreate, FlightResponse, FlightStatistics
+from app.services.bulk_writer import ConflictPolicy
+from app.services.conflicts import find_day_conflicts, load_day_flights
+from app.services.heatmap import clear_tile_cache, get_tile, max_zoom, refresh_density
+from app.services.flight_list import list_flights, parse_fields
+from app.services.flight_statistics import flight_statistics
+from app.services.flight_search import MAX_RADIUS_KM, PointField, parse_bbox, parse_polygon, search_flights
+from app.services.ingest_jobs import IngestJobManager, get_job_manager
+from app.schemas.flight import (
+    DistanceGroup, DistanceStatistics, FlightConflictReport, FlightCreate, FlightPage, FlightResponse,
+    FlightStatistics, FlightSearchPage, HeatmapTile
+)
+from app.schemas.job import IngestJobStatus
 
 router = APIRouter()
 
 
-@router.post("/upload/shr", response_model=Dict[str, Any])
+@router.post("/upload/shr", response_model=IngestJobStatus, status_code=202)
 async def upload_shr_messages(
         file: UploadFile = File(...),
-        db: AsyncSession = Depends(get_db)
+        on_conflict: ConflictPolicy = Query(
+            ConflictPolicy.SKIP,
+            description="Поведение при совпадении SID с уже загруженным полетом"
+        ),
+        jobs: IngestJobManager = Depends(get_job_manager)
+):
+    """
+    Загрузка SHR телеграмм.
+    Файл ставится в очередь фоновой обработки, ход выполнения доступен по /jobs/{job_id}.
+    Повторно присланные SHR не прерывают загрузку, а обрабатываются согласно on_conflict.
+    """
+    return await jobs.submit("shr", file, {
+        "content_type": file.content_type,
+        "on_conflict": on_conflict.value
+    })
+
+
+@router.post("/upload/excel", response_model=IngestJobStatus, status_code=202)
+async def upload_excel_file(
+        file: UploadFile = File(...),
+        jobs: IngestJobManager = Depends(get_job_manager)
 ):
-    """Загрузка и обработка SHR телеграмм"""
-    content = await file.read()
-    content_str = content.decode('utf-8')
+    """Загрузка Excel файла с полетными данными в очередь фоновой обработки"""
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(400, "Требуется Excel файл")
 
-    parser = TelegramParser()
-    shr_parser = SHRDataParser()
-    geo_service = GeoService()
+    return await jobs.submit("excel", file, {})
 
-    processed = 0
-    errors = []
 
-    # Определяем формат файла
-    if file.content_type == "application/json":
+@router.get("/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_ingest_job(
+        job_id: str,
+        jobs: IngestJobManager = Depends(get_job_manager)
+):
+    """Состояние фоновой задачи загрузки"""
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Задача не найдена")
+
+    return job
+
+
+@router.get("", response_model=FlightPage)
+async def get_flights(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        fields: Optional[str] = Query(
+            None, description="Поля через запятую (по умолчанию - без raw_shr, raw_dep, raw_arr)"
+        ),
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Список полетов за период в порядке даты полета.
+    Постраничный вывод по курсору (keyset по flight_date и id): следующая страница
+    запрашивается с cursor=next_cursor и не зависит от глубины.
+    """
+    try:
+        names = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    after = None
+    if cursor:
+        flight_date, flight_id = decode_cursor(cursor, 2)
+        if not isinstance(flight_id, int) or not (flight_date is None or isinstance(flight_date, str)):
+            raise HTTPException(400, "Некорректный курсор")
         try:
-            data = json.loads(content_str)
-            # Обработка JSON формата
-            messages = data if isinstance(data, list) else [data]
-        except:
-            messages = content_str.split('\n')
-    else:
-        # Проверяем, это табличный формат или обычные телеграммы
-        if '\t' in content_str and any(center in content_str for center in
-                                       ['Санкт-Петербургский', 'Ростовский', 'Московский']):
-            # Табличный формат из документа
-            flights_data = shr_parser.parse_shr_document(content_str)
-
-            for flight_data in flights_data:
-                try:
-                    # Геопривязка
-                    dep_region = None
-                    arr_region = None
-
-                    if flight_data.get('dep_coords'):
-                        coords = flight_data['dep_coords']
-                        if isinstance(coords, tuple):
-                            dep_region = geo_service.get_region_by_coordinates(coords[0], coords[1])
-
-                    if flight_data.get('arr_coords'):
-                        coords = flight_data['arr_coords']
-                        if isinstance(coords, tuple):
-                            arr_region = geo_service.get_region_by_coordinates(coords[0], coords[1])
-
-                    # Создание записи в БД
-                    flight = Flight(
-                        sid=flight_data.get('sid'),
-                        flight_date=flight_data.get('date'),
-                        dep_time=flight_data.get('dep_time'),
-                        arr_time=flight_data.get('arr_time'),
-                        dep_coords=str(flight_data['dep_coords']) if flight_data.get('dep_coords') else None,
-                        arr_coords=str(flight_data['arr_coords']) if flight_data.get('arr_coords') else None,
-                        dep_region=dep_region,
-                        arr_region=arr_region,
-                        operator=flight_data.get('operator'),
-                        uav_type=flight_data.get('uav_type'),
-                        uav_reg=flight_data.get('registration'),
-                        duration_minutes=flight_data.get('duration_minutes'),
-                        center_name=flight_data.get('center_name'),
-                        raw_shr=flight_data.get('raw_shr'),
-                        raw_dep=flight_data.get('raw_dep'),
-                        raw_arr=flight_data.get('raw_arr'),
-                        altitude_min=flight_data.get('altitude', {}).get('min') if flight_data.get(
-                            'altitude') else None,
-                        altitude_max=flight_data.get('altitude', {}).get('max') if flight_data.get('altitude') else None
-                    )
-
-                    db.add(flight)
-                    processed += 1
-
-                except Exception as e:
-                    errors.append(f"Ошибка обработки записи: {str(e)}")
-        else:
-            # Обычные SHR телеграммы
-            messages = content_str.split('\n')
-
-            for msg in messages:
-                if 'SHR-' in msg:
-                    try:
-                        parsed = parser.parse_shr_message(msg)
-
-                        # Геопривязка
-                        if parsed['dep_coords']:
-                            dep_region = geo_service.get_region_by_coordinates(
-                                parsed['dep_coords'][0],
-                                parsed['dep_coords'][1]
-                            )
-                        else:
-                            dep_region = None
-
-                        if parsed['arr_coords']:
-                            arr_region = geo_service.get_region_by_coordinates(
-                                parsed['arr_coords'][0],
-                                parsed['arr_coords'][1]
-                            )
-                        else:
-                            arr_region = None
-
-                        flight = Flight(
-                            sid=parsed['sid'],
-                            flight_date=parsed['date'],
-                            dep_coords=str(parsed['dep_coords']) if parsed['dep_coords'] else None,
-                            arr_coords=str(parsed['arr_coords']) if parsed['arr_coords'] else None,
-                            dep_region=dep_region,
-                            arr_region=arr_region,
-                            operator=parsed['operator'],
-                            uav_type=parsed['uav_type'],
-                            uav_reg=parsed['registration'],
-                            raw_shr=msg,
-                            altitude_min=parsed.get('altitude', {}).get('min') if parsed.get('altitude') else None,
-                            altitude_max=parsed.get('altitude', {}).get('max') if parsed.get('altitude') else None
-                        )
-
-                        db.add(flight)
-                        processed += 1
-
-                    except Exception as e:
-                        errors.append(f"Ошибка обработки: {str(e)}")
+            after = (datetime.fromisoformat(flight_date) if flight_date else None, flight_id)
+        except ValueError:
+            raise HTTPException(400, "Некорректный курсор")
 
-    await db.commit()
+    items, last = await list_flights(db, names, start_date, end_date, after, limit)
 
     return {
-        "processed": processed,
-        "errors": errors[:10] if errors else [],  # Ограничиваем количество ошибок в ответе
-        "status": "success" if processed > 0 else "failed"
+        "items": items,
+        "next_cursor": encode_cursor([last[0].isoformat() if last[0] else None, last[1]]) if last else None
     }
 
 
-@router.post("/upload/excel", response_model=Dict[str, Any])
-async def upload_excel_file(
-        file: UploadFile = File(...),
+@router.get("/search/spatial", response_model=FlightSearchPage)
+async def search_flights_spatial(
+        point: PointField = Query(PointField.DEP, description="Точка поиска: dep - вылет, arr - посадка"),
+        bbox: Optional[str] = Query(None, description="Прямоугольник min_lon,min_lat,max_lon,max_lat"),
+        lat: Optional[float] = Query(None, ge=-90, le=90, description="Широта центра поиска по радиусу"),
+        lon: Optional[float] = Query(None, ge=-180, le=180, description="Долгота центра поиска по радиусу"),
+        radius_km: Optional[float] = Query(None, gt=0, le=MAX_RADIUS_KM, description="Радиус поиска, км"),
+        polygon: Optional[str] = Query(None, description="Полигон GeoJSON (Polygon/MultiPolygon в WGS 84)"),
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor"),
         db: AsyncSession = Depends(get_db)
 ):
-    """Загрузка и обработка Excel файла с полетными данными"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(400, "Требуется Excel файл")
+    """
+    Поиск полетов по точке вылета или посадки: в прямоугольнике, в радиусе от точки
+    или внутри полигона, с ограничением по датам. Фильтры объединяются по И.
+    Постраничный вывод по курсору: следующая страница запрашивается с cursor=next_cursor.
+    """
+    if radius_km is not None and (lat is None or lon is None):
+        raise HTTPException(400, "Для поиска по радиусу нужны lat и lon")
+    if bbox is None and radius_km is None and polygon is None:
+        raise HTTPException(400, "Нужен хотя бы один фильтр: bbox, radius_km или polygon")
 
-    # Сохранение временного файла
-    import tempfile
-    import os
+    try:
+        bbox_bounds = parse_bbox(bbox) if bbox else None
+        area = parse_polygon(polygon) if polygon else None
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    after_id = decode_cursor(cursor, 1)[0] if cursor else None
+    if after_id is not None and not isinstance(after_id, int):
+        raise HTTPException(400, "Некорректный курсор")
+
+    items, has_more = await search_flights(
+        db,
+        point=point,
+        bbox=bbox_bounds,
+        center=(lat, lon) if radius_km is not None else None,
+        radius_km=radius_km,
+        polygon=area,
+        date_from=date_from,
+        date_to=date_to,
+        after_id=after_id,
+        limit=limit
+    )
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    return {
+        "items": items,
+        "next_cursor": encode_cursor([items[-1]["id"]]) if has_more else None
+    }
 
-    try:
-        parser = ExcelParser()
-        flights_data = parser.parse_flight_data(tmp_path)
-
-        geo_service = GeoService()
-        processed = 0
-        errors = []
-
-        for flight_data in flights_data:
-            try:
-                # Геопривязка
-                dep_region = None
-                arr_region = None
-
-                if flight_data.get('dep_coords_parsed'):
-                    dep_region = geo_service.get_region_by_coordinates(
-                        flight_data['dep_coords_parsed'][0],
-                        flight_data['dep_coords_parsed'][1]
-                    )
-
-                if flight_data.get('arr_coords_parsed'):
-                    arr_region = geo_service.get_region_by_coordinates(
-                        flight_data['arr_coords_parsed'][0],
-                        flight_data['arr_coords_parsed'][1]
-                    )
-
-                # Создание записи в БД с полными данными
-                flight = Flight(
-                    flight_date=flight_data.get('date'),
-                    dep_time=flight_data.get('dep_time'),
-                    arr_time=flight_data.get('arr_time'),
-                    dep_coords=flight_data.get('dep_coords'),
-                    arr_coords=flight_data.get('arr_coords'),
-                    dep_region=dep_region,
-                    arr_region=arr_region,
-                    uav_type=flight_data.get('aircraft_type'),
-                    uav_reg=flight_data.get('aircraft'),
-                    duration_minutes=flight_data.get('duration_minutes'),
-                    operator=flight_data.get('operator'),
-                    operator_phone=flight_data.get('operator_phone'),
-                    flight_zone={"route": flight_data.get('route')} if flight_data.get('route') else None,
-                    status='arrived' if flight_data.get('arr_time') else 'scheduled'
-                )
-
-                db.add(flight)
-                processed += 1
-
-            except Exception as e:
-                errors.append(f"Ошибка обработки записи: {str(e)}")
-
-        await db.commit()
-
-    except Exception as e:
-        raise HTTPException(500, f"Ошибка обработки файла: {str(e)}")
-
-    finally:
-        os.unlink(tmp_path)
+
+@router.get("/conflicts", response_model=FlightConflictReport)
+async def get_flight_conflicts(
+        date: date = Query(..., description="День, за который ищутся конфликты"),
+        radius_km: Optional[float] = Query(None, gt=0, le=100, description="Радиус вокруг точек вылета и посадки, км"),
+        limit: int = Query(1000, ge=1, le=10000),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Пары полетов, пересекающихся за день по времени, диапазону высот
+    и области полета (зона из телеграммы и окрестности точек вылета и посадки)
+    """
+    flights = await load_day_flights(db, date)
+    conflicts = await run_in_threadpool(find_day_conflicts, flights, date, radius_km)
+    conflicts.sort(key=lambda conflict: conflict["start"])
 
     return {
-        "processed": processed,
-        "errors": errors[:10] if errors else [],
-        "status": "success" if processed > 0 else "failed"
+        "date": date.isoformat(),
+        "flights": len(flights),
+        "total": len(conflicts),
+        "conflicts": conflicts[:limit]
     }
+
+
+@router.get("/statistics", response_model=FlightStatistics)
+async def get_flight_statistics(
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        approximate: bool = Query(False, description="Оценка уникальных операторов и типов БВС по скетчам"),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Сводная статистика полетов за период (одним агрегатным запросом, см. flight_statistics).
+    Ответ кэшируется до загрузки полетов за период, одинаковые одновременные запросы
+    выполняют один запрос к БД (см. response_cache)
+    """
+    return await response_cache.get_or_compute(
+        "flights.statistics",
+        {"start_date": start_date, "end_date": end_date, "approximate": approximate},
+        lambda: flight_statistics(db, start_date, end_date, approximate),
+        start_date, end_date
+    )
+
+
+@router.get("/statistics/distance", response_model=List[DistanceStatistics])
+async def get_distance_statistics(
+        group_by: DistanceGroup = Query(DistanceGroup.REGION, description="Группировка: region, operator, uav_type"),
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        db: AsyncSession = Depends(get_db)
+):
+    """Суммарная и средняя протяженность полетов (distance_km) по регионам вылета, операторам или типам БВС"""
+    column = {
+        DistanceGroup.REGION: Flight.dep_region,
+        DistanceGroup.OPERATOR: Flight.operator,
+        DistanceGroup.UAV_TYPE: Flight.uav_type
+    }[group_by]
+
+    query = select(
+        column.label('group'),
+        func.count(Flight.distance_km).label('flights'),
+        func.sum(Flight.distance_km).label('total_distance_km'),
+        func.avg(Flight.distance_km).label('avg_distance_km')
+    ).where(Flight.distance_km.isnot(None)).group_by(column)
+
+    if date_from:
+        query = query.where(Flight.flight_date >= date_from)
+    if date_to:
+        query = query.where(Flight.flight_date < date_to + timedelta(days=1))
+
+    result = await db.execute(query.order_by(func.sum(Flight.distance_km).desc()).limit(limit))
+    return [dict(row._mapping) for row in result.all()]
+
+
+@router.get("/heatmap/{z}/{x}/{y}", response_model=HeatmapTile)
+async def get_heatmap_tile(
+        z: int,
+        x: int,
+        y: int,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Тайл тепловой карты вылетов (схема XYZ, Web Mercator): количество вылетов
+    по ячейкам сетки тайла за период. Тайлы собираются из предрассчитанных
+    сеток плотности, которые обновляются при загрузке полетов.
+    """
+    if not 0 <= z <= max_zoom():
+        raise HTTPException(400, f"Масштаб должен быть от 0 до {max_zoom()}")
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(400, "Тайл вне сетки масштаба")
+
+    return await get_tile(db, z, x, y, date_from, date_to)
+
+
+@router.post("/heatmap/rebuild")
+async def rebuild_heatmap(db: AsyncSession = Depends(get_db)):
+    """Полная перестройка сеток плотности по всем полетам"""
+    cells = await refresh_density(db)
+    await db.commit()
+    clear_tile_cache()
+    return {"cells": cells}
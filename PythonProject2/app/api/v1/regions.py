@@ -1,12 +1,20 @@
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
 from typing import List, Optional
 from datetime import date
 
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import response_cache
 from app.core.database import get_db
-from app.models.flight import Flight
-from app.schemas.region import RegionStatistics, RegionRating
+from app.schemas.region import (
+    RegionStatistics, RegionRating, GeoCacheStats, RegionAssignmentResult, FlightRegionsResult
+)
+from app.services.flight_regions import refresh_flight_regions
+from app.services.geo_service import GeoService, get_geo_service
+from app.services.region_assignment import assign_regions, ensure_region_boundaries, load_region_boundaries
+from app.services.region_statistics import region_rating, region_statistics
+from app.services.rollup import refresh_rollup
 
 router = APIRouter()
 
@@ -16,37 +24,83 @@ async def get_regions_rating(
         start_date: Optional[date] = None,
         end_date: Optional[date] = None,
         limit: int = Query(10, ge=1, le=100),
+        approximate: bool = Query(False, description="Оценка уникальных операторов по скетчам с границей ошибки"),
         db: AsyncSession = Depends(get_db)
 ):
-    """Получение рейтинга регионов по количеству полетов"""
-    query = select(
-        Flight.dep_region.label('region'),
-        func.count(Flight.id).label('flight_count'),
-        func.sum(Flight.duration_minutes).label('total_duration'),
-        func.count(func.distinct(Flight.operator)).label('unique_operators')
-    ).group_by(Flight.dep_region)
+    """
+    Получение рейтинга регионов по количеству полетов.
+    Полет учитывается во всех регионах, которые пересекает (см. flight_regions);
+    рейтинг считается по агрегатам flight_rollup, ответ кэшируется (см. response_cache)
+    """
+    async def compute():
+        rows = await region_rating(db, start_date, end_date, limit, approximate)
+
+        rating = []
+        for idx, row in enumerate(rows, 1):
+            if row["region"]:
+                rating.append({
+                    "position": idx,
+                    "region": row["region"],
+                    "flight_count": row["flight_count"],
+                    "total_duration_hours": row["total_duration"] / 60 if row["total_duration"] else 0,
+                    "unique_operators": row["unique_operators"],
+                    "unique_operators_error": row["unique_operators_error"]
+                })
+        return rating
+
+    return await response_cache.get_or_compute(
+        "regions.rating",
+        {"start_date": start_date, "end_date": end_date, "limit": limit, "approximate": approximate},
+        compute, start_date, end_date
+    )
+
 
-    if start_date:
-        query = query.where(Flight.flight_date >= start_date)
-    if end_date:
-        query = query.where(Flight.flight_date <= end_date)
+@router.get("/boundaries/cache", response_model=GeoCacheStats)
+async def get_geo_cache_stats(geo_service: GeoService = Depends(get_geo_service)):
+    """Состояние кэша геопривязки"""
+    return geo_service.cache_stats()
 
-    query = query.order_by(func.count(Flight.id).desc()).limit(limit)
 
-    result = await db.execute(query)
+@router.post("/boundaries/reload", response_model=GeoCacheStats)
+async def reload_boundaries(geo_service: GeoService = Depends(get_geo_service)):
+    """Перезагрузка границ регионов из SHAPEFILES_DIR с очисткой кэша геопривязки"""
+    await run_in_threadpool(geo_service.reload)
+    return geo_service.cache_stats()
 
-    rating = []
-    for idx, row in enumerate(result.all(), 1):
-        if row.region:
-            rating.append({
-                "position": idx,
-                "region": row.region,
-                "flight_count": row.flight_count,
-                "total_duration_hours": row.total_duration / 60 if row.total_duration else 0,
-                "unique_operators": row.unique_operators
-            })
 
-    return rating
+@router.post("/boundaries/assign", response_model=RegionAssignmentResult)
+async def assign_flight_regions(
+        load_boundaries: bool = Query(True, description="Заменить границы в geo.regions загруженными сервисом"),
+        only_missing: bool = Query(False, description="Только полеты с точкой без региона"),
+        db: AsyncSession = Depends(get_db),
+        geo_service: GeoService = Depends(get_geo_service)
+):
+    """
+    Привязка полетов к регионам в БД по точкам вылета и посадки
+    (UPDATE ... FROM geo.regions), например после обновления границ
+    """
+    regions = await load_region_boundaries(db, geo_service) if load_boundaries \
+        else await ensure_region_boundaries(db, geo_service)
+    result = await assign_regions(db, only_missing=only_missing)
+    await response_cache.clear()
+    return {"regions": regions, **result}
+
+
+@router.post("/boundaries/routes", response_model=FlightRegionsResult)
+async def rebuild_flight_regions(
+        db: AsyncSession = Depends(get_db),
+        geo_service: GeoService = Depends(get_geo_service)
+):
+    """
+    Полный пересчет регионов, которые пересекают маршруты полетов (flight_regions),
+    например после обновления границ или для полетов, загруженных ранее,
+    с перестройкой агрегатов flight_rollup и скетчей flight_sketches
+    """
+    result = await refresh_flight_regions(db, geo_service)
+    await refresh_rollup(db)
+    await db.commit()
+    await response_cache.clear()
+    return result
 
 
 @router.get("/{region_name}/statistics", response_model=RegionStatistics)
@@ -54,56 +108,17 @@ async def get_region_statistics(
         region_name: str,
         start_date: Optional[date] = None,
         end_date: Optional[date] = None,
+        approximate: bool = Query(False, description="Оценка уникальных операторов и типов БВС по скетчам"),
         db: AsyncSession = Depends(get_db)
 ):
-    """Получение детальной статистики по региону"""
-    query = select(Flight).where(
-        (Flight.dep_region == region_name) | (Flight.arr_region == region_name)
+    """
+    Получение детальной статистики по региону (полеты, пересекающие регион).
+    Метрики считаются агрегатными запросами в БД (см. region_statistics),
+    ответ кэшируется (см. response_cache)
+    """
+    return await response_cache.get_or_compute(
+        "regions.statistics",
+        {"region": region_name, "start_date": start_date, "end_date": end_date, "approximate": approximate},
+        lambda: region_statistics(db, region_name, start_date, end_date, approximate),
+        start_date, end_date, [region_name]
     )
-
-    if start_date:
-        query = query.where(Flight.flight_date >= start_date)
-    if end_date:
-        query = query.where(Flight.flight_date <= end_date)
-
-    result = await db.execute(query)
-    flights = result.scalars().all()
-
-    # Расчет метрик
-    total_flights = len(flights)
-    total_duration = sum(f.duration_minutes or 0 for f in flights)
-    unique_operators = len(set(f.operator for f in flights if f.operator))
-    unique_uav_types = len(set(f.uav_type for f in flights if f.uav_type))
-
-    # Расчет пиковых нагрузок
-    flights_by_hour = {}
-    for flight in flights:
-        if flight.dep_time:
-            hour = flight.dep_time.hour
-            flights_by_hour[hour] = flights_by_hour.get(hour, 0) + 1
-
-    peak_hour = max(flights_by_hour.items(), key=lambda x: x[1]) if flights_by_hour else (0, 0)
-
-    # Подсчет дней без полетов
-    if flights:
-        flight_dates = set(f.flight_date.date() for f in flights if f.flight_date)
-        if start_date and end_date:
-            total_days = (end_date - start_date).days + 1
-            zero_days = total_days - len(flight_dates)
-        else:
-            zero_days = 0
-    else:
-        zero_days = 0
-
-    return {
-        "region": region_name,
-        "total_flights": total_flights,
-        "total_duration_hours": total_duration / 60 if total_duration else 0,
-        "unique_operators": unique_operators,
-        "unique_uav_types": unique_uav_types,
-        "peak_hour": peak_hour[0],
-        "peak_hour_flights": peak_hour[1],
-        "zero_flight_days": zero_days,
-        "avg_flights_per_day": total_flights / max((end_date - start_date).days + 1,
-                                                   1) if start_date and end_date else 0
-    }
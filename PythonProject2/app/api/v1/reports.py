@@ -7,6 +7,7 @@ import json
 import os
 import tempfile
 
+from app.core.cache import response_cache
 from app.core.database import get_db
 from app.services.report_generator import ReportGenerator
 from app.schemas.report import ReportRequest, ReportResponse
@@ -19,50 +20,65 @@ async def generate_report(
         request: ReportRequest,
         db: AsyncSession = Depends(get_db)
 ):
-    """Генерация отчета по полетам"""
-    generator = ReportGenerator(db)
-
+    """
+    Генерация отчета по полетам.
+    Ответ кэшируется по параметрам запроса, пока существует файл отчета (см. response_cache)
+    """
     try:
-        if request.format == "json":
-            report_data = await generator.generate_json_report(
-                start_date=request.start_date,
-                end_date=request.end_date,
-                regions=request.regions
-            )
-
-            # Сохранение в временный файл
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                json.dump(report_data, f, ensure_ascii=False, indent=2, default=str)
-                file_path = f.name
-
-            return {
-                "status": "success",
-                "file_path": file_path,
-                "format": "json",
-                "size_bytes": os.path.getsize(file_path)
-            }
-
-        elif request.format == "png":
-            chart_path = await generator.generate_chart(
-                chart_type=request.chart_type or "bar",
-                start_date=request.start_date,
-                end_date=request.end_date
-            )
-
-            return {
-                "status": "success",
-                "file_path": chart_path,
-                "format": "png",
-                "size_bytes": os.path.getsize(chart_path)
-            }
-
-        else:
-            raise HTTPException(400, "Неподдерживаемый формат отчета")
+        return await response_cache.get_or_compute(
+            "reports.generate", request.model_dump(),
+            lambda: _generate(request, db),
+            # График строится по всем регионам, фильтр регионов есть только у JSON отчета
+            request.start_date, request.end_date, request.regions if request.format == "json" else None,
+            valid=lambda cached: os.path.exists(cached["file_path"])
+        )
 
     except Exception as e:
         raise HTTPException(500, f"Ошибка генерации отчета: {str(e)}")
 
 
+async def _generate(request: ReportRequest, db: AsyncSession):
+    """Генерация файла отчета"""
+    generator = ReportGenerator(db)
+
+    if request.format == "json":
+        report_data = await generator.generate_json_report(
+            start_date=request.start_date,
+            end_date=request.end_date,
+            regions=request.regions,
+            approximate=request.approximate
+        )
+
+        # Сохранение в временный файл
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            json.dump(report_data, f, ensure_ascii=False, indent=2, default=str)
+            file_path = f.name
+
+        return {
+            "status": "success",
+            "file_path": file_path,
+            "format": "json",
+            "size_bytes": os.path.getsize(file_path)
+        }
+
+    elif request.format == "png":
+        chart_path = await generator.generate_chart(
+            chart_type=request.chart_type or "bar",
+            start_date=request.start_date,
+            end_date=request.end_date
+        )
+
+        return {
+            "status": "success",
+            "file_path": chart_path,
+            "format": "png",
+            "size_bytes": os.path.getsize(chart_path)
+        }
+
+    else:
+        raise HTTPException(400, "Неподдерживаемый формат отчета")
+
+
 @router.get("/download/{report_id}")
 async def download_report(report_id: str):
     """Скачивание сгенерированного отчета"""
@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import Counter
+
+from app.core.config import settings
+from app.core.lru import LRUCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "cache:response:"
+TAG_PREFIX = "cache:tag:"
+
+# Тег периода без границы и запросов по всем регионам
+ANY = '*'
+
+# Месячных тегов на запись не больше; более длинный период получает тег ANY
+_MAX_MONTH_TAGS = 120
+
+CACHE_REQUESTS = Counter(
+    "analytics_cache_requests_total",
+    "Обращения к кэшу ответов аналитики",
+    ["route", "result", "backend"]
+)
+CACHE_INVALIDATED = Counter(
+    "analytics_cache_invalidated_total",
+    "Ответы, удаленные из кэша после загрузки данных",
+    ["backend"]
+)
+CACHE_COALESCED = Counter(
+    "analytics_cache_coalesced_total",
+    "Запросы, дождавшиеся вычисления того же ответа другим запросом",
+    ["route"]
+)
+CACHE_ERRORS = Counter(
+    "analytics_cache_redis_errors_total",
+    "Ошибки обращения к Redis кэша ответов"
+)
+
+Bound = Optional[Union[date, datetime]]
+
+
+def _as_date(bound: Union[date, datetime]) -> date:
+    return bound.date() if isinstance(bound, datetime) else bound
+
+
+def period_tags(start: Bound, end: Bound) -> List[str]:
+    """
+    Теги месяцев, которые покрывает период (период без границы, слишком длинный
+    или с началом позже конца - тег ANY: запись без тегов не удалялась бы при загрузке)
+    """
+    if start is None or end is None:
+        return [f"m:{ANY}"]
+
+    start, end = _as_date(start), _as_date(end)
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    if months <= 0 or months > _MAX_MONTH_TAGS:
+        return [f"m:{ANY}"]
+
+    tags = []
+    for offset in range(months):
+        year, month = divmod(start.year * 12 + start.month - 1 + offset, 12)
+        tags.append(f"m:{year:04d}-{month + 1:02d}")
+    return tags
+
+
+def region_tags(regions: Optional[Sequence[str]]) -> List[str]:
+    """Теги регионов запроса (без фильтра по регионам - тег ANY)"""
+    return [f"r:{region}" for region in sorted(set(regions))] if regions else [f"r:{ANY}"]
+
+
+class ResponseCache:
+    """
+    Кэш ответов аналитических запросов в Redis, общий для процессов API.
+    Ключ - маршрут и нормализованные параметры запроса; запись помечается тегами
+    месяцев периода и регионов, и загрузка данных удаляет только записи,
+    которые пересекаются с затронутыми днями и регионами.
+    При недоступности Redis используется кэш процесса (LRUCache), а к Redis
+    повторно обращаются через RESPONSE_CACHE_RETRY секунд.
+    Одинаковые запросы, пришедшие во время вычисления ответа, ждут его результат
+    (single-flight) вместо повторного запроса к БД
+    """
+
+    def __init__(self, url: Optional[str] = None, ttl: Optional[int] = None,
+                 local_size: Optional[int] = None, retry: Optional[float] = None,
+                 client: Optional[Any] = None):
+        """client - готовый асинхронный клиент Redis (например, fakeredis)"""
+        self.url = url or settings.REDIS_URL
+        self.ttl = settings.RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.retry = settings.RESPONSE_CACHE_RETRY if retry is None else retry
+        self.local = LRUCache(local_size or settings.RESPONSE_CACHE_LOCAL_SIZE, self.ttl)
+
+        self._client = client
+        self._fixed_client = client is not None
+        self._client_loop = None
+        self._redis_down_until = 0.0
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def key(route: str, params: dict) -> str:
+        """Ключ записи: маршрут и хеш параметров с упорядоченными ключами"""
+        payload = json.dumps(jsonable_encoder(params), sort_keys=True, ensure_ascii=False)
+        return f"{route}:{hashlib.sha1(payload.encode()).hexdigest()}"
+
+    def _redis(self):
+        """Клиент Redis текущего цикла событий или None, пока Redis считается недоступным"""
+        if time.monotonic() < self._redis_down_until:
+            return None
+        if self._fixed_client:
+            return self._client
+
+        # Соединения redis.asyncio привязаны к циклу событий (Celery запускает свой цикл на задачу)
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(self.url, socket_connect_timeout=1, socket_timeout=1)
+            self._client_loop = loop
+        return self._client
+
+    def _failed(self, error: Exception):
+        CACHE_ERRORS.inc()
+        self._redis_down_until = time.monotonic() + self.retry
+        logger.warning(f"Redis кэша ответов недоступен, используется кэш процесса: {error}")
+
+    async def get_or_compute(self, route: str, params: dict, compute: Callable[[], Awaitable[Any]],
+                             start: Bound = None, end: Bound = None,
+                             regions: Optional[Sequence[str]] = None,
+                             valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Ответ из кэша или результат compute(), сохраненный в кэше.
+        Параллельные запросы с тем же ключом ждут одно вычисление (и при отключенном кэше).
+        start/end и regions - период и регионы, которые покрывает ответ (для тегов).
+        valid - проверка найденной записи (например, что файл отчета еще существует)
+        """
+        key = self.key(route, params)
+
+        if self.enabled:
+            value, backend = await self._get(key)
+            if value is not MISSING and (valid is None or valid(value)):
+                CACHE_REQUESTS.labels(route, "hit", backend).inc()
+                return value
+            CACHE_REQUESTS.labels(route, "miss", backend).inc()
+
+        while True:
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            CACHE_COALESCED.labels(route).inc()
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Отменен сам запрос - отмена передается дальше,
+                # отменено вычисление другого запроса - ответ вычисляется заново
+                if not pending.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = jsonable_encoder(await compute())
+            if self.enabled:
+                await self._set(key, value, period_tags(start, end) + region_tags(regions))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Ошибка передается ожидающим запросам, но может остаться без них
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._pending.pop(key, None)
+
+    async def _get(self, key: str):
+        client = self._redis()
+        if client is not None:
+            try:
+                data = await client.get(KEY_PREFIX + key)
+                return (json.loads(data) if data is not None else MISSING), "redis"
+            except Exception as e:
+                self._failed(e)
+
+        item = self.local.get(key)
+        return (item[0] if item is not MISSING else MISSING), "local"
+
+    async def _set(self, key: str, value: Any, tags: List[str]):
+        client = self._redis()
+        if client is not None:
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.set(KEY_PREFIX + key, json.dumps(value, ensure_ascii=False), ex=self.ttl)
+                    # Тег живет не меньше последней помеченной им записи
+                    for tag in tags:
+                        pipe.sadd(TAG_PREFIX + tag, key)
+                        pipe.expire(TAG_PREFIX + tag, self.ttl)
+                    await pipe.execute()
+                return
+            except Exception as e:
+                self._failed(e)
+
+        self.local.set(key, (value, frozenset(tags)))
+
+    async def invalidate(self, days: Iterable[date], regions: Iterable[str]) -> int:
+        """
+        Удаление ответов, период которых пересекает дни, а регионы - регионы загрузки
+        (ответы по всем регионам и без границ периода удаляются при любых изменениях).
+        Кэш процесса очищается только в текущем процессе, его записи устаревают
+        не позже RESPONSE_CACHE_TTL
+        """
+        months = {f"m:{day.year:04d}-{day.month:02d}" for day in days}
+        if not self.enabled or not months:
+            return 0
+
+        by_period = sorted(months | {f"m:{ANY}"})
+        by_region = sorted({f"r:{region}" for region in regions} | {f"r:{ANY}"})
+        removed = 0
+
+        client = self._redis()
+        if client is not None:
+            try:
+                keys: Set[bytes] = set(await client.sunion([TAG_PREFIX + tag for tag in by_period])) & \
+                    set(await client.sunion([TAG_PREFIX + tag for tag in by_region]))
+                if keys:
+                    async with client.pipeline(transaction=False) as pipe:
+                        pipe.delete(*(KEY_PREFIX.encode() + key for key in keys))
+                        for tag in by_period + by_region:
+                            pipe.srem(TAG_PREFIX + tag, *keys)
+                        await pipe.execute()
+                    CACHE_INVALIDATED.labels("redis").inc(len(keys))
+                    removed += len(keys)
+            except Exception as e:
+                self._failed(e)
+
+        local_keys = [
+            key for key, (_, tags) in self.local.items()
+            if not tags.isdisjoint(by_period) and not tags.isdisjoint(by_region)
+        ]
+        for key in local_keys:
+            self.local.delete(key)
+        if local_keys:
+            CACHE_INVALIDATED.labels("local").inc(len(local_keys))
+
+        logger.info(f"Кэш ответов: удалено {removed + len(local_keys)} записей за {len(months)} мес.")
+        return removed + len(local_keys)
+
+    async def clear(self):
+        """Удаление всех ответов (например, после перестройки агрегатов или смены границ)"""
+        client = self._redis()
+        if client is not None:
+            try:
+                batch = []
+                async for key in client.scan_iter(match="cache:*", count=1000):
+                    batch.append(key)
+                    if len(batch) >= 1000:
+                        await client.delete(*batch)
+                        batch = []
+                if batch:
+                    await client.delete(*batch)
+            except Exception as e:
+                self._failed(e)
+
+        self.local.clear()
+
+
+# Кэш ответов, общий для маршрутов процесса
+response_cache = ResponseCache()
@@ -24,6 +24,54 @@ class Settings(BaseSettings):
     # Файлы
     UPLOAD_DIR: str = "/tmp/uploads"
     MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100 MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Размер чанка при потоковом чтении загрузки
+
+    # Загрузка данных в БД
+    INGEST_BATCH_SIZE: int = 1000  # Количество полетов в одной пачке записи
+    INGEST_WRITE_METHOD: str = "copy"  # copy - COPY через asyncpg, insert - многострочный INSERT
+
+    # Фоновые задачи загрузки
+    INGEST_BACKEND: str = "local"  # local - asyncio воркеры в процессе API, celery - Celery через Redis
+    INGEST_WORKERS: int = 2
+    INGEST_JOB_TTL: int = 24 * 60 * 60  # Время хранения состояния задачи в Redis, с
+
+    # Парсинг Excel
+    EXCEL_PARSE_ENGINE: str = "rows"  # rows - построчный разбор, vectorized - разбор колонками pandas
+
+    # Параллельный парсинг
+    PARSE_WORKERS: int = 0  # Число процессов парсинга, 0 - парсинг в процессе API
+    PARSE_CHUNK_LINES: int = 5000  # Количество строк во фрагменте, отправляемом в процесс
+
+    # Геопривязка
+    SHAPEFILES_DIR: str = "/app/shapefiles"  # Границы регионов: GeoJSON или шейп-файлы в WGS 84
+    SHAPEFILE_ENCODING: str = "utf-8"  # Кодировка атрибутов шейп-файлов (dbf)
+    GEO_CACHE_SIZE: int = 100000  # Количество точек в кэше геопривязки
+    GEO_CACHE_TTL: int = 0  # Время жизни записи кэша геопривязки, с (0 - до перезагрузки границ)
+    GEO_CACHE_PRECISION: int = 4  # Знаков после запятой в ключе кэша (~11 м)
+    GEO_GRID_RESOLUTION: float = 0.02  # Шаг растра регионов в градусах (0 - без растра)
+    GEO_GRID_CACHE_DIR: Optional[str] = "/tmp/geo_grid"  # Кэш растра (.npy), перестраивается при изменении границ
+    REGION_ASSIGNMENT: str = "python"  # python - GeoService при загрузке, postgis - UPDATE по geo.regions в БД
+    REGION_ASSIGN_BATCH_SIZE: int = 50000  # Диапазон id полетов в одном UPDATE привязки к регионам
+
+    # Тепловая карта
+    HEATMAP_LEVELS: list = [3, 6, 9, 12]  # Масштабы, для которых хранятся сетки плотности
+    HEATMAP_TILE_GRID: int = 64  # Ячеек на сторону тайла
+    HEATMAP_CACHE_SIZE: int = 2048  # Количество тайлов в кэше
+    HEATMAP_CACHE_TTL: int = 60  # Время жизни тайла в кэше, с (загрузка в другом процессе не очищает кэш)
+
+    # Агрегаты по регионам
+    ROLLUP_READS: bool = True  # Статистика и рейтинг регионов по flight_rollup (False - по flights)
+    HLL_PRECISION: int = 12  # Точность скетчей уникальных значений (2^p регистров), после изменения - перестройка агрегатов
+
+    # Кэш ответов аналитики (рейтинг, статистика регионов, отчеты)
+    RESPONSE_CACHE_TTL: int = 300  # Время жизни ответа в кэше, с (0 - кэш отключен)
+    RESPONSE_CACHE_LOCAL_SIZE: int = 1024  # Ответов в кэше процесса, используемом при недоступности Redis
+    RESPONSE_CACHE_RETRY: int = 30  # Пауза перед повторным обращением к Redis после ошибки, с
+
+    # Поиск конфликтов
+    CONFLICT_RADIUS_KM: float = 1.0  # Радиус области вокруг точек вылета и посадки, км
+    CONFLICT_DEFAULT_DURATION_MIN: int = 60  # Продолжительность полета без времени посадки, мин
+    CONFLICT_GRID_DEGREES: float = 0.1  # Ячейка сетки активных полетов, градусы
 
     # Логирование
     LOG_LEVEL: str = "INFO"
@@ -1,7 +1,18 @@
+import logging
+
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 from app.models.flight import Base
+from app.models.density import FlightDensity  # noqa: F401 - регистрация таблиц в metadata
+from app.models.flight_region import FlightRegion  # noqa: F401
+from app.models.region import Region  # noqa: F401
+from app.models.rollup import FlightRollup  # noqa: F401
+from app.models.sketch import FlightSketch  # noqa: F401
+from app.models.stale_day import StaleDay  # noqa: F401
+
+logger = logging.getLogger(__name__)
 
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -17,9 +28,33 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+
+async def _register_geometry_codec(connection):
+    """
+    Бинарный кодек типа geometry для COPY: значения передаются как EWKB
+    в hex (тот же вид, что принимает ST_GeomFromEWKT при INSERT)
+    """
+    try:
+        await connection.set_type_codec(
+            'geometry',
+            schema='public',
+            encoder=bytes.fromhex,
+            decoder=bytes.hex,
+            format='binary'
+        )
+    except ValueError:
+        logger.warning("Тип geometry не найден (нет расширения postgis), COPY точек недоступен")
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    dbapi_connection.run_async(_register_geometry_codec)
+
+
 async def init_db():
     """Инициализация базы данных"""
     async with engine.begin() as conn:
+        await conn.execute(text("CREATE SCHEMA IF NOT EXISTS geo"))
         await conn.run_sync(Base.metadata.create_all)
 
 async def get_db() -> AsyncSession:
@@ -28,4 +63,4 @@ async def get_db() -> AsyncSession:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
@@ -0,0 +1,172 @@
+import math
+from hashlib import blake2b
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+# Точность по умолчанию: 2^12 регистров, стандартная ошибка ~1.6%
+DEFAULT_PRECISION = 12
+
+# Формат сериализации: байт кодировки, байт точности, затем регистры
+_DENSE = 0  # Все регистры подряд (по байту на регистр)
+_SPARSE = 1  # Только ненулевые регистры: номер (uint16) и значение (uint8)
+
+_SPARSE_DTYPE = np.dtype([('index', '<u2'), ('value', 'u1')])
+
+_BIT_SHIFTS = tuple(np.uint64(shift) for shift in (32, 16, 8, 4, 2, 1))
+
+
+def _hashes(values: Iterable[str]) -> np.ndarray:
+    """64-битные хеши строк, одинаковые во всех процессах (в отличие от hash())"""
+    digest = b''.join(blake2b(str(value).encode(), digest_size=8).digest() for value in values)
+    return np.frombuffer(digest, dtype='<u8')
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Количество значащих бит uint64 без перехода к float"""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.uint64)
+    for shift in _BIT_SHIFTS:
+        wide = values >= (np.uint64(1) << shift)
+        values[wide] >>= shift
+        length[wide] += shift
+    return length + (values > 0)
+
+
+class HyperLogLog:
+    """
+    Оценка количества уникальных значений (HyperLogLog) фиксированного размера.
+    Скетчи одной точности объединяются без потерь: скетч объединения множеств
+    совпадает с объединением скетчей, поэтому их можно хранить по дням и регионам
+    и объединять за любой период и набор регионов
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[np.ndarray] = None):
+        """
+        precision - число бит номера регистра (4..16), регистров 2^precision
+        registers - готовые регистры (uint8), например после десериализации
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(f"Точность HyperLogLog вне диапазона 4..16: {precision}")
+
+        self.precision = precision
+        self.m = 1 << precision
+        if registers is None:
+            registers = np.zeros(self.m, dtype=np.uint8)
+        elif len(registers) != self.m:
+            raise ValueError(f"Ожидалось {self.m} регистров, получено {len(registers)}")
+        self.registers = registers
+
+    def update(self, values: Iterable[str]) -> "HyperLogLog":
+        """Добавление значений (одним векторным проходом по хешам)"""
+        hashes = _hashes(values)
+        if not len(hashes):
+            return self
+
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.intp)
+        rest = hashes & np.uint64((1 << width) - 1)
+        rank = (np.uint64(width + 1) - _bit_length(rest)).astype(np.uint8)
+
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def add(self, value: str) -> "HyperLogLog":
+        return self.update((value,))
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Объединение с другим скетчем той же точности (на месте)"""
+        if other.precision != self.precision:
+            raise ValueError(
+                f"Нельзя объединить скетчи разной точности: {self.precision} и {other.precision}"
+            )
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def __or__(self, other: "HyperLogLog") -> "HyperLogLog":
+        return self.copy().merge(other)
+
+    def copy(self) -> "HyperLogLog":
+        return HyperLogLog(self.precision, self.registers.copy())
+
+    @property
+    def error(self) -> float:
+        """Относительная стандартная ошибка оценки"""
+        return 1.04 / math.sqrt(self.m)
+
+    def count(self) -> int:
+        """Оценка количества уникальных значений"""
+        m = self.m
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+
+        estimate = alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(float))))
+
+        # Малые множества: линейный подсчет по пустым регистрам
+        zeros = m - np.count_nonzero(self.registers)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """Сериализация: разреженная, если ненулевых регистров мало"""
+        nonzero = np.flatnonzero(self.registers)
+        if len(nonzero) * _SPARSE_DTYPE.itemsize < self.m:
+            pairs = np.empty(len(nonzero), dtype=_SPARSE_DTYPE)
+            pairs['index'] = nonzero
+            pairs['value'] = self.registers[nonzero]
+            return bytes((_SPARSE, self.precision)) + pairs.tobytes()
+
+        return bytes((_DENSE, self.precision)) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview]) -> "HyperLogLog":
+        data = bytes(data)
+        if len(data) < 2:
+            raise ValueError("Поврежденный скетч HyperLogLog: нет заголовка")
+
+        encoding, precision = data[0], data[1]
+        body = data[2:]
+
+        if encoding == _DENSE:
+            if len(body) != 1 << precision:
+                raise ValueError("Поврежденный скетч HyperLogLog: неверное количество регистров")
+            return cls(precision, np.frombuffer(body, dtype=np.uint8).copy())
+
+        if encoding == _SPARSE:
+            if len(body) % _SPARSE_DTYPE.itemsize:
+                raise ValueError("Поврежденный скетч HyperLogLog: неполная запись регистра")
+            sketch = cls(precision)
+            pairs = np.frombuffer(body, dtype=_SPARSE_DTYPE)
+            if len(pairs) and int(pairs['index'].max()) >= sketch.m:
+                raise ValueError("Поврежденный скетч HyperLogLog: номер регистра вне диапазона")
+            sketch.registers[pairs['index']] = pairs['value']
+            return sketch
+
+        raise ValueError(f"Неизвестная кодировка скетча HyperLogLog: {encoding}")
+
+    @classmethod
+    def union(cls, sketches: Iterable[Union["HyperLogLog", bytes]],
+              precision: Optional[int] = None) -> "HyperLogLog":
+        """
+        Объединение скетчей (или их сериализаций) в новый скетч.
+        precision - точность результата для пустого набора (точность непустого - как у скетчей)
+        """
+        result = None
+        for sketch in sketches:
+            if sketch is None:
+                continue
+            if not isinstance(sketch, HyperLogLog):
+                sketch = cls.from_bytes(sketch)
+            if result is None:
+                result = sketch.copy()
+            else:
+                result.merge(sketch)
+        return result if result is not None else cls(precision or DEFAULT_PRECISION)
@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# Признак отсутствия значения в кэше (None - допустимое значение)
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Ограниченный кэш в памяти процесса с вытеснением давно не используемых записей
+    и необязательным временем жизни записей.
+    Ведет счетчики попаданий и промахов.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        """
+        maxsize - максимальное количество записей
+        ttl - время жизни записи в секундах, None или 0 - без ограничения
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Значение по ключу или default, если записи нет или она устарела"""
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Сохранение значения с вытеснением самой старой записи при переполнении"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Снимок действующих записей (ключ, значение) без изменения порядка вытеснения"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value) for key, (value, expires_at) in self._data.items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def clear(self):
+        """Очистка кэша со сбросом счетчиков"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер кэша и счетчики попаданий"""
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0
+        }
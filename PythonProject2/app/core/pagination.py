@@ -0,0 +1,28 @@
+import base64
+import json
+from typing import Any, List
+
+from fastapi import HTTPException
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    Курсор keyset пагинации: значения ключа сортировки последней записи страницы.
+    Курсор непрозрачен для клиента и передается в следующий запрос как есть.
+    """
+    data = json.dumps(values, default=str, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Значения ключа сортировки из курсора (size - ожидаемое количество значений)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise HTTPException(400, "Некорректный курсор")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(400, "Некорректный курсор")
+
+    return values
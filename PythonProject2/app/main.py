@@ -1,6 +1,7 @@
 from fastapi import FastAPI, HTTPException, Depends, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
+from prometheus_client import make_asgi_app
 from contextlib import asynccontextmanager
 import uvicorn
 from typing import List, Optional, Dict, Any
@@ -8,10 +9,12 @@ import logging
 from datetime import datetime, date
 
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import init_db, AsyncSessionLocal
 from app.api.v1 import flights, regions, reports
 from app.services.parser import TelegramParser
 from app.services.geo_service import GeoService
+from app.services.ingest_jobs import IngestJobManager
+from app.services.parse_pool import get_parse_pool, shutdown_parse_pool
 from app.models.flight import Flight, FlightStatus
 
 # Настройка логирования
@@ -26,8 +29,21 @@ async def lifespan(app: FastAPI):
     """Управление жизненным циклом приложения"""
     logger.info("Инициализация БД и сервисов...")
     await init_db()
+
+    # Пул процессов поднимается заранее, чтобы первая загрузка не ждала его старта
+    get_parse_pool()
+
+    # Границы регионов загружаются один раз, сервис и его кэш общие для всех запросов
+    app.state.geo_service = GeoService()
+
+    app.state.ingest_jobs = IngestJobManager(AsyncSessionLocal, app.state.geo_service)
+    await app.state.ingest_jobs.start()
+
     yield
+
     logger.info("Завершение работы приложения")
+    await app.state.ingest_jobs.stop()
+    shutdown_parse_pool()
 
 app = FastAPI(
     title="Сервис анализа полетов БАС",
@@ -48,4 +64,7 @@ app.add_middleware(
 # Подключение роутеров
 app.include_router(flights.router, prefix="/api/v1/flights", tags=["Полеты"])
 app.include_router(regions.router, prefix="/api/v1/regions", tags=["Регионы"])
-app.include_router(reports.router, prefix="/api/v1/reports", tags=["Отчеты"])
\ No newline at end of file
+app.include_router(reports.router, prefix="/api/v1/reports", tags=["Отчеты"])
+
+# Метрики Prometheus (в том числе попадания в кэш ответов аналитики)
+app.mount("/metrics", make_asgi_app())
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Date, Integer, SmallInteger
+
+from app.models.flight import Base
+
+
+class FlightDensity(Base):
+    """
+    Количество вылетов в ячейке сетки Web Mercator за день.
+    Уровень level - сетка из HEATMAP_TILE_GRID ячеек на сторону тайла масштаба level,
+    gx/gy - глобальные номера ячеек (gx // HEATMAP_TILE_GRID - номер тайла x)
+    """
+    __tablename__ = "flight_density"
+
+    level = Column(SmallInteger, primary_key=True)
+    day = Column(Date, primary_key=True)
+    gx = Column(Integer, primary_key=True)
+    gy = Column(Integer, primary_key=True)
+    flights = Column(Integer, nullable=False)
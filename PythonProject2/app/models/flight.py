@@ -21,7 +21,8 @@ class Flight(Base):
     sid = Column(String(20), unique=True, index=True)  # ID из SHR
     flight_date = Column(DateTime, index=True)
 
-    # Данные о взлете/посадке
+    # Данные о взлете/посадке (GiST индексы idx_flights_dep_point/idx_flights_arr_point
+    # на точках создаются geoalchemy2)
     dep_point = Column(Geometry('POINT', srid=4326))
     dep_coords = Column(String(50))
     dep_time = Column(DateTime)
@@ -43,6 +44,7 @@ class Flight(Base):
     altitude_max = Column(Float)
     flight_zone = Column(JSON)
     duration_minutes = Column(Integer)
+    distance_km = Column(Float)  # Протяженность пути по большому кругу (см. flight_paths.route_lengths_km)
 
     # Служебная информация
     status = Column(String(20), default=FlightStatus.SCHEDULED)
@@ -56,5 +58,6 @@ class Flight(Base):
 
     __table_args__ = (
         Index('idx_flight_date_region', 'flight_date', 'dep_region'),
+        Index('idx_flights_date_id', 'flight_date', 'id'),  # Keyset пагинация списка полетов
         Index('idx_operator', 'operator'),
     )
\ No newline at end of file
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, String
+
+from app.models.flight import Base
+
+
+class FlightRegion(Base):
+    """
+    Регион, который пересекает полет (по пути и зоне полета),
+    с протяженностью пути в регионе по большому кругу.
+    distance_km = NULL - регион известен только по dep_region/arr_region (полет без точек)
+    """
+    __tablename__ = "flight_regions"
+
+    flight_id = Column(Integer, ForeignKey('flights.id', ondelete='CASCADE'), primary_key=True)
+    region = Column(String(100), primary_key=True)
+    distance_km = Column(Float)
+
+    __table_args__ = (
+        Index('idx_flight_regions_region', 'region', 'flight_id'),
+    )
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, DateTime, Integer, Numeric, Index
+from geoalchemy2 import Geometry
+from datetime import datetime
+
+from app.models.flight import Base
+
+
+class Region(Base):
+    """Границы субъекта РФ (схема geo, см. init.sql)"""
+    __tablename__ = "regions"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    code = Column(String(10), nullable=False)
+    # GiST индекс idx_regions_geometry создается geoalchemy2 (spatial_index)
+    geometry = Column(Geometry('MULTIPOLYGON', srid=4326))
+    center_point = Column(Geometry('POINT', srid=4326, spatial_index=False))
+    area_km2 = Column(Numeric)
+    population = Column(Integer)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_regions_center', 'center_point', postgresql_using='gist'),
+        Index('idx_regions_name', 'name'),
+        Index('idx_regions_code', 'code'),
+        {"schema": "geo"},
+    )
@@ -0,0 +1,25 @@
+from sqlalchemy import BigInteger, Column, Date, Float, Integer, SmallInteger, String
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.models.flight import Base
+
+
+class FlightRollup(Base):
+    """
+    Агрегаты полетов по ячейке (регион, день, час вылета, тип БВС).
+    Регион - любой регион, который пересекает полет (см. flight_regions).
+    hour = -1 - время вылета неизвестно, uav_type = '' - тип не указан.
+    operators - множество операторов ячейки: объединение множеств дает
+    точное число операторов за любой период и набор ячеек
+    """
+    __tablename__ = "flight_rollup"
+
+    region = Column(String(100), primary_key=True)
+    day = Column(Date, primary_key=True)
+    hour = Column(SmallInteger, primary_key=True)
+    uav_type = Column(String(50), primary_key=True)
+
+    flights = Column(Integer, nullable=False)
+    duration_minutes = Column(BigInteger, nullable=False)
+    distance_km = Column(Float, nullable=False)
+    operators = Column(ARRAY(String), nullable=False)
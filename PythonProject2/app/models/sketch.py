@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Date, LargeBinary, String
+
+from app.models.flight import Base
+
+
+class FlightSketch(Base):
+    """
+    Скетчи HyperLogLog уникальных операторов и типов БВС за день по региону
+    (полеты, пересекающие регион, см. flight_regions).
+    region = '*' - все полеты дня, включая полеты без региона.
+    Скетчи объединяются за любой период и набор регионов (см. app.core.hll)
+    """
+    __tablename__ = "flight_sketches"
+
+    region = Column(String(100), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    operators = Column(LargeBinary, nullable=False)
+    uav_types = Column(LargeBinary, nullable=False)
@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Date, DateTime, Text
+
+from app.models.flight import Base
+
+
+class StaleDay(Base):
+    """
+    Дни, за которые полеты записаны, но производные данные (flight_regions,
+    агрегаты, скетчи, сетки плотности) не удалось пересчитать после загрузки.
+    Дни пересчитываются при следующей загрузке или командой
+    python -m app.services.day_refresh (см. app.services.day_refresh)
+    """
+    __tablename__ = "stale_days"
+
+    day = Column(Date, primary_key=True)
+    marked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    error = Column(Text)
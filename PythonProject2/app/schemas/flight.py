@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, Dict, Any
+from enum import Enum
+from typing import Optional, Dict, Any, List
 
 
 class FlightBase(BaseModel):
@@ -32,10 +33,79 @@ class FlightResponse(FlightBase):
         from_attributes = True
 
 
+class FlightPage(BaseModel):
+    items: List[Dict[str, Any]]  # Записи с запрошенными полями (fields)
+    next_cursor: Optional[str] = None
+
+
 class FlightStatistics(BaseModel):
     total_flights: int
     avg_duration_minutes: float
     unique_operators: int
     unique_uav_types: int
+    unique_operators_error: Optional[int] = None  # Граница ошибки оценки по скетчам (approximate)
+    unique_uav_types_error: Optional[int] = None
     period_start: Optional[datetime] = None
-    period_end: Optional[datetime] = None
\ No newline at end of file
+    period_end: Optional[datetime] = None
+
+
+class DistanceGroup(str, Enum):
+    """Группировка статистики протяженности"""
+    REGION = "region"  # Регион вылета
+    OPERATOR = "operator"
+    UAV_TYPE = "uav_type"
+
+
+class DistanceStatistics(BaseModel):
+    group: Optional[str] = None
+    flights: int  # Полетов с известной протяженностью
+    total_distance_km: float
+    avg_distance_km: float
+
+
+class FlightLocation(BaseModel):
+    id: int
+    sid: Optional[str] = None
+    flight_date: Optional[datetime] = None
+    dep_time: Optional[datetime] = None
+    arr_time: Optional[datetime] = None
+    dep_region: Optional[str] = None
+    arr_region: Optional[str] = None
+    operator: Optional[str] = None
+    uav_type: Optional[str] = None
+    dep_lat: Optional[float] = None
+    dep_lon: Optional[float] = None
+    arr_lat: Optional[float] = None
+    arr_lon: Optional[float] = None
+    distance_km: Optional[float] = None
+
+
+class FlightSearchPage(BaseModel):
+    items: List[FlightLocation]
+    next_cursor: Optional[str] = None
+
+
+class FlightConflict(BaseModel):
+    flight_id: int
+    flight_sid: Optional[str] = None
+    other_flight_id: int
+    other_flight_sid: Optional[str] = None
+    start: datetime  # Начало пересечения по времени
+    end: datetime
+    altitude_min: Optional[float] = None  # Общий диапазон высот (None - не ограничен)
+    altitude_max: Optional[float] = None
+
+class FlightConflictReport(BaseModel):
+    date: str
+    flights: int  # Полетов, проверенных за день
+    total: int
+    conflicts: List[FlightConflict]
+
+class HeatmapTile(BaseModel):
+    z: int
+    x: int
+    y: int
+    grid: int  # Ячеек на сторону тайла
+    level: int  # Уровень пирамиды плотности, из которого собран тайл
+    total: int
+    cells: List[List[int]]  # [cx, cy, flights], cx/cy от левого верхнего угла тайла
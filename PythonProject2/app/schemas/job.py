@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional, List
+
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    kind: str
+    filename: Optional[str] = None
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    parsed: int = 0
+    processed: int = 0
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    merged_in_batch: int = 0
+    rows_per_sec: float = 0
+    error_count: int = 0
+    errors: List[str] = []
+    error: Optional[str] = None
+    warning: Optional[str] = None
@@ -7,6 +7,7 @@ class RegionRating(BaseModel):
     flight_count: int
     total_duration_hours: float
     unique_operators: int
+    unique_operators_error: Optional[int] = None  # Граница ошибки оценки по скетчам (approximate)
 
 class RegionStatistics(BaseModel):
     region: str
@@ -14,7 +15,29 @@ class RegionStatistics(BaseModel):
     total_duration_hours: float
     unique_operators: int
     unique_uav_types: int
+    unique_operators_error: Optional[int] = None  # Граница ошибки оценки по скетчам (approximate)
+    unique_uav_types_error: Optional[int] = None
     peak_hour: int
     peak_hour_flights: int
     zero_flight_days: int
-    avg_flights_per_day: float
\ No newline at end of file
+    avg_flights_per_day: float
+    total_distance_km: float = 0  # Протяженность маршрутов в регионе
+
+class GeoCacheStats(BaseModel):
+    regions: int
+    size: int
+    maxsize: int
+    ttl: Optional[float] = None
+    hits: int
+    misses: int
+    hit_rate: float
+
+class RegionAssignmentResult(BaseModel):
+    regions: int
+    updated: int
+    elapsed_sec: float
+
+class FlightRegionsResult(BaseModel):
+    flights: int
+    rows: int
+    elapsed_sec: float
@@ -8,6 +8,7 @@ class ReportRequest(BaseModel):
     end_date: Optional[datetime] = None
     regions: Optional[List[str]] = None
     chart_type: Optional[Literal["bar", "pie", "line"]] = "bar"
+    approximate: bool = False  # Уникальные операторы - оценка по скетчам
 
 class ReportResponse(BaseModel):
     status: str
@@ -0,0 +1,352 @@
+import json
+import logging
+import time
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import String, bindparam, insert, select, table, column, text, func, or_, and_, literal_column
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.flight import Flight, FlightStatus
+
+logger = logging.getLogger(__name__)
+
+
+# Дни полетов с SID из пачки (по уникальному индексу sid)
+_EXISTING_DAYS_SQL = text(
+    "SELECT DISTINCT flight_date::date FROM flights WHERE sid = ANY(:sids) AND flight_date IS NOT NULL"
+).bindparams(bindparam("sids", type_=ARRAY(String)))
+
+
+class ConflictPolicy(str, Enum):
+    """Поведение при повторной загрузке полета с существующим SID"""
+    SKIP = "skip"  # Оставить существующую запись
+    OVERWRITE = "overwrite"  # Заменить запись новыми данными
+    MERGE = "merge"  # Дополнить пустые колонки записи данными DEP/ARR
+
+
+class FlightBulkWriter:
+    """
+    Пакетная запись полетов в БД.
+    Принимает словари со значениями колонок таблицы flights и пишет их пачками
+    через COPY (asyncpg) или многострочный INSERT, минуя unit of work ORM.
+    Полеты с SID записываются через INSERT ... ON CONFLICT (sid) согласно политике.
+    Точки dep_point/arr_point передаются как EWKB в hex (см. geo_service.points_ewkb).
+    """
+
+    # Колонки, заполняемые при загрузке
+    COLUMNS = [
+        'sid', 'flight_date',
+        'dep_point', 'dep_coords', 'dep_time', 'dep_region',
+        'arr_point', 'arr_coords', 'arr_time', 'arr_region',
+        'uav_type', 'uav_reg', 'operator', 'operator_phone',
+        'altitude_min', 'altitude_max', 'flight_zone', 'duration_minutes', 'distance_km',
+        'status', 'center_name', 'raw_shr', 'raw_dep', 'raw_arr',
+        'created_at', 'updated_at'
+    ]
+
+    # Колонки, дополняемые в существующей записи при политике MERGE (только пустые)
+    MERGE_COLUMNS = [
+        'dep_point', 'dep_coords', 'dep_time', 'dep_region',
+        'arr_point', 'arr_coords', 'arr_time', 'arr_region',
+        'duration_minutes', 'distance_km', 'raw_dep', 'raw_arr'
+    ]
+
+    # Временная таблица для COPY перед upsert
+    STAGE_TABLE = 'flights_stage'
+
+    # Лимит параметров одного запроса asyncpg
+    MAX_QUERY_PARAMS = 32767
+
+    def __init__(self, db: AsyncSession, batch_size: Optional[int] = None,
+                 method: Optional[str] = None,
+                 on_conflict: ConflictPolicy = ConflictPolicy.SKIP):
+        self.db = db
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.method = method or settings.INGEST_WRITE_METHOD
+        self.on_conflict = ConflictPolicy(on_conflict)
+        self.rows_written = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        # Повторы SID внутри пачки, схлопнутые в одну запись при политике MERGE
+        self.merged_in_batch = 0
+        self.elapsed = 0.0
+        # Дни записанных полетов, в том числе прежние дни перезаписанных и дополненных
+        # (для пересчета агрегатов по дням при загрузке)
+        self.flight_days: Set[date] = set()
+        self._buffer: List[Dict[str, Any]] = []
+
+    async def add(self, row: Dict[str, Any]):
+        """Добавление полета в буфер с записью при заполнении пачки"""
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def add_many(self, rows: Iterable[Dict[str, Any]]):
+        """Добавление нескольких полетов"""
+        for row in rows:
+            await self.add(row)
+
+    async def add_columns(self, columns: Dict[str, List[Any]], size: int):
+        """
+        Запись колоночной пачки: колонка таблицы flights - список из size значений.
+        Пачка пишется без построения словаря на каждую строку;
+        пачки с SID идут через upsert по строкам.
+        """
+        if not size:
+            return
+
+        if any(sid is not None for sid in columns.get('sid') or ()):
+            await self.add_many(
+                {name: values[i] for name, values in columns.items()}
+                for i in range(size)
+            )
+            return
+
+        await self.flush()
+
+        now = datetime.utcnow()
+        missing = [None] * size
+        values = [columns.get(column, missing) for column in self.COLUMNS]
+
+        status = self.COLUMNS.index('status')
+        values[status] = [value or FlightStatus.SCHEDULED.value for value in values[status]]
+        for column in ('created_at', 'updated_at'):
+            index = self.COLUMNS.index(column)
+            values[index] = [value or now for value in values[index]]
+
+        flight_zone = self.COLUMNS.index('flight_zone')
+        if self.method == 'copy':
+            values[flight_zone] = [
+                json.dumps(value, ensure_ascii=False) if value is not None else None
+                for value in values[flight_zone]
+            ]
+
+        self._track_days(columns.get('flight_date', ()))
+
+        records = list(zip(*values))
+
+        started = time.perf_counter()
+
+        if self.method == 'copy':
+            await self._copy_to(Flight.__tablename__, records)
+        else:
+            await self._insert([dict(zip(self.COLUMNS, record)) for record in records])
+
+        self.elapsed += time.perf_counter() - started
+        self.inserted += size
+        self.rows_written = self.inserted + self.updated
+
+    async def flush(self):
+        """Запись накопленной пачки в БД"""
+        if not self._buffer:
+            return
+
+        rows = [self._normalize(row) for row in self._buffer]
+        self._buffer = []
+        self._track_days(row['flight_date'] for row in rows)
+
+        started = time.perf_counter()
+
+        # Полеты без SID не могут конфликтовать и пишутся напрямую
+        plain_rows = [row for row in rows if row['sid'] is None]
+        sid_rows = [row for row in rows if row['sid'] is not None]
+
+        if plain_rows:
+            if self.method == 'copy':
+                await self._copy(plain_rows)
+            else:
+                await self._insert(plain_rows)
+            self.inserted += len(plain_rows)
+
+        if sid_rows:
+            unique_rows, duplicates = self._deduplicate(sid_rows)
+            if self.on_conflict != ConflictPolicy.SKIP:
+                await self._track_existing_days([row['sid'] for row in unique_rows])
+            if self.on_conflict == ConflictPolicy.MERGE:
+                self.merged_in_batch += duplicates
+            else:
+                self.skipped += duplicates
+
+            if self.method == 'copy':
+                inserted, updated = await self._copy_upsert(unique_rows)
+            else:
+                inserted, updated = await self._insert_upsert(unique_rows)
+
+            self.inserted += inserted
+            self.updated += updated
+            self.skipped += len(unique_rows) - inserted - updated
+
+        self.elapsed += time.perf_counter() - started
+        self.rows_written = self.inserted + self.updated
+
+    @property
+    def rows_per_sec(self) -> float:
+        """Скорость записи в строках в секунду"""
+        return self.rows_written / self.elapsed if self.elapsed else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика записи"""
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "merged_in_batch": self.merged_in_batch,
+            "rows_written": self.rows_written,
+            "elapsed_sec": round(self.elapsed, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1)
+        }
+
+    def _track_days(self, flight_dates: Iterable[Optional[datetime]]):
+        """Учет дней записываемых полетов"""
+        self.flight_days.update({value.date() for value in flight_dates if value is not None})
+
+    async def _track_existing_days(self, sids: List[str]):
+        """
+        Учет дней уже записанных полетов с этими SID: перезапись и дополнение
+        меняют агрегаты их дня, а перезапись может перенести полет на другой день
+        """
+        result = await self.db.execute(_EXISTING_DAYS_SQL, {"sids": sids})
+        self.flight_days.update(day for day in result.scalars().all() if day is not None)
+
+    def _normalize(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Приведение словаря к полному набору колонок со значениями по умолчанию"""
+        now = datetime.utcnow()
+        values = {column: row.get(column) for column in self.COLUMNS}
+        values['status'] = values['status'] or FlightStatus.SCHEDULED.value
+        values['created_at'] = values['created_at'] or now
+        values['updated_at'] = values['updated_at'] or now
+        return values
+
+    def _deduplicate(self, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Схлопывание повторов SID внутри пачки:
+        один INSERT ... ON CONFLICT не может изменить строку дважды.
+        При MERGE повтор заполняет только пустые колонки первой записи
+        """
+        unique: Dict[str, Dict[str, Any]] = {}
+
+        for row in rows:
+            existing = unique.get(row['sid'])
+            if existing is None or self.on_conflict == ConflictPolicy.OVERWRITE:
+                unique[row['sid']] = row
+            elif self.on_conflict == ConflictPolicy.MERGE:
+                for column in self.MERGE_COLUMNS:
+                    if existing[column] is None:
+                        existing[column] = row[column]
+
+        return list(unique.values()), len(rows) - len(unique)
+
+    def _upsert(self, stmt):
+        """Добавление обработки конфликта по SID и подсчета вставленных строк"""
+        flights = Flight.__table__
+
+        if self.on_conflict == ConflictPolicy.OVERWRITE:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['sid'],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in self.COLUMNS
+                    if column not in ('sid', 'created_at')
+                }
+            )
+        elif self.on_conflict == ConflictPolicy.MERGE:
+            # Заполняются только пустые колонки, имеющиеся данные не перезаписываются
+            set_ = {
+                column: func.coalesce(flights.c[column], stmt.excluded[column])
+                for column in self.MERGE_COLUMNS
+            }
+            set_['updated_at'] = stmt.excluded.updated_at
+
+            # Запись обновляется, только если пустая колонка получает значение
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['sid'],
+                set_=set_,
+                where=or_(*[
+                    and_(flights.c[column].is_(None), stmt.excluded[column].isnot(None))
+                    for column in self.MERGE_COLUMNS
+                ])
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=['sid'])
+
+        # xmax = 0 только у вставленных строк, у обновленных в нем id транзакции
+        return stmt.returning(literal_column('xmax = 0').label('inserted'))
+
+    @staticmethod
+    def _count_upserted(result) -> Tuple[int, int]:
+        """Количество вставленных и обновленных строк по результату upsert"""
+        flags = result.scalars().all()
+        inserted = sum(1 for flag in flags if flag)
+        return inserted, len(flags) - inserted
+
+    def _records(self, rows: List[Dict[str, Any]]) -> List[tuple]:
+        """Кортежи значений в порядке COLUMNS для COPY"""
+        return [
+            tuple(
+                json.dumps(row[column], ensure_ascii=False)
+                if column == 'flight_zone' and row[column] is not None
+                else row[column]
+                for column in self.COLUMNS
+            )
+            for row in rows
+        ]
+
+    async def _copy_to(self, table_name: str, records: List[tuple]):
+        """COPY кортежей значений (в порядке COLUMNS) в таблицу в рамках текущей транзакции сессии"""
+        conn = await self.db.connection()
+        raw_conn = await conn.get_raw_connection()
+
+        await raw_conn.driver_connection.copy_records_to_table(
+            table_name,
+            records=records,
+            columns=self.COLUMNS
+        )
+
+    async def _copy(self, rows: List[Dict[str, Any]]):
+        """Запись пачки через COPY"""
+        await self._copy_to(Flight.__tablename__, self._records(rows))
+
+    async def _copy_upsert(self, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """COPY пачки во временную таблицу и перенос в flights через upsert"""
+        columns = ', '.join(self.COLUMNS)
+        await self.db.execute(text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {self.STAGE_TABLE} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {Flight.__tablename__} WITH NO DATA"
+        ))
+        await self._copy_to(self.STAGE_TABLE, self._records(rows))
+
+        stage = table(self.STAGE_TABLE, *[column(name) for name in self.COLUMNS])
+        stmt = pg_insert(Flight.__table__).from_select(self.COLUMNS, select(stage))
+        result = await self.db.execute(self._upsert(stmt))
+        counts = self._count_upserted(result)
+
+        await self.db.execute(text(f"TRUNCATE {self.STAGE_TABLE}"))
+        return counts
+
+    def _chunks(self, rows: List[Dict[str, Any]]) -> Iterable[List[Dict[str, Any]]]:
+        """Разбиение пачки с учетом лимита параметров запроса"""
+        size = max(1, self.MAX_QUERY_PARAMS // len(self.COLUMNS))
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+
+    async def _insert(self, rows: List[Dict[str, Any]]):
+        """Запись пачки многострочным INSERT"""
+        await self.db.execute(insert(Flight.__table__), rows)
+
+    async def _insert_upsert(self, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Запись пачки многострочным INSERT ... ON CONFLICT"""
+        inserted = updated = 0
+        for chunk in self._chunks(rows):
+            result = await self.db.execute(
+                self._upsert(pg_insert(Flight.__table__).values(chunk))
+            )
+            chunk_inserted, chunk_updated = self._count_upserted(result)
+            inserted += chunk_inserted
+            updated += chunk_updated
+        return inserted, updated
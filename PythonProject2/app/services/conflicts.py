@@ -0,0 +1,263 @@
+import heapq
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.flight import Flight
+from app.services.flight_paths import circles, zone_polygon
+
+logger = logging.getLogger(__name__)
+
+
+def footprint_parts(flights: Sequence[Dict[str, Any]], radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Части областей полетов: зона из flight_zone (круг или полигон) и круги
+    радиусом radius_km вокруг точек вылета и посадки.
+    Возвращает геометрии частей и номера полетов, которым они принадлежат
+    (части одного полета идут подряд в порядке полетов).
+    """
+    owners, lats, lons, radii = [], [], [], []
+    polygon_owners, polygons = [], []
+
+    for index, flight in enumerate(flights):
+        zone = flight.get('flight_zone')
+        if isinstance(zone, dict):
+            if zone.get('center') and zone.get('radius_km'):
+                owners.append(index)
+                lats.append(zone['center'][0])
+                lons.append(zone['center'][1])
+                radii.append(float(zone['radius_km']))
+            else:
+                polygon = zone_polygon(zone)
+                if polygon is not None and not polygon.is_empty:
+                    polygon_owners.append(index)
+                    polygons.append(polygon)
+
+        for side in ('dep', 'arr'):
+            lat, lon = flight.get(f'{side}_lat'), flight.get(f'{side}_lon')
+            if lat is not None and lon is not None:
+                owners.append(index)
+                lats.append(lat)
+                lons.append(lon)
+                radii.append(radius_km)
+
+    geometries = np.concatenate([
+        circles(np.array(lats, dtype=float), np.array(lons, dtype=float), np.array(radii)),
+        np.array(polygons, dtype=object)
+    ])
+    owners = np.array(owners + polygon_owners, dtype=np.intp)
+
+    order = np.argsort(owners, kind='stable')
+    return geometries[order], owners[order]
+
+
+def flight_interval(flight: Dict[str, Any], default_minutes: int) -> Optional[Tuple[datetime, datetime]]:
+    """Интервал полета: от вылета до посадки (или вылета плюс продолжительность)"""
+    start = flight.get('dep_time')
+    if start is None:
+        return None
+
+    end = flight.get('arr_time')
+    if end is None or end <= start:
+        minutes = flight.get('duration_minutes') or default_minutes
+        end = start + timedelta(minutes=minutes)
+
+    return start, end
+
+
+def detect_conflicts(flights: Sequence[Dict[str, Any]],
+                     window: Optional[Tuple[datetime, datetime]] = None,
+                     radius_km: Optional[float] = None,
+                     default_minutes: Optional[int] = None,
+                     cell_degrees: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Пары полетов, пересекающихся по времени, высоте и области полета.
+
+    Заметающая прямая по времени: полеты обрабатываются в порядке вылета,
+    активные (еще не завершившиеся) полеты хранятся в сетке ячеек cell_degrees
+    по bbox области и удаляются из нее по куче времен окончания. Новый полет
+    проверяется только с активными полетами из своих ячеек: сначала bbox
+    и высоты векторно, затем точное пересечение частей областей. Время -
+    O(n log n + k) при ограниченном числе полетов в ячейке одновременно.
+
+    window - период, с которым должно пересекаться время конфликта.
+    Полеты без высот считаются занимающими все высоты.
+    """
+    radius_km = radius_km if radius_km is not None else settings.CONFLICT_RADIUS_KM
+    default_minutes = default_minutes or settings.CONFLICT_DEFAULT_DURATION_MIN
+    cell_degrees = cell_degrees or settings.CONFLICT_GRID_DEGREES
+
+    items = []
+    for flight in flights:
+        interval = flight_interval(flight, default_minutes)
+        if interval is None:
+            continue
+        if window and not (interval[0] < window[1] and interval[1] > window[0]):
+            continue
+        items.append((interval[0], interval[1], flight))
+
+    items.sort(key=lambda item: item[0])
+
+    parts, owners = footprint_parts([item[2] for item in items], radius_km)
+    if not len(parts):
+        return []
+
+    shapely.prepare(parts)
+    part_bounds = shapely.bounds(parts)
+
+    # Части полета i - parts[first_part[i]:first_part[i + 1]], bbox полета - объединение bbox частей
+    first_part = np.searchsorted(owners, np.arange(len(items) + 1))
+    counts = np.diff(first_part)
+    has_parts = counts > 0
+    bounds = np.full((len(items), 4), np.nan)
+    bounds[has_parts, :2] = np.minimum.reduceat(part_bounds[:, :2], first_part[:-1][has_parts])
+    bounds[has_parts, 2:] = np.maximum.reduceat(part_bounds[:, 2:], first_part[:-1][has_parts])
+
+    low = np.array([
+        item[2].get('altitude_min') if item[2].get('altitude_min') is not None else -np.inf
+        for item in items
+    ], dtype=float)
+    high = np.array([
+        item[2].get('altitude_max') if item[2].get('altitude_max') is not None else np.inf
+        for item in items
+    ], dtype=float)
+
+    cells: Dict[Tuple[int, int], set] = defaultdict(set)
+    item_cells: Dict[int, List[Tuple[int, int]]] = {}
+    expiry: List[Tuple[datetime, int]] = []
+    conflicts = []
+
+    for i, (start, end, flight) in enumerate(items):
+        # Полеты, завершившиеся к вылету текущего, покидают активное множество
+        while expiry and expiry[0][0] <= start:
+            _, expired = heapq.heappop(expiry)
+            for cell in item_cells.pop(expired):
+                members = cells[cell]
+                members.discard(expired)
+                if not members:
+                    del cells[cell]
+
+        if not has_parts[i]:
+            continue
+
+        min_x, min_y, max_x, max_y = bounds[i]
+        own_cells = [
+            (cx, cy)
+            for cx in range(math.floor(min_x / cell_degrees), math.floor(max_x / cell_degrees) + 1)
+            for cy in range(math.floor(min_y / cell_degrees), math.floor(max_y / cell_degrees) + 1)
+        ]
+
+        candidates = set()
+        for cell in own_cells:
+            members = cells.get(cell)
+            if members:
+                candidates.update(members)
+
+        if candidates:
+            candidates = np.fromiter(candidates, dtype=np.intp, count=len(candidates))
+            other = bounds[candidates]
+            matched = candidates[
+                (other[:, 0] <= max_x) & (other[:, 2] >= min_x)
+                & (other[:, 1] <= max_y) & (other[:, 3] >= min_y)
+                & (low[candidates] <= high[i]) & (high[candidates] >= low[i])
+            ]
+            if len(matched):
+                matched = matched[_parts_intersect(parts, first_part, matched, i)]
+
+            for j in matched.tolist():
+                overlap_end = min(end, items[j][1])
+                if window and not (start < window[1] and overlap_end > window[0]):
+                    continue
+
+                conflicts.append(_conflict(items[j][2], flight, start, overlap_end,
+                                           max(low[i], low[j]), min(high[i], high[j])))
+
+        item_cells[i] = own_cells
+        for cell in own_cells:
+            cells[cell].add(i)
+        heapq.heappush(expiry, (end, i))
+
+    return conflicts
+
+
+def _parts_intersect(parts: np.ndarray, first_part: np.ndarray,
+                     candidates: np.ndarray, i: int) -> np.ndarray:
+    """Признаки пересечения области полета i с областями полетов-кандидатов"""
+    own = parts[first_part[i]:first_part[i + 1]]
+
+    # Части кандидатов подряд и номер кандидата для каждой части
+    starts = first_part[candidates]
+    counts = first_part[candidates + 1] - starts
+    owner = np.repeat(np.arange(len(candidates)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    other = parts[np.repeat(starts, counts) + offsets]
+
+    hits = shapely.intersects(other[:, None], own[None, :]).any(axis=1)
+
+    result = np.zeros(len(candidates), dtype=bool)
+    result[owner[hits]] = True
+    return result
+
+
+def _conflict(first: Dict[str, Any], second: Dict[str, Any], start: datetime, end: datetime,
+              altitude_min: float, altitude_max: float) -> Dict[str, Any]:
+    return {
+        "flight_id": first['id'],
+        "flight_sid": first.get('sid'),
+        "other_flight_id": second['id'],
+        "other_flight_sid": second.get('sid'),
+        "start": start,
+        "end": end,
+        "altitude_min": altitude_min if math.isfinite(altitude_min) else None,
+        "altitude_max": altitude_max if math.isfinite(altitude_max) else None
+    }
+
+
+async def load_day_flights(db: AsyncSession, day: date) -> List[Dict[str, Any]]:
+    """
+    Полеты, которые могут выполняться в указанный день: с датой полета
+    в этот или предыдущий день (полеты через полночь) и известным временем вылета
+    """
+    query = select(
+        Flight.id,
+        Flight.sid,
+        Flight.dep_time,
+        Flight.arr_time,
+        Flight.duration_minutes,
+        Flight.altitude_min,
+        Flight.altitude_max,
+        Flight.flight_zone,
+        func.ST_Y(Flight.dep_point).label('dep_lat'),
+        func.ST_X(Flight.dep_point).label('dep_lon'),
+        func.ST_Y(Flight.arr_point).label('arr_lat'),
+        func.ST_X(Flight.arr_point).label('arr_lon')
+    ).where(
+        Flight.flight_date >= day - timedelta(days=1),
+        Flight.flight_date < day + timedelta(days=1),
+        Flight.dep_time.isnot(None)
+    )
+
+    result = await db.execute(query)
+    return [dict(row._mapping) for row in result.all()]
+
+
+def find_day_conflicts(flights: Sequence[Dict[str, Any]], day: date,
+                       radius_km: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Конфликты, время которых пересекается с указанным днем"""
+    started = time.perf_counter()
+    day_start = datetime.combine(day, datetime.min.time())
+
+    conflicts = detect_conflicts(flights, (day_start, day_start + timedelta(days=1)), radius_km)
+
+    logger.info(f"Конфликты за {day}: {len(conflicts)} пар среди {len(flights)} полетов "
+                f"за {time.perf_counter() - started:.2f} с")
+    return conflicts
@@ -0,0 +1,147 @@
+"""
+Пересчет производных данных за дни полетов: регионы маршрутов (flight_regions),
+агрегаты и скетчи (flight_rollup, flight_sketches), сетки плотности (flight_density).
+
+При загрузке данные пересчитываются в транзакции загрузки и фиксируются вместе
+с полетами. После фиксации из кэша удаляются ответы, которые покрывают
+затронутые дни; если это не удалось, дни записываются в stale_days
+и пересчитываются при следующей загрузке или командой:
+    python -m app.services.day_refresh
+"""
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Date, bindparam, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import response_cache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.stale_day import StaleDay
+from app.services.flight_regions import refresh_flight_regions
+from app.services.geo_service import GeoService
+from app.services.heatmap import clear_tile_cache, refresh_density
+from app.services.region_assignment import assign_ingested_regions
+from app.services.rollup import refresh_rollup
+from app.services.sketches import day_regions
+
+logger = logging.getLogger(__name__)
+
+
+async def stale_days(db: AsyncSession) -> List[date]:
+    """Дни, ожидающие пересчета"""
+    result = await db.execute(select(StaleDay.day).order_by(StaleDay.day))
+    return list(result.scalars().all())
+
+
+async def mark_stale_days(db: AsyncSession, days: Iterable[date], error: str):
+    """Запись дней, производные данные которых не пересчитаны"""
+    rows = [{"day": day, "marked_at": datetime.utcnow(), "error": error} for day in sorted(set(days))]
+    if not rows:
+        return
+
+    statement = insert(StaleDay)
+    await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[StaleDay.day],
+            set_={"marked_at": statement.excluded.marked_at, "error": statement.excluded.error}
+        ),
+        rows
+    )
+    await db.commit()
+
+
+async def refresh_days(db: AsyncSession, geo_service: GeoService, days: Iterable[date],
+                       after_id: Optional[int] = None) -> Set[str]:
+    """
+    Пересчет производных данных за дни в текущей транзакции без ее фиксации
+    (и привязка полетов без региона за эти дни и новых полетов без даты
+    с id > after_id в режиме REGION_ASSIGNMENT=postgis).
+    Дни удаляются из stale_days в той же транзакции.
+    Возвращает регионы дней до и после пересчета - для удаления ответов из кэша
+    после фиксации (полеты могли перестать пересекать регион)
+    """
+    days = sorted(set(days))
+    if not days:
+        return set()
+
+    if settings.REGION_ASSIGNMENT == 'postgis':
+        await assign_ingested_regions(db, days, after_id)
+
+    regions = await day_regions(db, days)
+
+    await refresh_flight_regions(db, geo_service, days)
+    await refresh_rollup(db, days)
+    await refresh_density(db, days)
+
+    regions |= await day_regions(db, days)
+
+    await db.execute(
+        text("DELETE FROM stale_days WHERE day = ANY(:days)").bindparams(
+            bindparam("days", type_=ARRAY(Date))
+        ),
+        {"days": days}
+    )
+    return regions
+
+
+async def refresh_ingested_days(db: AsyncSession, geo_service: GeoService, days: Iterable[date],
+                                after_id: Optional[int] = None) -> Tuple[Set[date], Set[str]]:
+    """
+    Пересчет производных данных за дни загрузки и дни, ожидающие пересчета,
+    в транзакции загрузки (до ее фиксации). Возвращает пересчитанные дни и их регионы
+    """
+    days = set(days) | set(await stale_days(db))
+    return days, await refresh_days(db, geo_service, days, after_id)
+
+
+async def invalidate_days(db: AsyncSession, days: Iterable[date], regions: Iterable[str]) -> Optional[str]:
+    """
+    Удаление из кэшей ответов и тайлов, которые покрывают пересчитанные дни,
+    после фиксации. Ошибка не отменяет загрузку: дни записываются в stale_days,
+    а возвращается предупреждение для состояния задачи (None - кэш очищен)
+    """
+    days = set(days)
+    try:
+        clear_tile_cache()
+        await response_cache.invalidate(days, regions)
+        return None
+
+    except Exception as e:
+        logger.exception(f"Ошибка удаления из кэша ответов за {len(days)} дн.")
+
+        try:
+            await mark_stale_days(db, days, str(e))
+        except Exception:
+            logger.exception(f"Не удалось отметить дни для пересчета: {', '.join(map(str, sorted(days)))}")
+            await db.rollback()
+
+        return (
+            f"Полеты и агрегаты сохранены, но кэш ответов за {len(days)} дн. не очищен: {e}. "
+            f"Дни будут пересчитаны при следующей загрузке"
+        )
+
+
+async def _refresh_stale():
+    geo_service = GeoService()
+    async with AsyncSessionLocal() as db:
+        days = await stale_days(db)
+        regions = await refresh_days(db, geo_service, days)
+        await db.commit()
+
+        warning = await invalidate_days(db, days, regions) if days else None
+    print(f"Пересчитано дней: {len(days)}")
+    if warning:
+        print(warning)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_refresh_stale())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,48 @@
 import pandas as pd
-from datetime import datetime, time
-from typing import List, Dict, Any
+from datetime import datetime, time, timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 import logging
 import re
+from functools import lru_cache
+
+from openpyxl import load_workbook
+
+from app.services.parser import TelegramParser
 
 logger = logging.getLogger(__name__)
 
+OPERATOR_RE = re.compile(r'OPR/([^/]+)')
+PHONE_RE = re.compile(r'\+?[78][\d\s\-\(\)]{10,}')
+COORDINATES_COLUMN_RE = re.compile(r'^\s*(\d{2})(\d{2})([NS])(\d{3})(\d{2})([EW])')
+
+TIME_FORMATS = ['%H:%M:%S', '%H:%M', '%I:%M %p', '%I:%M:%S %p']
+DATE_FORMATS = ['%d/%m/%y', '%d/%m/%Y', '%Y-%m-%d', '%d.%m.%Y', '%d.%m.%y']
+
+# В выгрузке повторяются одни и те же даты и время, поэтому их разбор кэшируется
+PARSE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_time_str(time_str: str) -> Optional[time]:
+    """Парсинг строки времени по известным форматам"""
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(time_str, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_date_str(date_str: str) -> datetime:
+    """Парсинг строки даты по известным форматам"""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            continue
+    return pd.to_datetime(date_str, errors='coerce')
+
 
 class ExcelParser:
     """Парсер Excel файлов с полетными данными"""
@@ -17,18 +54,7 @@ class ExcelParser:
             return None
 
         if isinstance(time_str, str):
-            # Пробуем разные форматы
-            formats = [
-                '%H:%M:%S',
-                '%H:%M',
-                '%I:%M %p',
-                '%I:%M:%S %p'
-            ]
-            for fmt in formats:
-                try:
-                    return datetime.strptime(time_str, fmt).time()
-                except:
-                    continue
+            return _parse_time_str(time_str)
         elif isinstance(time_str, (datetime, pd.Timestamp)):
             return time_str.time()
         elif isinstance(time_str, time):
@@ -46,131 +72,337 @@ class ExcelParser:
             return date_val
 
         if isinstance(date_val, str):
-            # Пробуем разные форматы дат
-            formats = [
-                '%d/%m/%y',
-                '%d/%m/%Y',
-                '%Y-%m-%d',
-                '%d.%m.%Y',
-                '%d.%m.%y'
-            ]
-            for fmt in formats:
-                try:
-                    return datetime.strptime(date_val, fmt)
-                except:
-                    continue
+            return _parse_date_str(date_val)
 
         return pd.to_datetime(date_val, errors='coerce')
 
     @staticmethod
-    def parse_flight_data(file_path: str) -> List[Dict[str, Any]]:
-        """Парсинг Excel файла с данными о полетах"""
+    def cell_str(value) -> Optional[str]:
+        """Значение ячейки как строка (как при чтении pandas с dtype=str)"""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    @staticmethod
+    def iter_sheet_rows(source: Union[str, BinaryIO]) -> Iterator[tuple]:
+        """
+        Строки активного листа (включая заголовок) в режиме read_only.
+        source - путь к файлу или открытый бинарный файл.
+        """
         try:
-            # Читаем Excel с правильными настройками
-            df = pd.read_excel(
-                file_path,
-                engine='openpyxl',
-                parse_dates=False,  # Отключаем автопарсинг дат
-                dtype=str  # Читаем все как строки для контроля
-            )
+            workbook = load_workbook(source, read_only=True, data_only=True)
+        except Exception as e:
+            logger.error(f"Ошибка парсинга Excel файла: {e}")
+            raise
+
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def column_index(header: tuple) -> Dict[str, int]:
+        """Индекс колонки по заголовку (при повторах - первая колонка)"""
+        columns: Dict[str, int] = {}
+        for index, name in enumerate(header):
+            if name is not None:
+                columns.setdefault(str(name).strip(), index)
+        return columns
 
-            logger.info(f"Загружено {len(df)} строк из Excel")
-            logger.info(f"Колонки: {df.columns.tolist()}")
+    @staticmethod
+    def iter_flight_data(source: Union[str, BinaryIO]) -> Iterator[Dict[str, Any]]:
+        """
+        Потоковый парсинг Excel файла с данными о полетах.
+        Лист читается openpyxl в режиме read_only построчно, полеты отдаются по одному,
+        поэтому потребление памяти не зависит от количества строк.
+        source - путь к файлу или открытый бинарный файл.
+        """
+        rows = ExcelParser.iter_sheet_rows(source)
+
+        header = next(rows, None)
+        if header is None:
+            return
+
+        columns = ExcelParser.column_index(header)
+        logger.info(f"Колонки: {list(columns)}")
+
+        def getter(name: str) -> Callable[[tuple], Any]:
+            index = columns.get(name)
+            if index is None:
+                return lambda row: None
+            return lambda row: row[index] if index < len(row) else None
+
+        get_date = getter('Дата')
+        get_dep_time = getter('Т выл.факт')
+        get_arr_time = getter('Т пос.факт')
+        get_dep_coords = getter('АРВ')
+        get_arr_coords = getter('АРП')
+        get_field_18 = getter('Поле 18')
+        get_flight_number = getter('Рейс')
+        get_aircraft = getter('Борт')
+        get_aircraft_type = getter('Тип ВС')
+        get_dep_airport = getter('А/В')
+        get_arr_airport = getter('А/П')
+        get_route = getter('Маршрут')
+
+        cell_str = ExcelParser.cell_str
+        count = 0
+
+        for idx, row in enumerate(rows):
+            # Пустые строки в конце листа
+            if not any(value is not None for value in row):
+                continue
+
+            try:
+                # Парсим дату
+                date_val = get_date(row)
+                flight_date = ExcelParser.parse_date_field(date_val) if date_val is not None else None
+
+                # Парсим время вылета и посадки
+                dep_time_str = get_dep_time(row)
+                arr_time_str = get_arr_time(row)
+
+                dep_time_obj = ExcelParser.parse_time_string(dep_time_str) if dep_time_str is not None else None
+                arr_time_obj = ExcelParser.parse_time_string(arr_time_str) if arr_time_str is not None else None
+
+                # Создаем полные datetime объекты
+                dep_datetime = None
+                arr_datetime = None
+
+                if flight_date and dep_time_obj:
+                    dep_datetime = datetime.combine(flight_date.date(), dep_time_obj)
+
+                if flight_date and arr_time_obj:
+                    arr_datetime = datetime.combine(flight_date.date(), arr_time_obj)
+
+                # Рассчитываем продолжительность
+                duration_minutes = None
+                if dep_datetime and arr_datetime:
+                    duration = arr_datetime - dep_datetime
+                    # Если прилет на следующий день
+                    if duration.total_seconds() < 0:
+                        arr_datetime += timedelta(days=1)
+                        duration = arr_datetime - dep_datetime
+                    duration_minutes = int(duration.total_seconds() / 60)
+
+                # Парсим координаты
+                dep_coords = cell_str(get_dep_coords(row))
+                arr_coords = cell_str(get_arr_coords(row))
+
+                dep_coords_parsed = TelegramParser.parse_coordinates(dep_coords) if dep_coords else None
+                arr_coords_parsed = TelegramParser.parse_coordinates(arr_coords) if arr_coords else None
+
+                # Обрабатываем поле 18 для извлечения дополнительной информации
+                field_18 = cell_str(get_field_18(row))
+                operator = None
+                operator_phone = None
+
+                if field_18:
+                    # Ищем оператора
+                    opr_match = OPERATOR_RE.search(field_18)
+                    if opr_match:
+                        operator = opr_match.group(1).strip()
+
+                    # Ищем телефон
+                    phone_match = PHONE_RE.search(field_18)
+                    if phone_match:
+                        operator_phone = phone_match.group(0).strip()
+
+                yield {
+                    'date': flight_date,
+                    'flight_number': cell_str(get_flight_number(row)),
+                    'aircraft': cell_str(get_aircraft(row)),
+                    'aircraft_type': cell_str(get_aircraft_type(row)),
+                    'dep_time': dep_datetime,
+                    'arr_time': arr_datetime,
+                    'dep_coords': dep_coords,
+                    'dep_airport': cell_str(get_dep_airport(row)),
+                    'arr_coords': arr_coords,
+                    'arr_airport': cell_str(get_arr_airport(row)),
+                    'route': cell_str(get_route(row)),
+                    'field_18': field_18,
+                    'dep_coords_parsed': dep_coords_parsed,
+                    'arr_coords_parsed': arr_coords_parsed,
+                    'duration_minutes': duration_minutes,
+                    'operator': operator,
+                    'operator_phone': operator_phone
+                }
+                count += 1
+
+            except Exception as e:
+                logger.warning(f"Ошибка парсинга строки {idx}: {e}")
+                continue
+
+        logger.info(f"Успешно распарсено {count} полетов из Excel")
 
-            flights = []
+    @staticmethod
+    def parse_flight_data(source: Union[str, BinaryIO]) -> List[Dict[str, Any]]:
+        """Парсинг Excel файла с данными о полетах"""
+        return list(ExcelParser.iter_flight_data(source))
 
-            for idx, row in df.iterrows():
-                try:
-                    # Парсим дату
-                    flight_date = ExcelParser.parse_date_field(row.get('Дата'))
+    @staticmethod
+    def iter_flight_columns(source: Union[str, BinaryIO],
+                            chunk_rows: int = 10000) -> Iterator[Dict[str, list]]:
+        """
+        Векторизованный парсинг Excel файла.
+        Строки листа читаются потоково и собираются во фрагменты по chunk_rows,
+        каждый фрагмент разбирается операциями pandas над колонками целиком.
+        Отдает колоночные пачки: ключи те же, что у iter_flight_data,
+        значения - списки одинаковой длины; вместо dep_coords_parsed/arr_coords_parsed
+        пачка содержит dep_lat, dep_lon, arr_lat, arr_lon (None, если координаты не разобраны).
+        """
+        rows = ExcelParser.iter_sheet_rows(source)
+
+        header = next(rows, None)
+        if header is None:
+            return
+
+        columns = ExcelParser.column_index(header)
+        logger.info(f"Колонки: {list(columns)}")
+
+        count = 0
+        chunk: List[tuple] = []
+
+        for row in rows:
+            # Пустые строки в конце листа
+            if any(value is not None for value in row):
+                chunk.append(row)
+
+            if len(chunk) >= chunk_rows:
+                batch = ExcelParser.parse_flight_frame(pd.DataFrame.from_records(chunk), columns)
+                count += len(chunk)
+                chunk = []
+                yield batch
+
+        if chunk:
+            count += len(chunk)
+            yield ExcelParser.parse_flight_frame(pd.DataFrame.from_records(chunk), columns)
+
+        logger.info(f"Успешно распарсено {count} полетов из Excel")
 
-                    # Парсим время вылета и посадки
-                    dep_time_str = row.get('Т выл.факт')
-                    arr_time_str = row.get('Т пос.факт')
+    @staticmethod
+    def parse_flight_frame(frame: pd.DataFrame, columns: Dict[str, int]) -> Dict[str, list]:
+        """Разбор фрагмента листа операциями над колонками"""
+
+        def text(name: str) -> pd.Series:
+            # Значения колонки как строки (как при чтении pandas с dtype=str)
+            index = columns.get(name)
+            if index is None or index not in frame.columns:
+                return pd.Series(None, index=frame.index, dtype=object)
+            column = frame[index]
+            if pd.api.types.infer_dtype(column, skipna=True) in ('string', 'empty'):
+                return column.astype(object)
+            return column.map(ExcelParser.cell_str, na_action='ignore').astype(object)
+
+        # Даты и время вылета/посадки
+        flight_date = ExcelParser._parse_datetimes(text('Дата'), DATE_FORMATS, fallback=True)
+        day = flight_date.dt.normalize()
+
+        dep_datetime = day + ExcelParser._parse_time_of_day(text('Т выл.факт'))
+        arr_datetime = day + ExcelParser._parse_time_of_day(text('Т пос.факт'))
+
+        # Если прилет на следующий день
+        overnight = arr_datetime < dep_datetime
+        arr_datetime = arr_datetime.mask(overnight, arr_datetime + pd.Timedelta(days=1))
+
+        duration_minutes = ((arr_datetime - dep_datetime).dt.total_seconds() // 60).astype('Int64')
+
+        # Координаты
+        dep_coords = text('АРВ')
+        arr_coords = text('АРП')
+        dep_lat, dep_lon = ExcelParser._parse_coordinates(dep_coords)
+        arr_lat, arr_lon = ExcelParser._parse_coordinates(arr_coords)
+
+        # Оператор и телефон из поля 18
+        field_18 = text('Поле 18')
+        operator = field_18.str.extract(OPERATOR_RE, expand=False).str.strip()
+        operator_phone = field_18.str.extract(f"({PHONE_RE.pattern})", expand=False).str.strip()
+
+        batch = {
+            'date': flight_date,
+            'flight_number': text('Рейс'),
+            'aircraft': text('Борт'),
+            'aircraft_type': text('Тип ВС'),
+            'dep_time': dep_datetime,
+            'arr_time': arr_datetime,
+            'dep_coords': dep_coords,
+            'dep_airport': text('А/В'),
+            'arr_coords': arr_coords,
+            'arr_airport': text('А/П'),
+            'route': text('Маршрут'),
+            'field_18': field_18,
+            'dep_lat': dep_lat,
+            'dep_lon': dep_lon,
+            'arr_lat': arr_lat,
+            'arr_lon': arr_lon,
+            'duration_minutes': duration_minutes,
+            'operator': operator,
+            'operator_phone': operator_phone
+        }
+
+        return {name: ExcelParser._column_values(series) for name, series in batch.items()}
 
-                    dep_time_obj = ExcelParser.parse_time_string(dep_time_str)
-                    arr_time_obj = ExcelParser.parse_time_string(arr_time_str)
+    @staticmethod
+    def _by_unique(values: pd.Series, parse: Callable[[pd.Series], Any]) -> Any:
+        """
+        Разбор только уникальных значений колонки с раскладкой результата по строкам:
+        даты, время и точки в выгрузке многократно повторяются
+        """
+        codes, uniques = pd.factorize(values)
+        parsed = parse(pd.Series(uniques, dtype=object))
+        # Код -1 (пропуск) отсутствует в индексе и дает NaN/NaT
+        return parsed.reindex(codes).set_axis(values.index)
 
-                    # Создаем полные datetime объекты
-                    dep_datetime = None
-                    arr_datetime = None
+    @staticmethod
+    def _parse_datetimes(values: pd.Series, formats: List[str], fallback: bool = False) -> pd.Series:
+        """Разбор колонки по списку форматов: каждое значение - первым подходящим"""
 
-                    if flight_date and dep_time_obj:
-                        dep_datetime = datetime.combine(flight_date.date(), dep_time_obj)
+        def parse(uniques: pd.Series) -> pd.Series:
+            result = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
 
-                    if flight_date and arr_time_obj:
-                        arr_datetime = datetime.combine(flight_date.date(), arr_time_obj)
+            for fmt in formats:
+                pending = result.isna()
+                if not pending.any():
+                    return result
+                result = result.fillna(pd.to_datetime(uniques.where(pending), format=fmt, errors='coerce'))
 
-                    # Рассчитываем продолжительность
-                    duration_minutes = None
-                    if dep_datetime and arr_datetime:
-                        duration = arr_datetime - dep_datetime
-                        # Если прилет на следующий день
-                        if duration.total_seconds() < 0:
-                            arr_datetime += pd.Timedelta(days=1)
-                            duration = arr_datetime - dep_datetime
-                        duration_minutes = int(duration.total_seconds() / 60)
-
-                    # Парсим координаты
-                    dep_coords = row.get('АРВ')
-                    arr_coords = row.get('АРП')
-
-                    dep_coords_parsed = None
-                    arr_coords_parsed = None
-
-                    if dep_coords and isinstance(dep_coords, str):
-                        from app.services.parser import TelegramParser
-                        dep_coords_parsed = TelegramParser.parse_coordinates(dep_coords)
-
-                    if arr_coords and isinstance(arr_coords, str):
-                        from app.services.parser import TelegramParser
-                        arr_coords_parsed = TelegramParser.parse_coordinates(arr_coords)
-
-                    # Обрабатываем поле 18 для извлечения дополнительной информации
-                    field_18 = row.get('Поле 18', '')
-                    operator = None
-                    operator_phone = None
-
-                    if field_18:
-                        # Ищем оператора
-                        opr_match = re.search(r'OPR/([^/]+)', str(field_18))
-                        if opr_match:
-                            operator = opr_match.group(1).strip()
-
-                        # Ищем телефон
-                        phone_match = re.search(r'\+?[78][\d\s\-\(\)]{10,}', str(field_18))
-                        if phone_match:
-                            operator_phone = phone_match.group(0).strip()
-
-                    flight = {
-                        'date': flight_date,
-                        'flight_number': row.get('Рейс'),
-                        'aircraft': row.get('Борт'),
-                        'aircraft_type': row.get('Тип ВС'),
-                        'dep_time': dep_datetime,
-                        'arr_time': arr_datetime,
-                        'dep_coords': dep_coords,
-                        'dep_airport': row.get('А/В'),
-                        'arr_coords': arr_coords,
-                        'arr_airport': row.get('А/П'),
-                        'route': row.get('Маршрут'),
-                        'field_18': field_18,
-                        'dep_coords_parsed': dep_coords_parsed,
-                        'arr_coords_parsed': arr_coords_parsed,
-                        'duration_minutes': duration_minutes,
-                        'operator': operator,
-                        'operator_phone': operator_phone
-                    }
-
-                    flights.append(flight)
-
-                except Exception as e:
-                    logger.warning(f"Ошибка парсинга строки {idx}: {e}")
-                    continue
-
-            logger.info(f"Успешно распарсено {len(flights)} полетов из Excel")
-            return flights
+            pending = result.isna()
+            if fallback and pending.any():
+                result = result.fillna(pd.to_datetime(uniques.where(pending), format='mixed', errors='coerce'))
 
-        except Exception as e:
-            logger.error(f"Ошибка парсинга Excel файла: {e}")
-            raise
\ No newline at end of file
+            return result
+
+        return ExcelParser._by_unique(values, parse)
+
+    @staticmethod
+    def _parse_time_of_day(values: pd.Series) -> pd.Series:
+        """Время суток как смещение от полуночи"""
+        parsed = ExcelParser._parse_datetimes(values, TIME_FORMATS)
+        return parsed - parsed.dt.normalize()
+
+    @staticmethod
+    def _parse_coordinates(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        """Разбор координат формата DDMMN/DDDMME одним регулярным выражением"""
+
+        def parse(uniques: pd.Series) -> pd.DataFrame:
+            parts = uniques.str.extract(COORDINATES_COLUMN_RE)
+
+            lat = parts[0].astype(float) + parts[1].astype(float) / 60.0
+            lon = parts[3].astype(float) + parts[4].astype(float) / 60.0
+
+            return pd.DataFrame({
+                'lat': lat.mask(parts[2] == 'S', -lat),
+                'lon': lon.mask(parts[5] == 'W', -lon)
+            })
+
+        coordinates = ExcelParser._by_unique(values, parse)
+        return coordinates['lat'], coordinates['lon']
+
+    @staticmethod
+    def _column_values(series: pd.Series) -> list:
+        """Значения колонки списком Python объектов, пропуски - None"""
+        return series.astype(object).where(series.notna(), None).tolist()
@@ -0,0 +1,92 @@
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from geoalchemy2 import Geometry
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.flight import Flight
+
+# Поля списка полетов: колонки flights (кроме геометрий) и координаты точек
+FLIGHT_FIELDS = {
+    column.name: column
+    for column in Flight.__table__.columns
+    if not isinstance(column.type, Geometry)
+}
+FLIGHT_FIELDS.update(
+    dep_lat=func.ST_Y(Flight.dep_point).label('dep_lat'),
+    dep_lon=func.ST_X(Flight.dep_point).label('dep_lon'),
+    arr_lat=func.ST_Y(Flight.arr_point).label('arr_lat'),
+    arr_lon=func.ST_X(Flight.arr_point).label('arr_lon')
+)
+
+# Поля по умолчанию (как в FlightResponse): исходные тексты телеграмм
+# raw_shr/raw_dep/raw_arr читаются только по запросу
+DEFAULT_FIELDS = (
+    'id', 'sid', 'flight_date', 'dep_coords', 'arr_coords', 'dep_region', 'arr_region',
+    'operator', 'uav_type', 'uav_reg', 'duration_minutes', 'status', 'created_at', 'updated_at'
+)
+
+FlightKey = Tuple[Optional[datetime], int]
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Список полей через запятую (None - поля по умолчанию), повторы отбрасываются"""
+    if not fields:
+        return list(DEFAULT_FIELDS)
+
+    names = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+    unknown = [name for name in names if name not in FLIGHT_FIELDS]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+    if not names:
+        raise ValueError("Не указаны поля")
+
+    return names
+
+
+async def list_flights(db: AsyncSession,
+                       fields: Sequence[str] = DEFAULT_FIELDS,
+                       start_date: Optional[date] = None,
+                       end_date: Optional[date] = None,
+                       after: Optional[FlightKey] = None,
+                       limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[FlightKey]]:
+    """
+    Страница полетов в порядке (flight_date, id) с keyset пагинацией после ключа after:
+    запрос продолжает индекс idx_flights_date_id с места остановки, поэтому
+    дальние страницы не дороже первой. Полеты без даты идут в конце (по id),
+    если период не задан.
+    Из БД читаются только колонки полей fields, записи собираются из кортежей строк.
+    Возвращает записи и ключ последней записи, если есть следующая страница
+    """
+    columns = [FLIGHT_FIELDS[name] for name in fields]
+    # Ключ сортировки читается всегда, в ответ попадают только запрошенные поля
+    query = select(Flight.flight_date.label('_key_date'), Flight.id.label('_key_id'), *columns)
+
+    rows = []
+    if after is None or after[0] is not None:
+        dated = query.where(Flight.flight_date.is_not(None))
+        if start_date:
+            dated = dated.where(Flight.flight_date >= start_date)
+        if end_date:
+            dated = dated.where(Flight.flight_date < end_date + timedelta(days=1))
+        if after is not None:
+            dated = dated.where(tuple_(Flight.flight_date, Flight.id) > tuple_(*after))
+
+        # Лишняя запись показывает, есть ли следующая страница
+        result = await db.execute(dated.order_by(Flight.flight_date, Flight.id).limit(limit + 1))
+        rows = result.all()
+
+    if len(rows) <= limit and not (start_date or end_date):
+        undated = query.where(Flight.flight_date.is_(None))
+        if after is not None and after[0] is None:
+            undated = undated.where(Flight.id > after[1])
+
+        result = await db.execute(undated.order_by(Flight.id).limit(limit + 1 - len(rows)))
+        rows += result.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [dict(zip(fields, row[2:])) for row in rows]
+    return items, (rows[-1][0], rows[-1][1]) if has_more else None
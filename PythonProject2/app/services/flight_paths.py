@@ -0,0 +1,169 @@
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString, Point, Polygon
+
+# Километров в градусе широты
+KM_PER_DEGREE = 111.32
+
+# Средний радиус Земли, км
+EARTH_RADIUS_KM = 6371.0
+
+# Вершин в многоугольнике, приближающем круг
+CIRCLE_VERTICES = 32
+
+_ANGLES = np.linspace(0, 2 * np.pi, CIRCLE_VERTICES + 1)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Расстояние по большому кругу между массивами точек, км (NaN для пустых координат)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def lengths_km(geometries: np.ndarray) -> np.ndarray:
+    """Длина линий по большому кругу, км (точки и пустые геометрии - 0)"""
+    geometries = np.asarray(geometries, dtype=object)
+    result = np.zeros(len(geometries))
+
+    # Вершины разных частей мультилиний не соединяются между собой
+    parts, owners = shapely.get_parts(geometries, return_index=True)
+    coords, vertex_parts = shapely.get_coordinates(parts, return_index=True)
+    if len(coords) < 2:
+        return result
+
+    segments = vertex_parts[1:] == vertex_parts[:-1]
+    lengths = haversine_km(coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0])
+    np.add.at(result, owners[vertex_parts[1:][segments]], lengths[segments])
+
+    return result
+
+
+def route_lengths_km(dep_lats, dep_lons, arr_lats, arr_lons,
+                     zones: Optional[Sequence[Optional[Dict[str, Any]]]] = None) -> np.ndarray:
+    """
+    Протяженность пути полетов по большому кругу, км: вылет - точки маршрута
+    из flight_zone (path) - посадка. NaN - у полета меньше двух известных точек.
+    Полеты без точек маршрута считаются одним вызовом ядра по колонкам координат
+    """
+    dep_lats, dep_lons, arr_lats, arr_lons = (
+        np.asarray(value, dtype=float) for value in (dep_lats, dep_lons, arr_lats, arr_lons)
+    )
+    lengths = haversine_km(dep_lats, dep_lons, arr_lats, arr_lons)
+
+    routed = [
+        index for index, zone in enumerate(zones or ())
+        if isinstance(zone, dict) and zone.get('path')
+    ]
+    if not routed:
+        return lengths
+
+    # Вершины путей с маршрутом подряд с номером полета, пустые точки пропускаются
+    owners, lats, lons = [], [], []
+    for index in routed:
+        points = [(dep_lats[index], dep_lons[index]), *zones[index]['path'], (arr_lats[index], arr_lons[index])]
+        for lat, lon in points:
+            if lat is not None and lon is not None and not (np.isnan(lat) or np.isnan(lon)):
+                owners.append(index)
+                lats.append(lat)
+                lons.append(lon)
+
+    owners = np.array(owners, dtype=np.intp)
+    lats = np.array(lats, dtype=float)
+    lons = np.array(lons, dtype=float)
+
+    totals = np.zeros(len(lengths))
+    segments = owners[1:] == owners[:-1]
+    np.add.at(totals, owners[1:][segments],
+              haversine_km(lats[:-1], lons[:-1], lats[1:], lons[1:])[segments])
+
+    vertices = np.bincount(owners, minlength=len(lengths))
+    lengths[routed] = np.where(vertices[routed] >= 2, totals[routed], np.nan)
+
+    return lengths
+
+
+def circles(lats: np.ndarray, lons: np.ndarray, radius_km: np.ndarray) -> np.ndarray:
+    """
+    Круги радиусом radius_km в градусах (эллипсы с учетом сжатия долготы на широте),
+    построенные одним векторным вызовом
+    """
+    radius = np.asarray(radius_km, dtype=float) / KM_PER_DEGREE
+    stretch = 1 / np.maximum(np.cos(np.radians(lats)), 0.01)
+
+    coords = np.empty((len(lats), len(_ANGLES), 2))
+    coords[:, :, 0] = lons[:, None] + (radius * stretch)[:, None] * np.cos(_ANGLES)
+    coords[:, :, 1] = lats[:, None] + radius[:, None] * np.sin(_ANGLES)
+
+    return shapely.polygons(coords)
+
+
+def zone_polygon(zone: Dict[str, Any]):
+    """Полигон зоны полета из flight_zone (см. TelegramParser.parse_zone)"""
+    points = zone.get('polygon') or []
+    if len(points) < 3:
+        return None
+
+    polygon = Polygon([(lon, lat) for lat, lon in points])
+    return polygon if polygon.is_valid else shapely.make_valid(polygon)
+
+
+def flight_path(dep: Optional[Tuple[float, float]], arr: Optional[Tuple[float, float]],
+                zone: Optional[Dict[str, Any]] = None):
+    """
+    Линия пути полета: точка вылета, точки маршрута из flight_zone (path) и точка посадки.
+    Полет с одной известной точкой (или вылетом и посадкой в одной точке) - Point
+    """
+    points = [dep] + [tuple(point) for point in (zone or {}).get('path') or ()] + [arr]
+    coords = []
+    for point in points:
+        if point is None or point[0] is None or point[1] is None:
+            continue
+        coord = (point[1], point[0])
+        if not coords or coords[-1] != coord:
+            coords.append(coord)
+
+    if not coords:
+        return None
+    if len(coords) == 1:
+        return Point(coords[0])
+    return LineString(coords)
+
+
+def flight_shapes(flights: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Геометрии полетов: линии пути (flight_path) и зоны из flight_zone
+    (круг или полигон, None - зона не задана).
+    Полеты - словари с dep_lat/dep_lon, arr_lat/arr_lon и flight_zone
+    """
+    paths = np.empty(len(flights), dtype=object)
+    areas = np.full(len(flights), None, dtype=object)
+    circle_flights, lats, lons, radii = [], [], [], []
+
+    for index, flight in enumerate(flights):
+        zone = flight.get('flight_zone') if isinstance(flight.get('flight_zone'), dict) else None
+        paths[index] = flight_path(
+            (flight.get('dep_lat'), flight.get('dep_lon')),
+            (flight.get('arr_lat'), flight.get('arr_lon')),
+            zone
+        )
+
+        if zone is None:
+            continue
+        if zone.get('center') and zone.get('radius_km'):
+            circle_flights.append(index)
+            lats.append(zone['center'][0])
+            lons.append(zone['center'][1])
+            radii.append(float(zone['radius_km']))
+        else:
+            polygon = zone_polygon(zone)
+            if polygon is not None and not polygon.is_empty:
+                areas[index] = polygon
+
+    if circle_flights:
+        areas[circle_flights] = circles(np.array(lats, dtype=float), np.array(lons, dtype=float), np.array(radii))
+
+    return paths, areas
@@ -0,0 +1,107 @@
+import logging
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Date, Integer, bindparam, cast, func, insert, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.flight import Flight
+from app.models.flight_region import FlightRegion
+from app.services.flight_paths import flight_shapes
+from app.services.geo_service import GeoService
+
+logger = logging.getLogger(__name__)
+
+_DELETE_SQL = text("DELETE FROM flight_regions WHERE flight_id = ANY(:ids)").bindparams(
+    bindparam("ids", type_=ARRAY(Integer))
+)
+
+
+def flight_region_rows(geo_service: GeoService, flights: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Строки flight_regions для полетов: регионы, которые пересекают путь и зона полета,
+    а также регионы вылета и посадки (в том числе UNKNOWN_REGION и у полетов без точек)
+    """
+    paths, areas = flight_shapes(flights)
+    positions, names, distances = geo_service.regions_crossed(paths, areas)
+
+    crossed: Dict[tuple, Optional[float]] = {}
+    for position, name, distance in zip(positions.tolist(), names.tolist(), distances.tolist()):
+        crossed[(flights[position]['id'], name)] = distance
+
+    for flight, path in zip(flights, paths):
+        for name in (flight.get('dep_region'), flight.get('arr_region')):
+            if name:
+                crossed.setdefault((flight['id'], name), None if path is None else 0.0)
+
+    return [
+        {"flight_id": flight_id, "region": name, "distance_km": distance}
+        for (flight_id, name), distance in crossed.items()
+    ]
+
+
+async def refresh_flight_regions(db: AsyncSession,
+                                 geo_service: GeoService,
+                                 days: Optional[Iterable[date]] = None,
+                                 batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Пересчет flight_regions за указанные дни полетов (None - полная перестройка)
+    в текущей транзакции без ее фиксации (при загрузке - вместе с полетами).
+    Полеты читаются пачками по id, геометрия считается в отдельном потоке.
+    """
+    batch_size = batch_size or settings.REGION_ASSIGN_BATCH_SIZE
+    started = time.perf_counter()
+
+    query = select(
+        Flight.id,
+        Flight.dep_region,
+        Flight.arr_region,
+        Flight.flight_zone,
+        func.ST_Y(Flight.dep_point).label('dep_lat'),
+        func.ST_X(Flight.dep_point).label('dep_lon'),
+        func.ST_Y(Flight.arr_point).label('arr_lat'),
+        func.ST_X(Flight.arr_point).label('arr_lon')
+    )
+
+    if days is None:
+        await db.execute(text("TRUNCATE flight_regions"))
+    else:
+        days = sorted(set(days))
+        if not days:
+            return {"flights": 0, "rows": 0, "elapsed_sec": 0.0}
+
+        # Диапазон дат использует индекс по flight_date
+        query = query.where(
+            Flight.flight_date >= days[0],
+            Flight.flight_date < days[-1] + timedelta(days=1),
+            cast(Flight.flight_date, Date).in_(days)
+        )
+
+    flights_count = rows_count = 0
+    last_id = 0
+
+    while True:
+        result = await db.execute(query.where(Flight.id > last_id).order_by(Flight.id).limit(batch_size))
+        flights = [dict(row._mapping) for row in result.all()]
+        if not flights:
+            break
+
+        rows = await run_in_threadpool(flight_region_rows, geo_service, flights)
+
+        if days is not None:
+            await db.execute(_DELETE_SQL, {"ids": [flight['id'] for flight in flights]})
+        if rows:
+            await db.execute(insert(FlightRegion), rows)
+
+        flights_count += len(flights)
+        rows_count += len(rows)
+        last_id = flights[-1]['id']
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Регионы маршрутов: {rows_count} записей для {flights_count} полетов за {elapsed:.1f} с")
+
+    return {"flights": flights_count, "rows": rows_count, "elapsed_sec": round(elapsed, 3)}
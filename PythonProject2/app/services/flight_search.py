@@ -0,0 +1,139 @@
+import json
+import math
+from datetime import date, timedelta
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from shapely.geometry import shape
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.flight import Flight
+from app.services.flight_paths import KM_PER_DEGREE
+from app.services.geo_service import SRID
+
+# Максимальный радиус поиска, км
+MAX_RADIUS_KM = 1000
+
+
+class PointField(str, Enum):
+    """Точка полета, по которой выполняется пространственный поиск"""
+    DEP = "dep"
+    ARR = "arr"
+
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """
+    Прямоугольник min_lon,min_lat,max_lon,max_lat.
+    min_lon > max_lon - прямоугольник через антимеридиан
+    """
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(','))
+    except ValueError:
+        raise ValueError("bbox должен быть в формате min_lon,min_lat,max_lon,max_lat")
+
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise ValueError("bbox выходит за допустимые координаты")
+
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_polygon(polygon: str):
+    """Полигон из GeoJSON (геометрия или Feature) в WGS 84"""
+    try:
+        data = json.loads(polygon)
+        if data.get("type") == "Feature":
+            data = data["geometry"]
+        geometry = shape(data)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("polygon должен быть геометрией GeoJSON")
+
+    if geometry.geom_type not in ('Polygon', 'MultiPolygon') or geometry.is_empty:
+        raise ValueError("polygon должен быть Polygon или MultiPolygon")
+    if not geometry.is_valid:
+        raise ValueError("polygon содержит некорректную геометрию")
+
+    return geometry
+
+
+def _envelope(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    return func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, SRID)
+
+
+async def search_flights(db: AsyncSession,
+                         point: PointField = PointField.DEP,
+                         bbox: Optional[Tuple[float, float, float, float]] = None,
+                         center: Optional[Tuple[float, float]] = None,
+                         radius_km: Optional[float] = None,
+                         polygon=None,
+                         date_from: Optional[date] = None,
+                         date_to: Optional[date] = None,
+                         after_id: Optional[int] = None,
+                         limit: int = 100) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Пространственный поиск полетов по точке вылета или посадки.
+    Фильтры объединяются по И и проверяются с использованием GiST индекса точек:
+    bbox - оператором &&, радиус - ST_DWithin по bbox в градусах с точной проверкой
+    расстояния по геодезической метрике, полигон - ST_Intersects.
+    Результат упорядочен по id (keyset пагинация после after_id).
+    Возвращает страницу записей и признак наличия следующей страницы.
+    """
+    column = Flight.dep_point if point == PointField.DEP else Flight.arr_point
+
+    query = select(
+        Flight.id,
+        Flight.sid,
+        Flight.flight_date,
+        Flight.dep_time,
+        Flight.arr_time,
+        Flight.dep_region,
+        Flight.arr_region,
+        Flight.operator,
+        Flight.uav_type,
+        func.ST_Y(Flight.dep_point).label('dep_lat'),
+        func.ST_X(Flight.dep_point).label('dep_lon'),
+        func.ST_Y(Flight.arr_point).label('arr_lat'),
+        func.ST_X(Flight.arr_point).label('arr_lon')
+    )
+
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        if min_lon <= max_lon:
+            query = query.where(column.op('&&')(_envelope(min_lon, min_lat, max_lon, max_lat)))
+        else:
+            query = query.where(or_(
+                column.op('&&')(_envelope(min_lon, min_lat, 180, max_lat)),
+                column.op('&&')(_envelope(-180, min_lat, max_lon, max_lat))
+            ))
+
+    if center is not None and radius_km:
+        lat, lon = center
+        origin = func.ST_SetSRID(func.ST_MakePoint(lon, lat), SRID)
+
+        # Радиус в градусах с запасом по долготе на самой северной широте круга
+        lat_degrees = radius_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(abs(lat) + lat_degrees, 89.0)))
+        degrees = lat_degrees / max(cos_lat, 0.01)
+
+        distance = func.ST_Distance(func.geography(column), func.geography(origin))
+        query = query.where(
+            func.ST_DWithin(column, origin, degrees),
+            func.ST_DWithin(func.geography(column), func.geography(origin), radius_km * 1000)
+        ).add_columns((distance / 1000).label('distance_km'))
+
+    if polygon is not None:
+        query = query.where(func.ST_Intersects(column, func.ST_GeomFromText(polygon.wkt, SRID)))
+
+    if date_from:
+        query = query.where(Flight.flight_date >= date_from)
+    if date_to:
+        query = query.where(Flight.flight_date < date_to + timedelta(days=1))
+
+    if after_id is not None:
+        query = query.where(Flight.id > after_id)
+
+    # Лишняя запись показывает, есть ли следующая страница
+    result = await db.execute(query.order_by(Flight.id).limit(limit + 1))
+    rows = [dict(row._mapping) for row in result.all()]
+
+    return rows[:limit], len(rows) > limit
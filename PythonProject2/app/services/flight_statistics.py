@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.flight import Flight
+from app.services.sketches import ALL_REGIONS, estimate, union_sketches
+
+
+async def flight_statistics(db: AsyncSession,
+                            start_date: Optional[date] = None,
+                            end_date: Optional[date] = None,
+                            approximate: bool = False) -> Dict[str, Any]:
+    """
+    Сводная статистика полетов за период одним агрегатным запросом по flights
+    (диапазон дат - по индексу flight_date): количество, средняя продолжительность,
+    уникальные операторы и типы БВС, первая и последняя дата полета.
+    approximate - уникальные значения оцениваются по скетчам всех полетов дня
+    (flight_sketches, без полетов без даты) вместо count(DISTINCT) с границей ошибки
+    """
+    if approximate:
+        unique_operators = unique_uav_types = literal(0)
+    else:
+        unique_operators = func.count(func.distinct(func.nullif(Flight.operator, '')))
+        unique_uav_types = func.count(func.distinct(func.nullif(Flight.uav_type, '')))
+
+    query = select(
+        func.count().label('total_flights'),
+        func.avg(Flight.duration_minutes).label('avg_duration_minutes'),
+        unique_operators.label('unique_operators'),
+        unique_uav_types.label('unique_uav_types'),
+        func.min(Flight.flight_date).label('period_start'),
+        func.max(Flight.flight_date).label('period_end')
+    )
+    if start_date:
+        query = query.where(Flight.flight_date >= start_date)
+    if end_date:
+        query = query.where(Flight.flight_date < end_date + timedelta(days=1))
+
+    row = (await db.execute(query)).one()
+
+    statistics = {
+        "total_flights": row.total_flights,
+        "avg_duration_minutes": float(row.avg_duration_minutes or 0),
+        "unique_operators": row.unique_operators,
+        "unique_uav_types": row.unique_uav_types,
+        "period_start": row.period_start,
+        "period_end": row.period_end
+    }
+
+    if approximate:
+        operators, uav_types = (await union_sketches(db, [ALL_REGIONS], start_date, end_date))[ALL_REGIONS]
+        statistics["unique_operators"], statistics["unique_operators_error"] = estimate(operators)
+        statistics["unique_uav_types"], statistics["unique_uav_types_error"] = estimate(uav_types)
+
+    return statistics
@@ -1,24 +1,234 @@
-from shapely.geometry import Point
+from shapely.geometry import Point, box, shape
 from shapely.ops import transform
 import json
 import logging
-from typing import Optional, Tuple, Dict
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 import httpx
-from functools import lru_cache
+import numpy as np
+import shapely
+from fastapi import Request
+from shapely import STRtree
+
+from app.core.config import settings
+from app.core.lru import LRUCache, MISSING
+from app.services.flight_paths import haversine_km, lengths_km
+from app.services.region_grid import BORDER, EMPTY, RegionGrid, load_or_build_grid
 
 logger = logging.getLogger(__name__)
 
+UNKNOWN_REGION = "Неопределен"
+
+# Атрибуты с названием и кодом региона в распространенных наборах границ
+NAME_FIELDS = ['name', 'NAME', 'name_ru', 'NAME_RU', 'NL_NAME_1', 'NAME_1', 'region', 'REGION']
+CODE_FIELDS = ['code', 'CODE', 'okato', 'OKATO', 'ISO', 'iso', 'HASC_1', 'ref']
+
+
+# Система координат точек и границ (WGS 84)
+SRID = 4326
+
+
+def points_ewkb(lats: Sequence[Optional[float]], lons: Sequence[Optional[float]]) -> np.ndarray:
+    """
+    Точки для колонок geometry(POINT, 4326): EWKB в hex,
+    для пустых координат (None, NaN) - None
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    result = np.full(lats.shape, None, dtype=object)
+
+    valid = ~(np.isnan(lats) | np.isnan(lons))
+    if valid.any():
+        points = shapely.set_srid(shapely.points(lons[valid], lats[valid]), SRID)
+        result[valid] = shapely.to_wkb(points, hex=True, include_srid=True)
+
+    return result
+
+
+class RegionIndex(NamedTuple):
+    """Пространственный индекс границ регионов"""
+    names: List[str]
+    codes: List[Optional[str]]
+    areas: List[float]
+    tree: STRtree
+    grid: Optional[RegionGrid] = None
+
 
 class GeoService:
-    """Сервис геопривязки к регионам РФ"""
+    """
+    Сервис геопривязки к регионам РФ.
+    Границы субъектов загружаются из каталога SHAPEFILES_DIR (GeoJSON или шейп-файлы),
+    по ним строится пространственный индекс STRtree. Поиск региона точки -
+    отбор кандидатов по bbox в индексе и точная проверка вхождения в подготовленный полигон.
+    Результаты кэшируются по округленным координатам, поэтому повторяющиеся
+    точки вылета (площадки, аэродромы) определяются без геометрических вычислений.
+    Сервис создается один раз на процесс (см. lifespan в app.main).
+    """
 
-    def __init__(self):
+    def __init__(self, shapefiles_dir: Optional[str] = None):
+        self.shapefiles_dir = shapefiles_dir or settings.SHAPEFILES_DIR
+        self.precision = settings.GEO_CACHE_PRECISION
+        self.cache = LRUCache(settings.GEO_CACHE_SIZE, settings.GEO_CACHE_TTL)
         self.regions_data = self._load_regions()
+        self._build_index(self._load_boundaries(), self._source_key())
+
+    def reload(self):
+        """Перезагрузка границ регионов с очисткой кэша геопривязки"""
+        self._build_index(self._load_boundaries(), self._source_key())
+        self.cache.clear()
+
+    def boundaries(self) -> List[Tuple[str, Optional[str], Any]]:
+        """Загруженные границы регионов: название, код и геометрия"""
+        index = self.index
+        return list(zip(index.names, index.codes, index.tree.geometries))
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Состояние кэша геопривязки"""
+        return {**self.cache.stats(), "regions": len(self.index.names)}
+
+    def _build_index(self, boundaries: List[Dict[str, Any]], source_key: str):
+        """
+        Построение пространственного индекса и растра по границам регионов.
+        source_key - признак версии источника границ для кэша растра
+        """
+        if not boundaries:
+            logger.warning(
+                f"Границы регионов в {self.shapefiles_dir} не найдены, "
+                f"используются упрощенные прямоугольники"
+            )
+            boundaries = [
+                {
+                    "name": name,
+                    "code": data["code"],
+                    "geometry": box(data["bounds"][0][1], data["bounds"][0][0],
+                                    data["bounds"][1][1], data["bounds"][1][0])
+                }
+                for name, data in self.regions_data.items()
+            ]
+            source_key = json.dumps(self.regions_data, ensure_ascii=False, sort_keys=True)
+
+        geometries = [region["geometry"] for region in boundaries]
+        shapely.prepare(geometries)
+
+        index = RegionIndex(
+            names=[region["name"] for region in boundaries],
+            codes=[region["code"] for region in boundaries],
+            # При пересечении границ (анклавы, упрощенные прямоугольники) выбирается меньший регион
+            areas=[geometry.area for geometry in geometries],
+            tree=STRtree(geometries)
+        )
+
+        if settings.GEO_GRID_RESOLUTION > 0:
+            outside = len(index.names)
+            grid = load_or_build_grid(
+                geometries, index.names, source_key,
+                settings.GEO_GRID_RESOLUTION, settings.GEO_GRID_CACHE_DIR,
+                lambda lats, lons: np.where(
+                    (positions := self._exact_region_indices(lats, lons, index)) < outside,
+                    positions, EMPTY
+                )
+            )
+            index = index._replace(grid=grid)
+
+        # Индекс заменяется одним присваиванием: перезагрузка границ выполняется
+        # в отдельном потоке параллельно с поиском
+        self.index = index
+
+        logger.info(f"Загружены границы {len(geometries)} регионов")
+
+    def _source_key(self) -> str:
+        """Имена, размеры и время изменения файлов в каталоге границ"""
+        if not self.shapefiles_dir or not os.path.isdir(self.shapefiles_dir):
+            return ''
+
+        files = []
+        for file_name in sorted(os.listdir(self.shapefiles_dir)):
+            stat = os.stat(os.path.join(self.shapefiles_dir, file_name))
+            files.append(f"{file_name}:{stat.st_size}:{stat.st_mtime_ns}")
+
+        return f"{os.path.abspath(self.shapefiles_dir)}|{'|'.join(files)}"
+
+    def _load_boundaries(self) -> List[Dict[str, Any]]:
+        """
+        Загрузка границ регионов из каталога SHAPEFILES_DIR.
+        Поддерживаются GeoJSON (*.geojson, *.json) и шейп-файлы (*.shp, нужен пакет pyshp).
+        Координаты ожидаются в WGS 84 (EPSG:4326).
+        """
+        if not self.shapefiles_dir or not os.path.isdir(self.shapefiles_dir):
+            return []
+
+        boundaries = []
+
+        for file_name in sorted(os.listdir(self.shapefiles_dir)):
+            path = os.path.join(self.shapefiles_dir, file_name)
+            ext = os.path.splitext(file_name)[1].lower()
+
+            try:
+                if ext in ('.geojson', '.json'):
+                    features = self._read_geojson(path)
+                elif ext == '.shp':
+                    features = self._read_shapefile(path)
+                else:
+                    continue
+
+                for properties, geometry in features:
+                    region = self._make_region(properties, geometry)
+                    if region:
+                        boundaries.append(region)
+
+            except Exception as e:
+                logger.error(f"Ошибка загрузки границ из {path}: {e}")
+
+        return boundaries
+
+    @staticmethod
+    def _read_geojson(path: str) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Объекты GeoJSON файла: атрибуты и геометрия"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        features = data.get("features", []) if data.get("type") == "FeatureCollection" else [data]
+        for feature in features:
+            if feature.get("geometry"):
+                yield feature.get("properties") or {}, feature["geometry"]
+
+    @staticmethod
+    def _read_shapefile(path: str) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Объекты шейп-файла: атрибуты и геометрия"""
+        try:
+            import shapefile
+        except ImportError:
+            logger.warning(f"Пакет pyshp не установлен, шейп-файл {path} пропущен")
+            return
+
+        with shapefile.Reader(path, encoding=settings.SHAPEFILE_ENCODING) as reader:
+            for shape_record in reader.iterShapeRecords():
+                if shape_record.shape.shapeType != shapefile.NULL:
+                    yield shape_record.record.as_dict(), shape_record.shape.__geo_interface__
+
+    @staticmethod
+    def _make_region(properties: Dict[str, Any], geometry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Регион из атрибутов и геометрии объекта"""
+        name = next((properties[field] for field in NAME_FIELDS if properties.get(field)), None)
+        if not name:
+            return None
+
+        polygon = shape(geometry)
+        if polygon.is_empty or polygon.geom_type not in ('Polygon', 'MultiPolygon'):
+            return None
+        if not polygon.is_valid:
+            polygon = shapely.make_valid(polygon)
+
+        code = next((properties[field] for field in CODE_FIELDS if properties.get(field)), None)
+
+        return {
+            "name": str(name).strip(),
+            "code": str(code) if code is not None else None,
+            "geometry": polygon
+        }
 
     def _load_regions(self) -> Dict:
-        """Загрузка границ регионов из шейп-файлов или API"""
-        # В продакшене здесь должна быть загрузка из PostGIS с актуальными границами
-        # Пример структуры для демонстрации
+        """Упрощенные границы регионов, если в SHAPEFILES_DIR нет файлов границ"""
         regions = {
             "Санкт-Петербург": {
                 "code": "78",
@@ -63,38 +273,181 @@ class GeoService:
         }
         return regions
 
-    @lru_cache(maxsize=1000)
     def get_region_by_coordinates(self, lat: float, lon: float) -> Optional[str]:
+        """Определение региона по координатам"""
+        key = (round(lat, self.precision), round(lon, self.precision))
+
+        region = self.cache.get(key)
+        if region is MISSING:
+            index = self.index
+            position = self.find_region_index(*key, index=index)
+            region = index.names[position] if position is not None else UNKNOWN_REGION
+            self.cache.set(key, region)
+
+        return region
+
+    def find_region_index(self, lat: float, lon: float,
+                          index: Optional[RegionIndex] = None) -> Optional[int]:
         """
-        Определение региона по координатам
-        В продакшене использовать PostGIS ST_Contains
+        Номер региона, содержащего точку: значение ячейки растра, а для ячеек
+        на границах - отбор кандидатов по bbox в STRtree и точная проверка
+        по подготовленным полигонам
         """
-        point = Point(lon, lat)
+        index = index or self.index
 
-        # Упрощенная логика для демонстрации
-        # В реальности нужно использовать точные полигоны границ
-        for region_name, region_data in self.regions_data.items():
-            bounds = region_data["bounds"]
-            if (bounds[0][0] <= lat <= bounds[1][0] and
-                    bounds[0][1] <= lon <= bounds[1][1]):
-                return region_name
+        if index.grid is not None:
+            value = index.grid.value(lat, lon)
+            if value >= 0:
+                return value
+            if value == EMPTY:
+                return None
 
-        return "Неопределен"
+        tree = index.tree
 
-    def calculate_distance(self, coord1: Tuple[float, float],
-                           coord2: Tuple[float, float]) -> float:
-        """Расчет расстояния между координатами в километрах"""
-        from math import radians, sin, cos, sqrt, atan2
+        candidates = tree.query(Point(lon, lat))
+        if len(candidates) == 0:
+            return None
+
+        found = candidates[shapely.intersects_xy(tree.geometries.take(candidates), lon, lat)]
+        if len(found) == 0:
+            return None
+        if len(found) == 1:
+            return int(found[0])
+
+        return int(min(found, key=lambda position: index.areas[position]))
+
+    def resolve_many(self, lats: Sequence[Optional[float]],
+                     lons: Sequence[Optional[float]]) -> np.ndarray:
+        """
+        Пакетная геопривязка: названия регионов для массивов координат.
+        Координаты округляются так же, как ключи кэша, повторяющиеся точки
+        проверяются один раз, а поиск по индексу выполняется одним векторным
+        запросом STRtree. Для пустых координат (None, NaN) возвращается None.
+        """
+        lats = np.round(np.asarray(lats, dtype=float), self.precision)
+        lons = np.round(np.asarray(lons, dtype=float), self.precision)
+        result = np.full(lats.shape, None, dtype=object)
+
+        valid = ~(np.isnan(lats) | np.isnan(lons))
+        if not valid.any():
+            return result
+
+        # Уникальные точки: пара координат упаковывается в одно комплексное число
+        keys, inverse = np.unique(lats[valid] + 1j * lons[valid], return_inverse=True)
+
+        index = self.index
+        positions = self.find_region_indices(keys.real, keys.imag, index=index)
+
+        names = np.array(index.names + [UNKNOWN_REGION], dtype=object)
+        result[valid] = names[positions][inverse]
+
+        return result
+
+    def find_region_indices(self, lats: np.ndarray, lons: np.ndarray,
+                            index: Optional[RegionIndex] = None) -> np.ndarray:
+        """
+        Номера регионов для массивов координат (векторный аналог find_region_index).
+        Для точек вне всех регионов возвращается len(index.names).
+        """
+        index = index or self.index
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
 
-        R = 6371  # Радиус Земли в километрах
+        if index.grid is None:
+            return self._exact_region_indices(lats, lons, index)
 
-        lat1, lon1 = radians(coord1[0]), radians(coord1[1])
-        lat2, lon2 = radians(coord2[0]), radians(coord2[1])
+        values = index.grid.lookup(lats, lons).astype(np.intp)
+        positions = np.where(values >= 0, values, len(index.names))
 
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
+        border = values == BORDER
+        if border.any():
+            positions[border] = self._exact_region_indices(lats[border], lons[border], index)
+
+        return positions
+
+    @staticmethod
+    def _exact_region_indices(lats: np.ndarray, lons: np.ndarray, index: RegionIndex) -> np.ndarray:
+        """Номера регионов по полигонам индекса (len(index.names) для точек вне регионов)"""
+        tree = index.tree
+
+        # Кандидаты отбираются по bbox, точная проверка - по подготовленным полигонам
+        # индекса (query с predicate проверяет точки по неподготовленным геометриям)
+        points, found = tree.query(shapely.points(lons, lats))
+        inside = shapely.intersects_xy(tree.geometries.take(found), lons[points], lats[points])
+        points, found = points[inside], found[inside]
+
+        positions = np.full(len(lats), len(index.names), dtype=np.intp)
+        if len(points) == 0:
+            return positions
+
+        # При нескольких совпадениях выбирается регион с меньшей площадью
+        order = np.lexsort((np.asarray(index.areas)[found], points))
+        points, found = points[order], found[order]
+        first = np.unique(points, return_index=True)[1]
+        positions[points[first]] = found[first]
+
+        return positions
+
+    def regions_crossed(self, paths: np.ndarray,
+                        areas: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Все регионы, которые пересекают полеты (см. flight_paths.flight_shapes):
+        линии пути и зоны полетов. Протяженность пути в регионе считается по большому кругу
+        по части линии внутри региона; для регионов, задетых только зоной, она равна 0.
+        Возвращает номера полетов, названия регионов и протяженность, км
+        """
+        index = self.index
+        regions = index.tree.geometries
+
+        flights, found = self._crossing_pairs(paths, index)
+        lines = paths[flights]
+
+        # Путь целиком внутри региона (обычный случай) и точки не требуют построения пересечения
+        pieces = lines.copy()
+        crossing = ~shapely.contains_properly(regions.take(found), lines) & (shapely.get_dimensions(lines) > 0)
+
+        # Перед пересечением граница региона обрезается по bbox пути (с запасом для отрезков
+        # вдоль меридиана или параллели): построение пересечения линейно по числу вершин
+        # полигона, а путь мал по сравнению с регионом
+        clipped = [
+            shapely.clip_by_rect(region, min_x - 1e-9, min_y - 1e-9, max_x + 1e-9, max_y + 1e-9)
+            for region, (min_x, min_y, max_x, max_y)
+            in zip(regions.take(found[crossing]), shapely.bounds(lines[crossing]))
+        ]
+        pieces[crossing] = shapely.intersection(lines[crossing], clipped)
+        distances = lengths_km(pieces)
+
+        if areas is not None:
+            area_flights, area_found = self._crossing_pairs(areas, index)
+            flights = np.concatenate([flights, area_flights])
+            found = np.concatenate([found, area_found])
+            distances = np.concatenate([distances, np.zeros(len(area_flights))])
+
+        # Пары (полет, регион) без повторов; при повторе остается протяженность пути
+        keys = flights.astype(np.int64) * len(index.names) + found
+        order = np.lexsort((-distances, keys))
+        keys, first = np.unique(keys[order], return_index=True)
+        selected = order[first]
+
+        names = np.asarray(index.names, dtype=object)
+        return flights[selected], names[found[selected]], distances[selected]
+
+    @staticmethod
+    def _crossing_pairs(geometries: np.ndarray, index: RegionIndex) -> Tuple[np.ndarray, np.ndarray]:
+        """Пары (номер геометрии, номер региона) пересекающихся геометрий и регионов"""
+        tree = index.tree
+
+        # Кандидаты по bbox, точная проверка - по подготовленным полигонам индекса
+        items, found = tree.query(geometries)
+        hits = shapely.intersects(tree.geometries.take(found), geometries[items])
+        return items[hits], found[hits]
+
+    def calculate_distance(self, coord1: Tuple[float, float],
+                           coord2: Tuple[float, float]) -> float:
+        """Расчет расстояния между координатами в километрах (см. flight_paths.haversine_km)"""
+        return float(haversine_km(coord1[0], coord1[1], coord2[0], coord2[1]))
 
-        a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
 
-        return R * c
\ No newline at end of file
+def get_geo_service(request: Request) -> GeoService:
+    """Dependency для получения сервиса геопривязки"""
+    return request.app.state.geo_service
@@ -0,0 +1,172 @@
+import logging
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import Date, SmallInteger, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.lru import LRUCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+# Широта, до которой определена проекция Web Mercator
+MAX_MERCATOR_LAT = 85.0511
+
+# Сетки плотности вылетов по уровням пирамиды: номер ячейки точки вылета
+# на сетке из (HEATMAP_TILE_GRID << level) ячеек на сторону мира
+_DENSITY_SELECT = f"""
+SELECT l.level, f.flight_date::date AS day,
+       LEAST(floor((ST_X(f.dep_point) + 180) / 360 * l.cells), l.cells - 1)::int AS gx,
+       LEAST(floor((1 - ln(tan(radians(p.lat)) + 1 / cos(radians(p.lat))) / pi()) / 2 * l.cells),
+             l.cells - 1)::int AS gy,
+       count(*) AS flights
+FROM flights f
+CROSS JOIN LATERAL (
+    SELECT LEAST(GREATEST(ST_Y(f.dep_point), -{MAX_MERCATOR_LAT}), {MAX_MERCATOR_LAT}) AS lat
+) AS p
+CROSS JOIN (
+    SELECT u.level, CAST(:grid AS bigint) << u.level AS cells
+    FROM unnest(CAST(:levels AS smallint[])) AS u(level)
+) AS l
+WHERE f.dep_point IS NOT NULL AND f.flight_date IS NOT NULL
+{{filters}}
+GROUP BY 1, 2, 3, 4
+"""
+
+# Фильтр пересчитываемых дней (диапазон использует индекс по flight_date)
+_DAYS_FILTER = (
+    "AND f.flight_date >= :day_from AND f.flight_date < :day_to "
+    "AND f.flight_date::date = ANY(:days)"
+)
+
+_TILE_SELECT = """
+SELECT (gx >> :shift) - :x0 AS cx, (gy >> :shift) - :y0 AS cy, sum(flights) AS flights
+FROM flight_density
+WHERE level = :level
+  AND gx >= :gx_from AND gx < :gx_to
+  AND gy >= :gy_from AND gy < :gy_to
+  {filters}
+GROUP BY 1, 2
+"""
+
+# Отрисованные тайлы (z, x, y, date_from, date_to)
+_tile_cache = LRUCache(settings.HEATMAP_CACHE_SIZE, settings.HEATMAP_CACHE_TTL)
+
+
+def max_zoom() -> int:
+    """Наибольший масштаб: тайл самого детального уровня делится до одной ячейки"""
+    return max(settings.HEATMAP_LEVELS) + settings.HEATMAP_TILE_GRID.bit_length() - 1
+
+
+async def refresh_density(db: AsyncSession, days: Optional[Iterable[date]] = None) -> int:
+    """
+    Пересчет сеток плотности за указанные дни (None - полная перестройка).
+    Дни пересчитываются целиком, поэтому результат не зависит от того, были ли
+    полеты вставлены, перезаписаны или пропущены при загрузке.
+    Транзакция не фиксируется: после фиксации вызывающий код очищает кэш тайлов
+    (clear_tile_cache), иначе в нем могут остаться тайлы по старым сеткам.
+    """
+    started = time.perf_counter()
+    params: Dict[str, Any] = {
+        "grid": settings.HEATMAP_TILE_GRID,
+        "levels": list(settings.HEATMAP_LEVELS)
+    }
+
+    if days is None:
+        await db.execute(text("TRUNCATE flight_density"))
+        filters = ''
+    else:
+        days = sorted(set(days))
+        if not days:
+            return 0
+
+        await db.execute(
+            text("DELETE FROM flight_density WHERE day = ANY(:days)").bindparams(
+                bindparam("days", type_=ARRAY(Date))
+            ),
+            {"days": days}
+        )
+        filters = _DAYS_FILTER
+        params.update(days=days, day_from=days[0], day_to=days[-1] + timedelta(days=1))
+
+    statement = text(
+        f"INSERT INTO flight_density (level, day, gx, gy, flights) "
+        f"{_DENSITY_SELECT.format(filters=filters)}"
+    ).bindparams(
+        bindparam("levels", type_=ARRAY(SmallInteger)),
+        *([bindparam("days", type_=ARRAY(Date))] if days is not None else [])
+    )
+    result = await db.execute(statement, params)
+
+    logger.info(
+        f"Сетки плотности пересчитаны за {'все дни' if days is None else f'{len(days)} дн.'}: "
+        f"{result.rowcount} ячеек за {time.perf_counter() - started:.1f} с"
+    )
+    return result.rowcount
+
+
+async def get_tile(db: AsyncSession, z: int, x: int, y: int,
+                   date_from: Optional[date] = None,
+                   date_to: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Тайл тепловой карты (z, x, y в схеме XYZ): количество вылетов по ячейкам.
+    Тайл собирается из ближайшего уровня пирамиды не грубее запрошенного масштаба
+    сдвигом номеров ячеек; для масштабов глубже последнего уровня ячеек в тайле меньше.
+    """
+    key = (z, x, y, date_from, date_to)
+    tile = _tile_cache.get(key)
+    if tile is not MISSING:
+        return tile
+
+    levels = sorted(settings.HEATMAP_LEVELS)
+    level = next((candidate for candidate in levels if candidate >= z), levels[-1])
+
+    shift = max(level - z, 0)
+    grid = settings.HEATMAP_TILE_GRID >> max(z - level, 0)
+    span = grid << shift
+
+    filters = ''
+    params = {
+        "level": level,
+        "shift": shift,
+        "x0": x * grid,
+        "y0": y * grid,
+        "gx_from": x * span,
+        "gx_to": (x + 1) * span,
+        "gy_from": y * span,
+        "gy_to": (y + 1) * span
+    }
+    if date_from:
+        filters += "AND day >= :date_from "
+        params["date_from"] = date_from
+    if date_to:
+        filters += "AND day <= :date_to "
+        params["date_to"] = date_to
+
+    result = await db.execute(text(_TILE_SELECT.format(filters=filters)), params)
+    cells = [[row.cx, row.cy, int(row.flights)] for row in result.all()]
+
+    tile = {
+        "z": z,
+        "x": x,
+        "y": y,
+        "grid": grid,
+        "level": level,
+        "total": sum(cell[2] for cell in cells),
+        "cells": cells
+    }
+    _tile_cache.set(key, tile)
+    return tile
+
+
+def clear_tile_cache():
+    """Очистка кэша тайлов после фиксации пересчета сеток плотности"""
+    _tile_cache.clear()
+
+
+def tile_cache_stats() -> Dict[str, Any]:
+    """Состояние кэша тайлов"""
+    return _tile_cache.stats()
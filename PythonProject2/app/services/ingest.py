@@ -0,0 +1,391 @@
+import json
+import logging
+from math import nan as NAN
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.services.bulk_writer import FlightBulkWriter, ConflictPolicy
+from app.services.day_refresh import invalidate_days, refresh_ingested_days
+from app.services.excel_parser import ExcelParser
+from app.services.flight_paths import route_lengths_km
+from app.services.geo_service import GeoService, points_ewkb
+from app.services.parse_pool import get_parse_pool, map_ordered
+from app.services.parser import TelegramParser
+from app.services.region_assignment import ensure_region_boundaries, last_flight_id
+from app.services.shr_parser import SHRDataParser
+from app.services.stream_reader import iter_text_lines, peek_lines, batched
+
+logger = logging.getLogger(__name__)
+
+# Объем начала файла, по которому определяется его формат
+FORMAT_SNIFF_CHARS = 64 * 1024
+
+# Количество сохраняемых текстов ошибок
+MAX_REPORTED_ERRORS = 10
+
+# Поля распарсенных записей с координатами вылета и посадки
+SHR_COORD_FIELDS = ('dep_coords', 'arr_coords')
+EXCEL_COORD_FIELDS = ('dep_coords_parsed', 'arr_coords_parsed')
+
+
+class IngestProgress:
+    """Счетчики хода загрузки файла"""
+
+    def __init__(self, on_update: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None):
+        self.on_update = on_update
+        self.parsed = 0
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.merged_in_batch = 0
+        self.rows_per_sec = 0.0
+        self.error_count = 0
+        self.errors: List[str] = []
+        self.warning: Optional[str] = None
+
+    def add_error(self, message: str):
+        """Учет ошибки без неограниченного роста списка"""
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    async def update(self, writer: FlightBulkWriter):
+        """Обновление счетчиков после записи пачки"""
+        self.inserted = writer.inserted
+        self.updated = writer.updated
+        self.skipped = writer.skipped
+        self.merged_in_batch = writer.merged_in_batch
+        self.rows_per_sec = round(writer.rows_per_sec, 1)
+
+        if self.on_update:
+            await self.on_update(self.as_dict())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "parsed": self.parsed,
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "merged_in_batch": self.merged_in_batch,
+            "rows_per_sec": self.rows_per_sec,
+            "error_count": self.error_count,
+            "errors": list(self.errors),
+            "warning": self.warning
+        }
+
+
+async def _iter_batches(records: Iterable[Dict[str, Any]], size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Пачки полетов, распарсенных в текущем процессе"""
+    for batch in batched(records, size):
+        yield batch
+
+
+def _parse_shr_lines(lines: Iterable[str], table_format: bool,
+                     batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Пачки распарсенных полетов из потока строк.
+    При включенном пуле парсинга фрагменты файла разбираются в отдельных процессах,
+    иначе - последовательно в текущем.
+    """
+    pool = get_parse_pool()
+
+    if pool is None:
+        if table_format:
+            records = SHRDataParser.parse_shr_document(lines)
+        else:
+            records = map(TelegramParser.parse_shr_telegram, TelegramParser.iter_shr_telegrams(lines))
+        return _iter_batches(records, batch_size)
+
+    if table_format:
+        chunks = SHRDataParser.split_shr_document(lines, settings.PARSE_CHUNK_LINES)
+        return map_ordered(pool, SHRDataParser.parse_shr_chunk, chunks)
+
+    chunks = (
+        (chunk,)
+        for chunk in batched(TelegramParser.iter_shr_telegrams(lines), settings.PARSE_CHUNK_LINES)
+    )
+    return map_ordered(pool, TelegramParser.parse_shr_batch, chunks)
+
+
+def _shr_flight_row(flight_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Подготовка строки таблицы flights из распарсенной SHR телеграммы"""
+    altitude = flight_data.get('altitude')
+
+    return {
+        'sid': flight_data.get('sid'),
+        'flight_date': flight_data.get('date'),
+        'dep_time': flight_data.get('dep_time'),
+        'arr_time': flight_data.get('arr_time'),
+        'dep_coords': str(flight_data['dep_coords']) if flight_data.get('dep_coords') else None,
+        'arr_coords': str(flight_data['arr_coords']) if flight_data.get('arr_coords') else None,
+        'operator': flight_data.get('operator'),
+        'uav_type': flight_data.get('uav_type'),
+        'uav_reg': flight_data.get('registration'),
+        'duration_minutes': flight_data.get('duration_minutes'),
+        'center_name': flight_data.get('center_name'),
+        'raw_shr': flight_data.get('raw_shr'),
+        'raw_dep': flight_data.get('raw_dep'),
+        'raw_arr': flight_data.get('raw_arr'),
+        'altitude_min': altitude.get('min') if altitude else None,
+        'altitude_max': altitude.get('max') if altitude else None,
+        'flight_zone': flight_data.get('zone')
+    }
+
+
+def _excel_flight_row(flight_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Подготовка строки таблицы flights из записи Excel файла"""
+    return {
+        'flight_date': flight_data.get('date'),
+        'dep_time': flight_data.get('dep_time'),
+        'arr_time': flight_data.get('arr_time'),
+        'dep_coords': flight_data.get('dep_coords'),
+        'arr_coords': flight_data.get('arr_coords'),
+        'uav_type': flight_data.get('aircraft_type'),
+        'uav_reg': flight_data.get('aircraft'),
+        'duration_minutes': flight_data.get('duration_minutes'),
+        'operator': flight_data.get('operator'),
+        'operator_phone': flight_data.get('operator_phone'),
+        'flight_zone': TelegramParser.parse_route(flight_data.get('route')),
+        'status': 'arrived' if flight_data.get('arr_time') else 'scheduled'
+    }
+
+
+def _coordinates_column(records: List[Dict[str, Any]], field: str) -> Tuple[List[float], List[float]]:
+    """Колонки широт и долгот из поля с кортежем координат (NaN, если координат нет)"""
+    lats = []
+    lons = []
+
+    for record in records:
+        coords = record.get(field)
+        if isinstance(coords, tuple):
+            lats.append(coords[0])
+            lons.append(coords[1])
+        else:
+            lats.append(NAN)
+            lons.append(NAN)
+
+    return lats, lons
+
+
+def _resolve_regions(geo_service: GeoService, lats: List[float], lons: List[float]) -> List[Optional[str]]:
+    """
+    Регионы колонки координат. В режиме REGION_ASSIGNMENT=postgis регионы
+    не определяются при загрузке, их назначает UPDATE в БД (см. region_assignment)
+    """
+    if settings.REGION_ASSIGNMENT == 'postgis':
+        return [None] * len(lats)
+    return geo_service.resolve_many(lats, lons).tolist()
+
+
+def _distances(dep: Tuple[List[float], List[float]], arr: Tuple[List[float], List[float]],
+               zones: List[Optional[Dict[str, Any]]]) -> List[Optional[float]]:
+    """Колонка distance_km: протяженность пути полетов пачки (None - меньше двух точек)"""
+    lengths = route_lengths_km(*dep, *arr, zones)
+    return [None if length != length else length for length in lengths.tolist()]
+
+
+def _assign_geodata(rows: List[Dict[str, Any]], records: List[Dict[str, Any]],
+                    coord_fields: Tuple[str, str], geo_service: GeoService):
+    """
+    Точки и регионы вылета и посадки (один вызов на колонку координат)
+    и протяженность пути для пачки строк
+    """
+    columns = []
+    for side, coord_field in zip(('dep', 'arr'), coord_fields):
+        lats, lons = _coordinates_column(records, coord_field)
+        points = points_ewkb(lats, lons).tolist()
+        regions = _resolve_regions(geo_service, lats, lons)
+        columns.append((lats, lons))
+
+        for row, point, region in zip(rows, points, regions):
+            row[f'{side}_point'] = point
+            row[f'{side}_region'] = region
+
+    distances = _distances(*columns, [row.get('flight_zone') for row in rows])
+    for row, distance in zip(rows, distances):
+        row['distance_km'] = distance
+
+
+def _excel_flight_columns(batch: Dict[str, list], geo_service: GeoService) -> Dict[str, list]:
+    """Подготовка колонок таблицы flights из колоночной пачки Excel файла"""
+    zones = [TelegramParser.parse_route(route) for route in batch['route']]
+
+    return {
+        'flight_date': batch['date'],
+        'dep_time': batch['dep_time'],
+        'arr_time': batch['arr_time'],
+        'dep_point': points_ewkb(batch['dep_lat'], batch['dep_lon']).tolist(),
+        'arr_point': points_ewkb(batch['arr_lat'], batch['arr_lon']).tolist(),
+        'dep_coords': batch['dep_coords'],
+        'arr_coords': batch['arr_coords'],
+        'dep_region': _resolve_regions(geo_service, batch['dep_lat'], batch['dep_lon']),
+        'arr_region': _resolve_regions(geo_service, batch['arr_lat'], batch['arr_lon']),
+        'uav_type': batch['aircraft_type'],
+        'uav_reg': batch['aircraft'],
+        'duration_minutes': batch['duration_minutes'],
+        'operator': batch['operator'],
+        'operator_phone': batch['operator_phone'],
+        'flight_zone': zones,
+        'distance_km': _distances(
+            (batch['dep_lat'], batch['dep_lon']), (batch['arr_lat'], batch['arr_lon']), zones
+        ),
+        'status': ['arrived' if arr_time else 'scheduled' for arr_time in batch['arr_time']]
+    }
+
+
+async def _write_records(batches: AsyncIterator[List[Dict[str, Any]]],
+                         build_row: Callable[[Dict[str, Any]], Dict[str, Any]],
+                         coord_fields: Tuple[str, str],
+                         writer: FlightBulkWriter,
+                         geo_service: GeoService,
+                         progress: IngestProgress):
+    """
+    Запись распарсенных полетов пачками с обновлением прогресса.
+    coord_fields - поля записи с координатами вылета и посадки для геопривязки
+    """
+    async for batch in batches:
+        progress.parsed += len(batch)
+
+        rows = []
+        records = []
+
+        for flight_data in batch:
+            if 'parse_error' in flight_data:
+                progress.add_error(flight_data['parse_error'])
+                continue
+
+            try:
+                rows.append(build_row(flight_data))
+            except Exception as e:
+                progress.add_error(f"Ошибка обработки записи: {str(e)}")
+                continue
+
+            records.append(flight_data)
+
+        _assign_geodata(rows, records, coord_fields, geo_service)
+
+        for row in rows:
+            await writer.add(row)
+        progress.processed += len(rows)
+
+        await writer.flush()
+        await progress.update(writer)
+
+
+async def _before_write(db: AsyncSession, geo_service: GeoService) -> Optional[int]:
+    """
+    Подготовка к записи. В режиме REGION_ASSIGNMENT=postgis - загрузка границ
+    в geo.regions (до записи полетов: загрузка границ фиксирует транзакцию)
+    и наибольший id полета: новые полеты без даты привязываются по id больше него
+    """
+    if settings.REGION_ASSIGNMENT == 'postgis':
+        await ensure_region_boundaries(db, geo_service)
+        return await last_flight_id(db)
+    return None
+
+
+async def _commit(db: AsyncSession, writer: FlightBulkWriter, geo_service: GeoService,
+                  progress: IngestProgress, after_id: Optional[int]):
+    """
+    Фиксация загрузки: привязка к регионам (режим REGION_ASSIGNMENT=postgis),
+    регионы маршрутов, агрегаты по регионам и сетки плотности за затронутые дни
+    пересчитываются в транзакции загрузки и фиксируются вместе с полетами.
+    После фиксации из кэша удаляются ответы, которые покрывают эти дни;
+    ошибка удаления не отменяет загрузку, а становится предупреждением задачи
+    (см. app.services.day_refresh)
+    """
+    days, regions = await refresh_ingested_days(db, geo_service, writer.flight_days, after_id)
+    await db.commit()
+    progress.warning = await invalidate_days(db, days, regions)
+
+
+async def ingest_shr_file(fileobj: BinaryIO,
+                          content_type: Optional[str],
+                          db: AsyncSession,
+                          geo_service: GeoService,
+                          progress: IngestProgress,
+                          on_conflict: ConflictPolicy = ConflictPolicy.SKIP):
+    """
+    Загрузка файла с SHR телеграммами.
+    Файл читается потоково, полеты записываются в БД пачками,
+    поэтому потребление памяти не зависит от размера файла.
+    """
+    writer = FlightBulkWriter(db, on_conflict=on_conflict)
+    after_id = await _before_write(db, geo_service)
+
+    # Определяем формат файла
+    if content_type == "application/json":
+        try:
+            data = json.load(fileobj)
+            # Обработка JSON формата
+            messages = data if isinstance(data, list) else [data]
+            batches = _parse_shr_lines((str(msg) for msg in messages), False, writer.batch_size)
+        except ValueError:
+            fileobj.seek(0)
+            batches = _parse_shr_lines(
+                iter_text_lines(fileobj, settings.UPLOAD_CHUNK_SIZE), False, writer.batch_size
+            )
+    else:
+        head, lines = peek_lines(
+            iter_text_lines(fileobj, settings.UPLOAD_CHUNK_SIZE),
+            FORMAT_SNIFF_CHARS
+        )
+        head_str = '\n'.join(head)
+
+        # Проверяем, это табличный формат или обычные телеграммы
+        table_format = '\t' in head_str and any(
+            center in head_str for center in ['Санкт-Петербургский', 'Ростовский', 'Московский']
+        )
+        batches = _parse_shr_lines(lines, table_format, writer.batch_size)
+
+    await _write_records(batches, _shr_flight_row, SHR_COORD_FIELDS, writer, geo_service, progress)
+    await _commit(db, writer, geo_service, progress, after_id)
+
+    logger.info(f"SHR: записано {writer.rows_written} полетов, {writer.rows_per_sec:.0f} строк/с")
+
+
+async def _write_columns(batches: Iterable[Dict[str, list]],
+                         writer: FlightBulkWriter,
+                         geo_service: GeoService,
+                         progress: IngestProgress):
+    """Запись колоночных пачек Excel файла с обновлением прогресса"""
+    for batch in batches:
+        size = len(batch['date'])
+        progress.parsed += size
+
+        await writer.add_columns(_excel_flight_columns(batch, geo_service), size)
+        progress.processed += size
+
+        await progress.update(writer)
+
+
+async def ingest_excel_file(file_path: str,
+                            db: AsyncSession,
+                            geo_service: GeoService,
+                            progress: IngestProgress,
+                            engine: Optional[str] = None):
+    """
+    Загрузка Excel файла с полетными данными.
+    Лист читается потоково, строки парсятся по мере записи пачек в БД.
+    engine - rows (построчный разбор) или vectorized (разбор колонками pandas)
+    """
+    writer = FlightBulkWriter(db)
+    engine = engine or settings.EXCEL_PARSE_ENGINE
+    after_id = await _before_write(db, geo_service)
+
+    with open(file_path, 'rb') as f:
+        if engine == 'vectorized':
+            batches = ExcelParser.iter_flight_columns(f, writer.batch_size)
+            await _write_columns(batches, writer, geo_service, progress)
+        else:
+            flights_data = ExcelParser.iter_flight_data(f)
+            await _write_records(_iter_batches(flights_data, writer.batch_size), _excel_flight_row,
+                                 EXCEL_COORD_FIELDS, writer, geo_service, progress)
+
+    await _commit(db, writer, geo_service, progress, after_id)
+
+    logger.info(f"Excel: записано {writer.rows_written} полетов, {writer.rows_per_sec:.0f} строк/с")
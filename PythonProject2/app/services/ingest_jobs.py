@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import Request, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.bulk_writer import ConflictPolicy
+from app.services.geo_service import GeoService
+from app.services.ingest import IngestProgress, ingest_shr_file, ingest_excel_file
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class MemoryJobStore:
+    """Хранилище состояния задач в памяти процесса"""
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def save(self, job: Dict[str, Any]):
+        self._jobs[job['job_id']] = job
+
+        # Старые завершенные задачи вытесняются, чтобы хранилище не росло бесконечно;
+        # задачи в очереди и в работе остаются доступны до завершения
+        excess = len(self._jobs) - self.max_jobs
+        if excess > 0:
+            finished = [
+                job_id for job_id, item in self._jobs.items()
+                if item['status'] in (JobStatus.COMPLETED, JobStatus.FAILED)
+            ]
+            for job_id in finished[:excess]:
+                del self._jobs[job_id]
+
+    async def update(self, job_id: str, **fields):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+
+class RedisJobStore:
+    """Хранилище состояния задач в Redis, общее для API и Celery воркеров"""
+
+    KEY_PREFIX = "ingest:job:"
+
+    def __init__(self, url: Optional[str] = None, ttl: Optional[int] = None):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url or settings.REDIS_URL)
+        self.ttl = ttl or settings.INGEST_JOB_TTL
+
+    async def save(self, job: Dict[str, Any]):
+        await self.client.set(
+            self.KEY_PREFIX + job['job_id'],
+            json.dumps(job, ensure_ascii=False, default=str),
+            ex=self.ttl
+        )
+
+    async def update(self, job_id: str, **fields):
+        # Задачу обновляет только один воркер, поэтому read-modify-write допустим
+        job = await self.get(job_id)
+        if job is not None:
+            job.update(fields)
+            await self.save(job)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = await self.client.get(self.KEY_PREFIX + job_id)
+        return json.loads(data) if data else None
+
+    async def close(self):
+        await self.client.close()
+
+
+async def execute_job(store, session_factory: Callable, geo_service: GeoService,
+                      job_id: str, kind: str, file_path: str, options: Dict[str, Any]):
+    """Выполнение задачи загрузки с публикацией прогресса в хранилище"""
+    await store.update(job_id, status=JobStatus.RUNNING, started_at=datetime.utcnow().isoformat())
+
+    async def publish(counters: Dict[str, Any]):
+        await store.update(job_id, **counters)
+
+    progress = IngestProgress(on_update=publish)
+
+    try:
+        async with session_factory() as db:
+            if kind == "shr":
+                with open(file_path, 'rb') as f:
+                    await ingest_shr_file(
+                        f, options.get('content_type'), db, geo_service, progress,
+                        on_conflict=ConflictPolicy(options.get('on_conflict', ConflictPolicy.SKIP))
+                    )
+            else:
+                await ingest_excel_file(file_path, db, geo_service, progress)
+
+        await store.update(
+            job_id,
+            status=JobStatus.COMPLETED,
+            finished_at=datetime.utcnow().isoformat(),
+            **progress.as_dict()
+        )
+
+    except Exception as e:
+        logger.exception(f"Ошибка выполнения задачи загрузки {job_id}")
+        await store.update(
+            job_id,
+            status=JobStatus.FAILED,
+            error=f"Ошибка обработки файла: {str(e)}",
+            finished_at=datetime.utcnow().isoformat(),
+            **progress.as_dict()
+        )
+
+    finally:
+        if os.path.exists(file_path):
+            os.unlink(file_path)
+
+
+class IngestJobManager:
+    """
+    Очередь фоновых задач загрузки файлов.
+    По умолчанию задачи выполняет пул asyncio воркеров внутри процесса API,
+    при INGEST_BACKEND=celery они передаются Celery воркерам через Redis.
+    """
+
+    def __init__(self, session_factory: Callable, geo_service: GeoService,
+                 backend: Optional[str] = None, workers: Optional[int] = None):
+        self.session_factory = session_factory
+        self.geo_service = geo_service
+        self.backend = backend or settings.INGEST_BACKEND
+        self.workers = workers or settings.INGEST_WORKERS
+        self.store = RedisJobStore() if self.backend == "celery" else MemoryJobStore()
+        self._queue: "asyncio.Queue" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Запуск воркеров"""
+        if self.backend == "celery":
+            return
+
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info(f"Запущено {self.workers} воркеров загрузки")
+
+    async def stop(self):
+        """Остановка воркеров"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if isinstance(self.store, RedisJobStore):
+            await self.store.close()
+
+    async def submit(self, kind: str, file: UploadFile, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Сохранение загруженного файла и постановка задачи в очередь"""
+        job_id = uuid.uuid4().hex
+        file_path = await run_in_threadpool(self._save_upload, job_id, file)
+
+        job = {
+            "job_id": job_id,
+            "kind": kind,
+            "filename": file.filename,
+            "status": JobStatus.QUEUED,
+            "created_at": datetime.utcnow().isoformat(),
+            **IngestProgress().as_dict()
+        }
+        await self.store.save(job)
+
+        if self.backend == "celery":
+            from app.worker import run_ingest_job
+            run_ingest_job.delay(job_id, kind, file_path, options)
+        else:
+            await self._queue.put((job_id, kind, file_path, options))
+
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Текущее состояние задачи"""
+        return await self.store.get(job_id)
+
+    @staticmethod
+    def _save_upload(job_id: str, file: UploadFile) -> str:
+        """Потоковое копирование загрузки в каталог UPLOAD_DIR"""
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        suffix = os.path.splitext(file.filename or '')[1]
+        file_path = os.path.join(settings.UPLOAD_DIR, job_id + suffix)
+
+        file.file.seek(0)
+        with open(file_path, 'wb') as out:
+            shutil.copyfileobj(file.file, out, settings.UPLOAD_CHUNK_SIZE)
+
+        return file_path
+
+    async def _worker(self):
+        while True:
+            job_id, kind, file_path, options = await self._queue.get()
+            try:
+                await execute_job(self.store, self.session_factory, self.geo_service,
+                                  job_id, kind, file_path, options)
+            finally:
+                self._queue.task_done()
+
+
+def get_job_manager(request: Request) -> IngestJobManager:
+    """Dependency для получения менеджера задач загрузки"""
+    return request.app.state.ingest_jobs
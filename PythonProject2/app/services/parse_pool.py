@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Пул процессов для парсинга загружаемых файлов.
+    Возвращает None, если параллельный парсинг выключен (PARSE_WORKERS=0)
+    или текущий процесс не может порождать дочерние (воркер Celery).
+    """
+    global _pool
+
+    if settings.PARSE_WORKERS <= 0 or multiprocessing.current_process().daemon:
+        return None
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PARSE_WORKERS,
+            mp_context=multiprocessing.get_context('forkserver')
+        )
+        logger.info(f"Запущен пул парсинга на {settings.PARSE_WORKERS} процессов")
+
+    return _pool
+
+
+def shutdown_parse_pool():
+    """Остановка пула парсинга"""
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def map_ordered(pool: ProcessPoolExecutor, func: Callable, chunks: Iterable[Tuple],
+                      window: Optional[int] = None) -> AsyncIterator[Any]:
+    """
+    Параллельная обработка фрагментов в пуле с сохранением их порядка.
+    В работе одновременно не больше window фрагментов, поэтому
+    файл читается по мере обработки и не накапливается в памяти.
+    """
+    loop = asyncio.get_running_loop()
+    window = window or pool._max_workers * 2
+    pending = deque()
+
+    for chunk in chunks:
+        pending.append(loop.run_in_executor(pool, func, *chunk))
+        if len(pending) >= window:
+            yield await pending.popleft()
+
+    while pending:
+        yield await pending.popleft()
@@ -1,22 +1,41 @@
 import re
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
 
+from app.services.telegram_fields import (
+    SHR_FIELDS, DEP_FIELDS, ARR_FIELDS, ALTITUDE_RE, ZONE_RE, ZONE_POINT_RE
+)
+
 logger = logging.getLogger(__name__)
 
+COORDINATES_RE = re.compile(r'(\d{2})(\d{2})([NS])(\d{3})(\d{2})([EW])')
+
+# В файле повторяются одни и те же точки и даты, поэтому их разбор кэшируется
+PARSE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _flight_date(date_str: str) -> datetime:
+    """Дата полета из поля DOF (YYMMDD)"""
+    year = 2000 + int(date_str[0:2])
+    month = int(date_str[2:4])
+    day = int(date_str[4:6])
+    return datetime(year, month, day)
+
 
 class TelegramParser:
     """Парсер формализованных телеграмм по приказу Минтранса №13"""
 
     @staticmethod
+    @lru_cache(maxsize=PARSE_CACHE_SIZE)
     def parse_coordinates(coord_str: str) -> Optional[Tuple[float, float]]:
         """
         Парсинг координат из формата DDMMN/DDDMME
         Пример: 5957N02905E -> (59.95, 29.083)
         """
-        pattern = r'(\d{2})(\d{2})([NS])(\d{3})(\d{2})([EW])'
-        match = re.match(pattern, coord_str.strip())
+        match = COORDINATES_RE.match(coord_str.strip())
 
         if not match:
             return None
@@ -39,6 +58,32 @@ class TelegramParser:
 
         return (lat, lon)
 
+    @staticmethod
+    def iter_shr_telegrams(lines: Iterable[str]) -> Iterator[str]:
+        """Выбор SHR телеграмм из потока строк без загрузки файла целиком"""
+        for line in lines:
+            if 'SHR-' in line:
+                yield line
+
+    @staticmethod
+    def parse_shr_telegram(shr_text: str) -> Dict:
+        """
+        Парсинг SHR телеграммы для загрузки: результат содержит исходный текст,
+        а ошибка парсинга возвращается в поле parse_error вместо исключения
+        """
+        try:
+            parsed = TelegramParser.parse_shr_message(shr_text)
+        except Exception as e:
+            return {'parse_error': f"Ошибка обработки: {str(e)}"}
+
+        parsed['raw_shr'] = shr_text
+        return parsed
+
+    @staticmethod
+    def parse_shr_batch(messages: List[str]) -> List[Dict]:
+        """Парсинг пачки SHR телеграмм (выполняется в процессе пула парсинга)"""
+        return [TelegramParser.parse_shr_telegram(msg) for msg in messages]
+
     @staticmethod
     def parse_shr_message(shr_text: str) -> Dict:
         """Парсинг SHR телеграммы"""
@@ -55,54 +100,96 @@ class TelegramParser:
             'zone': None
         }
 
+        fields = SHR_FIELDS.search(shr_text)
+
         # Извлечение SID
-        sid_match = re.search(r'SID/(\d+)', shr_text)
-        if sid_match:
-            result['sid'] = sid_match.group(1)
+        sid = fields.get('SID')
+        if sid:
+            result['sid'] = sid
 
         # Извлечение координат вылета/прилета
-        dep_match = re.search(r'DEP/(\d{4}[NS]\d{5}[EW])', shr_text)
-        if dep_match:
-            coords = TelegramParser.parse_coordinates(dep_match.group(1))
-            result['dep_coords'] = coords
+        dep = fields.get('DEP')
+        if dep:
+            result['dep_coords'] = TelegramParser.parse_coordinates(dep)
 
-        dest_match = re.search(r'DEST/(\d{4}[NS]\d{5}[EW])', shr_text)
-        if dest_match:
-            coords = TelegramParser.parse_coordinates(dest_match.group(1))
-            result['arr_coords'] = coords
+        dest = fields.get('DEST')
+        if dest:
+            result['arr_coords'] = TelegramParser.parse_coordinates(dest)
 
         # Извлечение даты
-        dof_match = re.search(r'DOF/(\d{6})', shr_text)
-        if dof_match:
-            date_str = dof_match.group(1)
-            year = 2000 + int(date_str[0:2])
-            month = int(date_str[2:4])
-            day = int(date_str[4:6])
-            result['date'] = datetime(year, month, day)
+        date_str = fields.get('DOF')
+        if date_str:
+            result['date'] = _flight_date(date_str)
 
         # Извлечение оператора
-        opr_match = re.search(r'OPR/([^/\s]+(?:\s+[^/\s]+)*)', shr_text)
-        if opr_match:
-            result['operator'] = opr_match.group(1).strip()
+        operator = fields.get('OPR')
+        if operator:
+            result['operator'] = operator.strip()
 
         # Извлечение типа БВС
-        typ_match = re.search(r'TYP/(\w+)', shr_text)
-        if typ_match:
-            result['uav_type'] = typ_match.group(1)
+        uav_type = fields.get('TYP')
+        if uav_type:
+            result['uav_type'] = uav_type
 
         # Извлечение регистрации
-        reg_match = re.search(r'REG/([^/\s]+(?:\s+[^/\s]+)*)', shr_text)
-        if reg_match:
-            result['registration'] = reg_match.group(1).strip()
+        registration = fields.get('REG')
+        if registration:
+            result['registration'] = registration.strip()
 
         # Извлечение высоты
-        alt_match = re.search(r'M(\d{4})/M(\d{4})', shr_text)
+        alt_match = ALTITUDE_RE.search(shr_text)
         if alt_match:
             result['altitude'] = {
                 'min': int(alt_match.group(1)),
                 'max': int(alt_match.group(2))
             }
 
+        # Извлечение зоны полета
+        zone_match = ZONE_RE.search(shr_text)
+        if zone_match:
+            result['zone'] = TelegramParser.parse_zone(*zone_match.groups())
+
+        return result
+
+    @staticmethod
+    def parse_zone(radius: Optional[str], center: Optional[str], polygon: Optional[str]) -> Optional[Dict]:
+        """
+        Зона полета из поля ZONA:
+        R0,5 5957N02905E -> {'radius_km': 0.5, 'center': [59.95, 29.083]},
+        5957N02905E 6000N03000E ... -> {'polygon': [[59.95, 29.083], [60.0, 30.0], ...]}
+        """
+        if radius:
+            coords = TelegramParser.parse_coordinates(center)
+            if not coords:
+                return None
+            return {'radius_km': float(radius.replace(',', '.')), 'center': list(coords)}
+
+        points = [TelegramParser.parse_coordinates(point) for point in ZONE_POINT_RE.findall(polygon)]
+        return {'polygon': [list(point) for point in points if point]}
+
+    @staticmethod
+    def parse_route(route: Optional[str]) -> Optional[Dict]:
+        """
+        Маршрут из графы "Маршрут" плана полетов: зона ZONA (см. parse_zone)
+        или последовательность точек маршрута.
+        /ZONA R0,5 5957N02905E/ -> {'route': ..., 'radius_km': 0.5, 'center': [59.95, 29.083]},
+        5957N02905E 6000N03000E -> {'route': ..., 'path': [[59.95, 29.083], [60.0, 30.0]]}
+        """
+        if not route:
+            return None
+
+        result = {'route': route}
+
+        zone_match = ZONE_RE.search(route)
+        if zone_match:
+            result.update(TelegramParser.parse_zone(*zone_match.groups()) or {})
+            return result
+
+        points = [TelegramParser.parse_coordinates(point) for point in ZONE_POINT_RE.findall(route)]
+        points = [list(point) for point in points if point]
+        if points:
+            result['path'] = points
+
         return result
 
     @staticmethod
@@ -118,26 +205,27 @@ class TelegramParser:
             'registration': None
         }
 
-        sid_match = re.search(r'SID\s+(\d+)', dep_text)
-        if sid_match:
-            result['sid'] = sid_match.group(1)
+        fields = DEP_FIELDS.search(dep_text)
+
+        sid = fields.get('SID')
+        if sid:
+            result['sid'] = sid
 
-        add_match = re.search(r'ADD\s+(\d{6})', dep_text)
-        if add_match:
-            result['add'] = add_match.group(1)
+        add = fields.get('ADD')
+        if add:
+            result['add'] = add
 
-        atd_match = re.search(r'ATD\s+(\d{4})', dep_text)
-        if atd_match:
-            result['atd'] = atd_match.group(1)
+        atd = fields.get('ATD')
+        if atd:
+            result['atd'] = atd
 
-        adepz_match = re.search(r'ADEPZ\s+(\d{4}[NS]\d{5}[EW])', dep_text)
-        if adepz_match:
-            coords = TelegramParser.parse_coordinates(adepz_match.group(1))
-            result['adepz'] = coords
+        adepz = fields.get('ADEPZ')
+        if adepz:
+            result['adepz'] = TelegramParser.parse_coordinates(adepz)
 
-        reg_match = re.search(r'REG\s+([^\s]+)', dep_text)
-        if reg_match:
-            result['registration'] = reg_match.group(1)
+        registration = fields.get('REG')
+        if registration:
+            result['registration'] = registration
 
         return result
 
@@ -154,25 +242,26 @@ class TelegramParser:
             'registration': None
         }
 
-        sid_match = re.search(r'SID\s+(\d+)', arr_text)
-        if sid_match:
-            result['sid'] = sid_match.group(1)
+        fields = ARR_FIELDS.search(arr_text)
 
-        ada_match = re.search(r'ADA\s+(\d{6})', arr_text)
-        if ada_match:
-            result['ada'] = ada_match.group(1)
+        sid = fields.get('SID')
+        if sid:
+            result['sid'] = sid
 
-        ata_match = re.search(r'ATA\s+(\d{4})', arr_text)
-        if ata_match:
-            result['ata'] = ata_match.group(1)
+        ada = fields.get('ADA')
+        if ada:
+            result['ada'] = ada
 
-        adarrz_match = re.search(r'ADARRZ\s+(\d{4}[NS]\d{5}[EW])', arr_text)
-        if adarrz_match:
-            coords = TelegramParser.parse_coordinates(adarrz_match.group(1))
-            result['adarrz'] = coords
+        ata = fields.get('ATA')
+        if ata:
+            result['ata'] = ata
 
-        reg_match = re.search(r'REG\s+([^\s]+)', arr_text)
-        if reg_match:
-            result['registration'] = reg_match.group(1)
+        adarrz = fields.get('ADARRZ')
+        if adarrz:
+            result['adarrz'] = TelegramParser.parse_coordinates(adarrz)
 
-        return result
\ No newline at end of file
+        registration = fields.get('REG')
+        if registration:
+            result['registration'] = registration
+
+        return result
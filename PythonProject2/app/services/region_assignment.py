@@ -0,0 +1,192 @@
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+import shapely
+from shapely.geometry import MultiPolygon
+from sqlalchemy import Date, bindparam, delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.flight import Flight
+from app.models.region import Region
+from app.services.geo_service import GeoService, SRID, UNKNOWN_REGION
+
+logger = logging.getLogger(__name__)
+
+# Регион точки: при пересечении границ выбирается меньший регион, как в GeoService.
+# ST_Intersects вместо ST_Contains: точка на границе относится к региону
+# (так же считает GeoService), а GiST индекс geo.regions используется в обоих случаях
+_REGION_OF = (
+    "(SELECT r.name FROM geo.regions r "
+    "WHERE ST_Intersects(r.geometry, f.{point}) "
+    "ORDER BY r.area_km2 LIMIT 1)"
+)
+
+# Привязка полетов по фильтру: регион пересчитывается только у полетов с точкой,
+# у полетов без точки (загруженных до появления точек) регион не меняется
+_ASSIGN_SQL = f"""
+UPDATE flights AS t
+SET dep_region = m.dep_region, arr_region = m.arr_region
+FROM (
+    SELECT f.id,
+           CASE WHEN f.dep_point IS NULL THEN f.dep_region
+                ELSE COALESCE({_REGION_OF.format(point='dep_point')}, :unknown) END AS dep_region,
+           CASE WHEN f.arr_point IS NULL THEN f.arr_region
+                ELSE COALESCE({_REGION_OF.format(point='arr_point')}, :unknown) END AS arr_region
+    FROM flights f
+    WHERE (f.dep_point IS NOT NULL OR f.arr_point IS NOT NULL)
+      {{filters}}
+) AS m
+WHERE t.id = m.id
+  AND (t.dep_region IS DISTINCT FROM m.dep_region OR t.arr_region IS DISTINCT FROM m.arr_region)
+"""
+
+# Диапазон id при обходе таблицы
+_RANGE_FILTER = "AND f.id > :start AND f.id <= :stop "
+
+# Полеты за дни загрузки (диапазон дат использует индекс по flight_date)
+_DAYS_FILTER = (
+    "AND f.flight_date >= :day_from AND f.flight_date < :day_to "
+    "AND f.flight_date::date = ANY(:days) "
+)
+
+# Полеты без даты, добавленные загрузкой (по первичному ключу)
+_NEW_UNDATED_FILTER = "AND f.id > :after_id AND f.flight_date IS NULL "
+
+# Дней в одном запросе привязки полетов загрузки
+_BATCH_DAYS = 31
+
+# Только полеты, у которых есть точка без региона (после загрузки в режиме postgis)
+_MISSING_FILTER = (
+    "AND ((f.dep_point IS NOT NULL AND f.dep_region IS NULL) "
+    "OR (f.arr_point IS NOT NULL AND f.arr_region IS NULL))"
+)
+
+
+def _multipolygon(geometry) -> Optional[MultiPolygon]:
+    """Приведение границы к MultiPolygon (тип колонки geo.regions.geometry)"""
+    polygons = [part for part in shapely.get_parts(geometry) if part.geom_type == 'Polygon']
+    return MultiPolygon(polygons) if polygons else None
+
+
+def _ewkb(geometry) -> str:
+    return shapely.to_wkb(shapely.set_srid(geometry, SRID), hex=True, include_srid=True)
+
+
+async def load_region_boundaries(db: AsyncSession, geo_service: GeoService) -> int:
+    """
+    Замена границ в geo.regions границами, загруженными GeoService.
+    Площадь считается в БД по геодезической метрике.
+    """
+    rows = []
+    for name, code, geometry in geo_service.boundaries():
+        polygon = _multipolygon(geometry)
+        if polygon is None:
+            continue
+
+        rows.append({
+            "name": name,
+            "code": (code or '')[:10],
+            "geometry": _ewkb(polygon),
+            "center_point": _ewkb(polygon.point_on_surface()),
+            "created_at": datetime.utcnow()
+        })
+
+    await db.execute(delete(Region))
+    if rows:
+        await db.execute(insert(Region), rows)
+        await db.execute(text(
+            "UPDATE geo.regions SET area_km2 = ST_Area(geometry::geography) / 1000000"
+        ))
+    await db.commit()
+
+    logger.info(f"В geo.regions загружены границы {len(rows)} регионов")
+    return len(rows)
+
+
+async def ensure_region_boundaries(db: AsyncSession, geo_service: GeoService) -> int:
+    """Загрузка границ в geo.regions, если таблица пуста"""
+    count = await db.scalar(select(func.count(Region.id)))
+    if count:
+        return count
+    return await load_region_boundaries(db, geo_service)
+
+
+async def assign_regions(db: AsyncSession,
+                         only_missing: bool = False,
+                         batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Привязка полетов к регионам в БД: UPDATE ... FROM geo.regions по точкам
+    dep_point/arr_point. Таблица обходится диапазонами id (по первичному ключу),
+    каждый диапазон фиксируется отдельной транзакцией.
+    only_missing - только полеты с точкой без региона
+    """
+    batch_size = batch_size or settings.REGION_ASSIGN_BATCH_SIZE
+    statement = text(_ASSIGN_SQL.format(filters=_RANGE_FILTER + (_MISSING_FILTER if only_missing else '')))
+
+    bounds = (await db.execute(select(func.min(Flight.id), func.max(Flight.id)))).one()
+    updated = 0
+    started = time.perf_counter()
+
+    if bounds[0] is not None:
+        for start in range(bounds[0] - 1, bounds[1], batch_size):
+            result = await db.execute(statement, {
+                "start": start,
+                "stop": start + batch_size,
+                "unknown": UNKNOWN_REGION
+            })
+            updated += result.rowcount
+            await db.commit()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Привязка к регионам в БД: обновлено {updated} полетов за {elapsed:.1f} с")
+
+    return {"updated": updated, "elapsed_sec": round(elapsed, 3)}
+
+
+async def last_flight_id(db: AsyncSession) -> int:
+    """Наибольший id полета (полеты, добавленные после, имеют больший id)"""
+    return (await db.execute(select(func.max(Flight.id)))).scalar() or 0
+
+
+async def assign_ingested_regions(db: AsyncSession,
+                                  days: Iterable[date],
+                                  after_id: Optional[int] = None) -> int:
+    """
+    Привязка к регионам полетов загрузки с точкой без региона без фиксации транзакции:
+    полеты за дни days и полеты без даты с id > after_id (добавленные загрузкой).
+    Просматриваются только эти полеты (по индексу flight_date и первичному ключу);
+    обход всей таблицы - assign_regions
+    """
+    days = sorted(set(days))
+    updated = 0
+    started = time.perf_counter()
+
+    by_days = text(_ASSIGN_SQL.format(filters=_DAYS_FILTER + _MISSING_FILTER)).bindparams(
+        bindparam("days", type_=ARRAY(Date))
+    )
+    for offset in range(0, len(days), _BATCH_DAYS):
+        batch = days[offset:offset + _BATCH_DAYS]
+        result = await db.execute(by_days, {
+            "days": batch,
+            "day_from": batch[0],
+            "day_to": batch[-1] + timedelta(days=1),
+            "unknown": UNKNOWN_REGION
+        })
+        updated += result.rowcount
+
+    if after_id is not None:
+        result = await db.execute(
+            text(_ASSIGN_SQL.format(filters=_NEW_UNDATED_FILTER + _MISSING_FILTER)),
+            {"after_id": after_id, "unknown": UNKNOWN_REGION}
+        )
+        updated += result.rowcount
+
+    logger.info(
+        f"Привязка к регионам полетов загрузки: обновлено {updated} полетов "
+        f"за {len(days)} дн. за {time.perf_counter() - started:.1f} с"
+    )
+    return updated
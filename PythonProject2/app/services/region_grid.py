@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+import shapely
+
+logger = logging.getLogger(__name__)
+
+# Значения ячеек растра: номер региона (>= 0) или маркер
+EMPTY = -1  # Ячейка вне всех регионов
+BORDER = -2  # Через ячейку проходит граница, нужна точная проверка
+
+# Версия алгоритма построения: при изменении кэшированные растры перестраиваются
+GRID_VERSION = 1
+
+# Количество строк растра, размечаемых за один проход (ограничивает память при построении)
+BUILD_CHUNK_ROWS = 256
+
+
+class RegionGrid:
+    """
+    Растр регионов с фиксированным шагом по широте и долготе.
+    Ячейка хранит номер региона, целиком покрывающего ее, EMPTY или BORDER,
+    поэтому определение региона точки - обращение к массиву, а точная проверка
+    по полигонам нужна только для точек в ячейках на границах.
+    """
+
+    def __init__(self, cells: np.ndarray, lat0: float, lon0: float, resolution: float):
+        self.cells = cells
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.resolution = resolution
+
+    @property
+    def shape(self):
+        return self.cells.shape
+
+    def lookup(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Значения ячеек для массивов координат (EMPTY за пределами растра и для NaN)"""
+        rows = np.floor((lats - self.lat0) / self.resolution)
+        cols = np.floor((lons - self.lon0) / self.resolution)
+
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        values = np.full(lats.shape, EMPTY, dtype=self.cells.dtype)
+        values[inside] = self.cells[rows[inside].astype(np.intp), cols[inside].astype(np.intp)]
+
+        return values
+
+    def value(self, lat: float, lon: float) -> int:
+        """Значение ячейки для одной точки"""
+        row = int((lat - self.lat0) // self.resolution)
+        col = int((lon - self.lon0) // self.resolution)
+
+        if 0 <= row < self.shape[0] and 0 <= col < self.shape[1]:
+            return int(self.cells[row, col])
+        return EMPTY
+
+    @classmethod
+    def build(cls, geometries: Sequence, resolution: float,
+              resolve: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> "RegionGrid":
+        """
+        Построение растра по границам регионов.
+        resolve(lats, lons) - точное определение номеров регионов (EMPTY вне регионов).
+
+        Граничные ячейки размечаются по вершинам границ, уплотненным до полушага
+        растра, с расширением на соседние ячейки: любая точка границы лежит
+        не дальше четверти шага от вершины, поэтому внутренность остальных ячеек
+        границу не пересекает. Непрерывный отрезок таких ячеек в строке растра
+        лежит целиком в одном регионе (или вне всех), и его регион определяется
+        точной проверкой центра первой ячейки.
+        """
+        minx, miny, maxx, maxy = shapely.total_bounds(geometries)
+        lat0 = np.floor(miny / resolution) * resolution
+        lon0 = np.floor(minx / resolution) * resolution
+        n_rows = int(np.ceil((maxy - lat0) / resolution)) + 1
+        n_cols = int(np.ceil((maxx - lon0) / resolution)) + 1
+
+        border = np.zeros((n_rows, n_cols), dtype=bool)
+        # Вершины уплотненных колец полигонов - точки границ
+        coords = shapely.get_coordinates(shapely.segmentize(np.asarray(geometries), resolution / 2))
+        rows = np.floor((coords[:, 1] - lat0) / resolution).astype(np.intp)
+        cols = np.floor((coords[:, 0] - lon0) / resolution).astype(np.intp)
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                border[np.clip(rows + d_row, 0, n_rows - 1), np.clip(cols + d_col, 0, n_cols - 1)] = True
+
+        cells = np.empty((n_rows, n_cols), dtype=np.int16)
+
+        for start in range(0, n_rows, BUILD_CHUNK_ROWS):
+            chunk = border[start:start + BUILD_CHUNK_ROWS].ravel()
+
+            # Начало отрезка: не граничная ячейка в начале строки или после граничной
+            first = ~chunk
+            first[1:] &= chunk[:-1] | (np.arange(1, chunk.size) % n_cols == 0)
+            runs = np.cumsum(first) - 1
+            heads = np.flatnonzero(first)
+
+            lats = lat0 + (start + heads // n_cols + 0.5) * resolution
+            lons = lon0 + (heads % n_cols + 0.5) * resolution
+            values = np.asarray(resolve(lats, lons), dtype=np.int16)
+
+            chunk_cells = values[np.maximum(runs, 0)] if len(values) else np.full(chunk.size, EMPTY, np.int16)
+            chunk_cells[chunk] = BORDER
+            cells[start:start + BUILD_CHUNK_ROWS] = chunk_cells.reshape(-1, n_cols)
+
+        return cls(cells, float(lat0), float(lon0), resolution)
+
+    def save(self, path: str, meta: dict):
+        """Сохранение растра (.npy) и его параметров (.json) с атомарной заменой файлов"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, self.cells)
+        os.replace(tmp_path, path)
+
+        with open(f"{path}.tmp.json", 'w', encoding='utf-8') as f:
+            json.dump({**meta, "lat0": self.lat0, "lon0": self.lon0, "resolution": self.resolution},
+                      f, ensure_ascii=False)
+        os.replace(f"{path}.tmp.json", _meta_path(path))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["RegionGrid"]:
+        """Загрузка растра, отображенного в память (mmap), если файлы есть"""
+        if not (os.path.exists(path) and os.path.exists(_meta_path(path))):
+            return None
+
+        with open(_meta_path(path), encoding='utf-8') as f:
+            meta = json.load(f)
+
+        cells = np.load(path, mmap_mode='r')
+        return cls(cells, meta["lat0"], meta["lon0"], meta["resolution"])
+
+
+def _meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + '.json'
+
+
+def grid_path(cache_dir: str, source_key: str, names: List[str], resolution: float) -> str:
+    """
+    Путь к кэшу растра: имя зависит от источника границ (файлы, их размер и время
+    изменения), порядка регионов, шага растра и версии алгоритма
+    """
+    key = json.dumps([GRID_VERSION, source_key, names, resolution], ensure_ascii=False)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"region_grid_{digest}.npy")
+
+
+def load_or_build_grid(geometries: Sequence, names: List[str], source_key: str,
+                       resolution: float, cache_dir: Optional[str],
+                       resolve: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> RegionGrid:
+    """
+    Растр регионов из кэша или построенный заново.
+    Растр перестраивается только при изменении источника границ или шага.
+    """
+    path = grid_path(cache_dir, source_key, names, resolution) if cache_dir else None
+
+    if path:
+        try:
+            grid = RegionGrid.load(path)
+            if grid is not None:
+                logger.info(f"Растр регионов {grid.shape} загружен из {path}")
+                return grid
+        except Exception as e:
+            logger.warning(f"Ошибка загрузки растра регионов из {path}: {e}")
+
+    grid = RegionGrid.build(geometries, resolution, resolve)
+    border_share = float(np.mean(grid.cells == BORDER))
+    logger.info(f"Построен растр регионов {grid.shape}, шаг {resolution}°, "
+                f"граничных ячеек {border_share:.1%}")
+
+    if path:
+        try:
+            _remove_stale(cache_dir, path)
+            grid.save(path, {"names": names, "source": source_key})
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить растр регионов в {path}: {e}")
+
+    return grid
+
+
+def _remove_stale(cache_dir: str, keep: str):
+    """Удаление растров, построенных по прежним границам"""
+    if not os.path.isdir(cache_dir):
+        return
+
+    keep_files = {os.path.basename(keep), os.path.basename(_meta_path(keep))}
+    for file_name in os.listdir(cache_dir):
+        if file_name.startswith('region_grid_') and file_name not in keep_files:
+            os.remove(os.path.join(cache_dir, file_name))
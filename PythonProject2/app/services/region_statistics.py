@@ -0,0 +1,265 @@
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Union
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.flight import Flight
+from app.models.flight_region import FlightRegion
+from app.services.sketches import estimate, union_sketches
+
+# Статистика региона одним запросом: полеты, пересекающие регион (flight_regions),
+# выбираются по индексу idx_flight_regions_region, из flights читаются только
+# агрегируемые колонки
+_STATISTICS_SQL = """
+WITH region_flights AS (
+    SELECT f.flight_date, f.dep_time, f.duration_minutes, f.operator, f.uav_type, fr.distance_km
+    FROM flight_regions fr
+    JOIN flights f ON f.id = fr.flight_id
+    WHERE fr.region = :region
+    {filters}
+),
+peak AS (
+    SELECT extract(hour FROM dep_time)::int AS hour, count(*) AS flights
+    FROM region_flights
+    WHERE dep_time IS NOT NULL
+    GROUP BY 1
+    ORDER BY 2 DESC, 1
+    LIMIT 1
+)
+SELECT count(*) AS total_flights,
+       coalesce(sum(duration_minutes), 0) AS total_duration,
+       {unique_operators} AS unique_operators,
+       {unique_uav_types} AS unique_uav_types,
+       coalesce(sum(distance_km), 0) AS total_distance,
+       coalesce((SELECT hour FROM peak), 0) AS peak_hour,
+       coalesce((SELECT flights FROM peak), 0) AS peak_hour_flights,
+       {zero_days} AS zero_flight_days
+FROM region_flights
+"""
+
+# Та же статистика по агрегатам flight_rollup: строк в ячейках за период
+# на порядки меньше, чем полетов
+_ROLLUP_STATISTICS_SQL = """
+WITH cells AS (
+    SELECT day, hour, uav_type, flights, duration_minutes, distance_km, operators
+    FROM flight_rollup
+    WHERE region = :region
+    {filters}
+),
+peak AS (
+    SELECT hour, sum(flights) AS flights
+    FROM cells
+    WHERE hour >= 0
+    GROUP BY 1
+    ORDER BY 2 DESC, 1
+    LIMIT 1
+)
+SELECT coalesce(sum(flights), 0)::bigint AS total_flights,
+       coalesce(sum(duration_minutes), 0)::bigint AS total_duration,
+       {unique_operators} AS unique_operators,
+       {unique_uav_types} AS unique_uav_types,
+       coalesce(sum(distance_km), 0) AS total_distance,
+       coalesce((SELECT hour FROM peak), 0) AS peak_hour,
+       coalesce((SELECT flights FROM peak), 0)::bigint AS peak_hour_flights,
+       {zero_days} AS zero_flight_days
+FROM cells
+"""
+
+# Дни периода без полетов (считаются, только если в периоде есть полеты);
+# {days} - запрос дней с полетами
+_ZERO_DAYS = """
+CASE WHEN count(*) = 0 THEN 0 ELSE (
+    SELECT count(*)
+    FROM generate_series(CAST(:start_date AS date), CAST(:end_date AS date), interval '1 day') AS d(day)
+    WHERE d.day::date NOT IN ({days})
+) END
+"""
+
+# Рейтинг регионов по агрегатам; операторы объединяются по ячейкам региона
+_ROLLUP_RATING_SQL = """
+WITH cells AS (
+    SELECT region, flights, duration_minutes, operators
+    FROM flight_rollup
+    WHERE TRUE
+    {filters}
+),
+totals AS (
+    SELECT region, sum(flights)::bigint AS flight_count, sum(duration_minutes)::bigint AS total_duration
+    FROM cells
+    GROUP BY region
+    ORDER BY 2 DESC
+    LIMIT :limit
+)
+SELECT t.region, t.flight_count, t.total_duration,
+       {unique_operators} AS unique_operators
+FROM totals t
+ORDER BY t.flight_count DESC
+"""
+
+
+# Точный подсчет уникальных значений в запросах статистики по flights и по flight_rollup
+_FLIGHTS_UNIQUE = {
+    "unique_operators": "count(DISTINCT nullif(operator, ''))",
+    "unique_uav_types": "count(DISTINCT nullif(uav_type, ''))"
+}
+_ROLLUP_UNIQUE = {
+    "unique_operators": "(SELECT count(DISTINCT operator) FROM cells, unnest(cells.operators) AS operator)",
+    "unique_uav_types": "count(DISTINCT nullif(uav_type, ''))"
+}
+_RATING_UNIQUE_OPERATORS = """(
+        SELECT count(DISTINCT operator)
+        FROM cells c, unnest(c.operators) AS operator
+        WHERE c.region = t.region
+    )"""
+
+# Приближенный подсчет: уникальные значения оцениваются по скетчам flight_sketches
+_APPROXIMATE_UNIQUE = {"unique_operators": "0", "unique_uav_types": "0"}
+
+
+def _whole_days(*bounds: Optional[Union[date, datetime]]) -> bool:
+    """Границы периода - целые дни (по ним применимы агрегаты и скетчи по дням)"""
+    return all(
+        not isinstance(bound, datetime) or bound.time() == time.min
+        for bound in bounds
+        if bound is not None
+    )
+
+
+def _use_rollup(*bounds: Optional[Union[date, datetime]]) -> bool:
+    """Агрегаты по дням применимы, если границы периода - целые дни"""
+    return settings.ROLLUP_READS and _whole_days(*bounds)
+
+
+def _day(bound: Optional[Union[date, datetime]]) -> Optional[date]:
+    return bound.date() if isinstance(bound, datetime) else bound
+
+
+def _flights_until(end_date: Union[date, datetime]):
+    """
+    Условие конца периода по flights.flight_date: граница из целого дня включает
+    весь день, как day <= :end_date в flight_rollup
+    """
+    if _whole_days(end_date):
+        return Flight.flight_date < _day(end_date) + timedelta(days=1)
+    return Flight.flight_date <= end_date
+
+
+async def region_rating(db: AsyncSession,
+                        start_date: Optional[Union[date, datetime]] = None,
+                        end_date: Optional[Union[date, datetime]] = None,
+                        limit: int = 10,
+                        approximate: bool = False) -> List[Dict[str, Any]]:
+    """
+    Регионы по убыванию количества полетов, которые их пересекают:
+    region, flight_count, total_duration (мин), unique_operators
+    и unique_operators_error (граница ошибки оценки, None - точный подсчет).
+    Период из целых дней считается по flight_rollup, иначе - по flights.
+    approximate - операторы оцениваются по скетчам (только для периода из целых дней)
+    """
+    approximate = approximate and _whole_days(start_date, end_date)
+
+    if _use_rollup(start_date, end_date):
+        filters = ''
+        params: Dict[str, Any] = {"limit": limit}
+        if start_date:
+            filters += "AND day >= :start_date "
+            params["start_date"] = _day(start_date)
+        if end_date:
+            filters += "AND day <= :end_date "
+            params["end_date"] = _day(end_date)
+
+        unique_operators = _APPROXIMATE_UNIQUE["unique_operators"] if approximate else _RATING_UNIQUE_OPERATORS
+        result = await db.execute(
+            text(_ROLLUP_RATING_SQL.format(filters=filters, unique_operators=unique_operators)), params
+        )
+    else:
+        columns = [
+            FlightRegion.region,
+            func.count(Flight.id).label('flight_count'),
+            func.sum(Flight.duration_minutes).label('total_duration')
+        ]
+        if not approximate:
+            columns.append(func.count(func.distinct(Flight.operator)).label('unique_operators'))
+        query = select(*columns).join(Flight, Flight.id == FlightRegion.flight_id).group_by(FlightRegion.region)
+
+        if start_date:
+            query = query.where(Flight.flight_date >= start_date)
+        if end_date:
+            query = query.where(_flights_until(end_date))
+
+        result = await db.execute(query.order_by(func.count(Flight.id).desc()).limit(limit))
+
+    rows = [dict(row._mapping, unique_operators_error=None) for row in result]
+
+    if approximate and rows:
+        sketches = await union_sketches(db, [row["region"] for row in rows], _day(start_date), _day(end_date))
+        for row in rows:
+            row["unique_operators"], row["unique_operators_error"] = estimate(sketches[row["region"]][0])
+
+    return rows
+
+
+async def region_statistics(db: AsyncSession, region: str,
+                            start_date: Optional[date] = None,
+                            end_date: Optional[date] = None,
+                            approximate: bool = False) -> Dict[str, Any]:
+    """
+    Детальная статистика по региону: агрегаты считаются в БД одним запросом
+    по flight_rollup (ROLLUP_READS) или по flights,
+    объем передаваемых данных не зависит от количества полетов.
+    approximate - уникальные операторы и типы БВС оцениваются по скетчам
+    с границей ошибки
+    """
+    if _use_rollup(start_date, end_date):
+        statement, column, flight_days = _ROLLUP_STATISTICS_SQL, "day", "SELECT day FROM cells"
+        until = "day <= :end_date"
+        unique = _ROLLUP_UNIQUE
+    else:
+        statement, column = _STATISTICS_SQL, "f.flight_date"
+        flight_days = "SELECT flight_date::date FROM region_flights WHERE flight_date IS NOT NULL"
+        # Последний день периода входит целиком (flight_date - отметка времени)
+        until = "f.flight_date < CAST(:end_date AS date) + interval '1 day'"
+        unique = _FLIGHTS_UNIQUE
+
+    if approximate:
+        unique = _APPROXIMATE_UNIQUE
+
+    filters = ''
+    params: Dict[str, Any] = {"region": region}
+    if start_date:
+        filters += f"AND {column} >= :start_date "
+        params["start_date"] = start_date
+    if end_date:
+        filters += f"AND {until} "
+        params["end_date"] = end_date
+
+    zero_days = _ZERO_DAYS.format(days=flight_days) if start_date and end_date else '0'
+
+    result = await db.execute(text(statement.format(filters=filters, zero_days=zero_days, **unique)), params)
+    row = result.one()
+
+    unique_operators, unique_uav_types = row.unique_operators, row.unique_uav_types
+    unique_operators_error = unique_uav_types_error = None
+    if approximate:
+        operators, uav_types = (await union_sketches(db, [region], start_date, end_date))[region]
+        unique_operators, unique_operators_error = estimate(operators)
+        unique_uav_types, unique_uav_types_error = estimate(uav_types)
+
+    days = (end_date - start_date).days + 1 if start_date and end_date else None
+
+    return {
+        "region": region,
+        "total_flights": row.total_flights,
+        "total_duration_hours": row.total_duration / 60 if row.total_duration else 0,
+        "unique_operators": unique_operators,
+        "unique_uav_types": unique_uav_types,
+        "unique_operators_error": unique_operators_error,
+        "unique_uav_types_error": unique_uav_types_error,
+        "peak_hour": row.peak_hour,
+        "peak_hour_flights": row.peak_hour_flights,
+        "zero_flight_days": row.zero_flight_days,
+        "avg_flights_per_day": row.total_flights / max(days, 1) if days is not None else 0,
+        "total_distance_km": float(row.total_distance)
+    }
@@ -1,12 +1,15 @@
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 import tempfile
 from typing import List, Optional, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
+from app.core.hll import HyperLogLog
 from app.models.flight import Flight
+from app.services.region_statistics import region_rating
+from app.services.sketches import ALL_REGIONS, estimate, union_sketches
 
 
 class ReportGenerator:
@@ -19,9 +22,15 @@ class ReportGenerator:
             self,
             start_date: Optional[datetime] = None,
             end_date: Optional[datetime] = None,
-            regions: Optional[List[str]] = None
+            regions: Optional[List[str]] = None,
+            approximate: bool = False
     ) -> Dict[str, Any]:
-        """Генерация JSON отчета"""
+        """
+        Генерация JSON отчета.
+        approximate - число уникальных операторов в сводке оценивается по скетчам
+        за целые дни периода (с фильтром регионов - операторы полетов,
+        пересекающих регионы) и дополняется границей ошибки
+        """
 
         query = select(Flight)
 
@@ -55,6 +64,18 @@ class ReportGenerator:
             "daily_statistics": {}
         }
 
+        if approximate and all(
+                bound is None or bound.time() == time.min for bound in (start_date, end_date)
+        ):
+            sketches = await union_sketches(
+                self.db, regions or [ALL_REGIONS],
+                start_date.date() if start_date else None,
+                end_date.date() if end_date else None
+            )
+            operators = HyperLogLog.union(sketch for sketch, _ in sketches.values())
+            summary = report["summary"]
+            summary["unique_operators"], summary["unique_operators_error"] = estimate(operators)
+
         # Группировка по регионам
         for flight in flights:
             region = flight.dep_region or "Неизвестный"
@@ -85,28 +106,15 @@ class ReportGenerator:
     ) -> str:
         """Генерация графика в формате PNG"""
 
-        # Получение данных для графика
-        query = select(
-            Flight.dep_region,
-            func.count(Flight.id).label('count')
-        ).group_by(Flight.dep_region)
-
-        if start_date:
-            query = query.where(Flight.flight_date >= start_date)
-        if end_date:
-            query = query.where(Flight.flight_date <= end_date)
-
-        query = query.order_by(func.count(Flight.id).desc()).limit(10)
-
-        result = await self.db.execute(query)
-        data = result.all()
+        # Получение данных для графика: топ-10 регионов (по агрегатам flight_rollup)
+        data = await region_rating(self.db, start_date, end_date, 10)
 
         # Создание графика
         plt.figure(figsize=(12, 6))
         plt.style.use('seaborn-v0_8-darkgrid')
 
-        regions = [row.dep_region or "Неизвестный" for row in data]
-        counts = [row.count for row in data]
+        regions = [row["region"] or "Неизвестный" for row in data]
+        counts = [row["flight_count"] for row in data]
 
         if chart_type == "bar":
             plt.bar(regions, counts, color='skyblue', edgecolor='navy')
@@ -0,0 +1,122 @@
+"""
+Агрегаты полетов по регионам, дням, часам и типам БВС (flight_rollup)
+и скетчи уникальных операторов и типов БВС по регионам и дням (flight_sketches).
+
+Полная перестройка (например, после загрузки данных до появления таблицы):
+    python -m app.services.rollup
+    python -m app.services.rollup --start 2024-01-01 --end 2024-12-31
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import Date, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import response_cache
+from app.core.database import AsyncSessionLocal
+from app.services.sketches import refresh_sketches
+
+logger = logging.getLogger(__name__)
+
+# Ячейки агрегатов по полетам, пересекающим регионы (flight_regions).
+# Протяженность - протяженность пути внутри региона
+_ROLLUP_SELECT = """
+SELECT fr.region,
+       f.flight_date::date AS day,
+       coalesce(extract(hour FROM f.dep_time)::smallint, -1) AS hour,
+       coalesce(f.uav_type, '') AS uav_type,
+       count(*) AS flights,
+       coalesce(sum(f.duration_minutes), 0) AS duration_minutes,
+       coalesce(sum(fr.distance_km), 0) AS distance_km,
+       coalesce(array_agg(DISTINCT f.operator) FILTER (WHERE f.operator <> ''), '{{}}') AS operators
+FROM flight_regions fr
+JOIN flights f ON f.id = fr.flight_id
+WHERE f.flight_date IS NOT NULL
+{filters}
+GROUP BY 1, 2, 3, 4
+"""
+
+# Фильтр пересчитываемых дней (диапазон использует индекс по flight_date)
+_DAYS_FILTER = (
+    "AND f.flight_date >= :day_from AND f.flight_date < :day_to "
+    "AND f.flight_date::date = ANY(:days)"
+)
+
+
+async def refresh_rollup(db: AsyncSession, days: Optional[Iterable[date]] = None) -> int:
+    """
+    Пересчет агрегатов и скетчей за указанные дни (None - полная перестройка)
+    в текущей транзакции без ее фиксации: при загрузке агрегаты фиксируются вместе
+    с полетами, и читатели видят либо старые полеты и агрегаты дня, либо новые.
+    Дни пересчитываются целиком: результат не зависит от политики конфликтов
+    при загрузке (вставка, перезапись или дополнение полетов).
+    Полеты без даты в агрегаты не входят.
+    """
+    started = time.perf_counter()
+    params: Dict[str, Any] = {}
+
+    if days is None:
+        await db.execute(text("TRUNCATE flight_rollup"))
+        filters = ''
+    else:
+        days = sorted(set(days))
+        if not days:
+            return 0
+
+        await db.execute(
+            text("DELETE FROM flight_rollup WHERE day = ANY(:days)").bindparams(
+                bindparam("days", type_=ARRAY(Date))
+            ),
+            {"days": days}
+        )
+        filters = _DAYS_FILTER
+        params.update(days=days, day_from=days[0], day_to=days[-1] + timedelta(days=1))
+
+    statement = text(
+        f"INSERT INTO flight_rollup (region, day, hour, uav_type, flights, duration_minutes, "
+        f"distance_km, operators) {_ROLLUP_SELECT.format(filters=filters)}"
+    )
+    if days is not None:
+        statement = statement.bindparams(bindparam("days", type_=ARRAY(Date)))
+
+    result = await db.execute(statement, params)
+    buckets = await refresh_sketches(db, days)
+
+    logger.info(
+        f"Агрегаты по регионам пересчитаны за {'все дни' if days is None else f'{len(days)} дн.'}: "
+        f"{result.rowcount} ячеек, {buckets} скетчей за {time.perf_counter() - started:.1f} с"
+    )
+    return result.rowcount
+
+
+async def _rebuild(start: Optional[date], end: Optional[date]):
+    days = None
+    if start or end:
+        if not (start and end):
+            raise SystemExit("--start и --end задаются вместе")
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+    async with AsyncSessionLocal() as db:
+        cells = await refresh_rollup(db, days)
+        await db.commit()
+    await response_cache.clear()
+    print(f"Ячеек агрегатов: {cells}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перестройка агрегатов flight_rollup и скетчей flight_sketches")
+    parser.add_argument('--start', type=date.fromisoformat, help="Первый день (YYYY-MM-DD)")
+    parser.add_argument('--end', type=date.fromisoformat, help="Последний день (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_rebuild(args.start, args.end))
+
+
+if __name__ == "__main__":
+    main()
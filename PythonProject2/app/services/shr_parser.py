@@ -1,6 +1,6 @@
 import re
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,23 +9,35 @@ logger = logging.getLogger(__name__)
 class SHRDataParser:
     """Парсер данных из документов с SHR телеграммами"""
 
+    CENTER_NAMES = ['Санкт-Петербургский', 'Ростовский', 'Новосибирский',
+                    'Екатеринбургский', 'Московский', 'Красноярский', 'Тюменский']
+
     @staticmethod
-    def parse_shr_document(content: str) -> List[Dict]:
-        """Парсинг документа с SHR телеграммами в табличном формате"""
-        flights = []
-        lines = content.strip().split('\n')
+    def center_name(line: str) -> Optional[str]:
+        """Название центра ЕС ОрВД, если строка является заголовком центра"""
+        if any(center in line for center in SHRDataParser.CENTER_NAMES):
+            return line.split('\t')[0] if '\t' in line else line
+        return None
 
-        current_center = None
-        i = 0
+    @staticmethod
+    def parse_shr_document(content: Union[str, Iterable[str]],
+                           center: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Парсинг документа с SHR телеграммами в табличном формате.
+        Принимает текст документа или поток строк, полеты отдаются по одному.
+        center - центр ЕС ОрВД, действующий в начале фрагмента документа.
+        """
+        lines = content.strip().split('\n') if isinstance(content, str) else content
 
-        while i < len(lines):
-            line = lines[i].strip()
+        current_center = center
+
+        for raw_line in lines:
+            line = raw_line.strip()
 
             # Определяем центр ЕС ОрВД
-            if any(center in line for center in ['Санкт-Петербургский', 'Ростовский', 'Новосибирский',
-                                                 'Екатеринбургский', 'Московский', 'Красноярский', 'Тюменский']):
-                current_center = line.split('\t')[0] if '\t' in line else line
-                i += 1
+            header = SHRDataParser.center_name(line)
+            if header is not None:
+                current_center = header
                 continue
 
             # Парсим данные полета
@@ -42,14 +54,43 @@ class SHRDataParser:
                         )
 
                         if flight_info:
-                            flights.append(flight_info)
+                            yield flight_info
 
                     except Exception as e:
                         logger.warning(f"Ошибка парсинга строки: {e}")
 
-            i += 1
+    @staticmethod
+    def split_shr_document(lines: Iterable[str],
+                           chunk_lines: int) -> Iterator[Tuple[List[str], Optional[str]]]:
+        """
+        Разбиение документа на фрагменты для параллельного парсинга.
+        Фрагменты режутся по заголовкам центров и границам строк,
+        каждый фрагмент несет центр ЕС ОрВД, действующий в его начале.
+        """
+        current_center = None
+        chunk: List[str] = []
+
+        for line in lines:
+            header = SHRDataParser.center_name(line.strip())
+            if header is not None:
+                if chunk:
+                    yield chunk, current_center
+                    chunk = []
+                current_center = header
+                continue
+
+            chunk.append(line)
+            if len(chunk) >= chunk_lines:
+                yield chunk, current_center
+                chunk = []
 
-        return flights
+        if chunk:
+            yield chunk, current_center
+
+    @staticmethod
+    def parse_shr_chunk(lines: List[str], center: Optional[str]) -> List[Dict]:
+        """Парсинг фрагмента документа (выполняется в процессе пула парсинга)"""
+        return list(SHRDataParser.parse_shr_document(lines, center))
 
     @staticmethod
     def parse_combined_data(shr_text: str, dep_text: str, arr_text: str, center: str) -> Optional[Dict]:
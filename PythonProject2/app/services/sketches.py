@@ -0,0 +1,147 @@
+import math
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Date, String, bindparam, insert, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.hll import HyperLogLog
+from app.models.sketch import FlightSketch
+
+# Бакет скетчей по всем полетам дня (в том числе без региона)
+ALL_REGIONS = '*'
+
+# Дней в одном запросе при полной перестройке
+_BATCH_DAYS = 31
+
+# Множества операторов и типов БВС по бакетам (регион, день) за пересчитываемые дни
+_SKETCH_SELECT = """
+SELECT fr.region, f.flight_date::date AS day,
+       array_agg(DISTINCT f.operator) FILTER (WHERE f.operator <> '') AS operators,
+       array_agg(DISTINCT f.uav_type) FILTER (WHERE f.uav_type <> '') AS uav_types
+FROM flight_regions fr
+JOIN flights f ON f.id = fr.flight_id
+WHERE {filters}
+GROUP BY 1, 2
+UNION ALL
+SELECT :all_regions, f.flight_date::date,
+       array_agg(DISTINCT f.operator) FILTER (WHERE f.operator <> ''),
+       array_agg(DISTINCT f.uav_type) FILTER (WHERE f.uav_type <> '')
+FROM flights f
+WHERE {filters}
+GROUP BY 2
+"""
+
+_DAYS_FILTER = (
+    "f.flight_date >= :day_from AND f.flight_date < :day_to "
+    "AND f.flight_date::date = ANY(:days)"
+)
+
+
+def estimate(sketch: HyperLogLog) -> Tuple[int, int]:
+    """Оценка количества уникальных значений и граница ошибки (две стандартные ошибки, ~95%)"""
+    count = sketch.count()
+    return count, math.ceil(2 * sketch.error * count)
+
+
+async def _refresh_days(db: AsyncSession, days: List[date]) -> int:
+    statement = text(_SKETCH_SELECT.format(filters=_DAYS_FILTER)).bindparams(
+        bindparam("days", type_=ARRAY(Date))
+    )
+    result = await db.execute(statement, {
+        "days": days,
+        "day_from": days[0],
+        "day_to": days[-1] + timedelta(days=1),
+        "all_regions": ALL_REGIONS
+    })
+
+    precision = settings.HLL_PRECISION
+    rows = [
+        {
+            "region": row.region,
+            "day": row.day,
+            "operators": HyperLogLog(precision).update(row.operators or ()).to_bytes(),
+            "uav_types": HyperLogLog(precision).update(row.uav_types or ()).to_bytes()
+        }
+        for row in result
+    ]
+    if rows:
+        await db.execute(insert(FlightSketch), rows)
+    return len(rows)
+
+
+async def refresh_sketches(db: AsyncSession, days: Optional[Iterable[date]] = None) -> int:
+    """
+    Пересчет скетчей за указанные дни (None - полная перестройка) без фиксации транзакции:
+    вызывается из refresh_rollup, и агрегаты дня меняются вместе со скетчами
+    """
+    if days is None:
+        await db.execute(text("TRUNCATE flight_sketches"))
+        result = await db.execute(text(
+            "SELECT DISTINCT flight_date::date FROM flights WHERE flight_date IS NOT NULL ORDER BY 1"
+        ))
+        days = result.scalars().all()
+    else:
+        days = sorted(set(days))
+        if not days:
+            return 0
+        await db.execute(
+            text("DELETE FROM flight_sketches WHERE day = ANY(:days)").bindparams(
+                bindparam("days", type_=ARRAY(Date))
+            ),
+            {"days": days}
+        )
+
+    buckets = 0
+    for offset in range(0, len(days), _BATCH_DAYS):
+        buckets += await _refresh_days(db, days[offset:offset + _BATCH_DAYS])
+    return buckets
+
+
+async def day_regions(db: AsyncSession, days: Iterable[date]) -> Set[str]:
+    """Регионы (и ALL_REGIONS), в которых есть полеты за дни, по скетчам"""
+    days = sorted(set(days))
+    if not days:
+        return set()
+
+    result = await db.execute(
+        text("SELECT DISTINCT region FROM flight_sketches WHERE day = ANY(:days)").bindparams(
+            bindparam("days", type_=ARRAY(Date))
+        ),
+        {"days": days}
+    )
+    return set(result.scalars().all())
+
+
+async def union_sketches(db: AsyncSession, regions: Sequence[str],
+                         start_date: Optional[date] = None,
+                         end_date: Optional[date] = None) -> Dict[str, Tuple[HyperLogLog, HyperLogLog]]:
+    """
+    Скетчи операторов и типов БВС по регионам (ALL_REGIONS - все полеты),
+    объединенные по дням периода: регион -> (операторы, типы БВС).
+    Регионы без полетов за период получают пустые скетчи
+    """
+    filters = ''
+    params = {"regions": list(regions)}
+    if start_date:
+        filters += "AND day >= :start_date "
+        params["start_date"] = start_date
+    if end_date:
+        filters += "AND day <= :end_date "
+        params["end_date"] = end_date
+
+    statement = text(
+        f"SELECT region, operators, uav_types FROM flight_sketches WHERE region = ANY(:regions) {filters}"
+    ).bindparams(bindparam("regions", type_=ARRAY(String)))
+    result = await db.execute(statement, params)
+
+    precision = settings.HLL_PRECISION
+    sketches = {region: (HyperLogLog(precision), HyperLogLog(precision)) for region in regions}
+    for row in result:
+        operators, uav_types = sketches[row.region]
+        operators.merge(HyperLogLog.from_bytes(row.operators))
+        uav_types.merge(HyperLogLog.from_bytes(row.uav_types))
+
+    return sketches
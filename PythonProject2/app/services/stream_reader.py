@@ -0,0 +1,62 @@
+import codecs
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+def iter_text_lines(fileobj: BinaryIO, chunk_size: int = 1024 * 1024,
+                    encoding: str = 'utf-8') -> Iterator[str]:
+    """
+    Построчное чтение бинарного файла с инкрементальным декодированием.
+    В памяти одновременно находится не больше одного чанка и хвоста
+    незавершенной строки.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    tail = ''
+
+    while True:
+        chunk = fileobj.read(chunk_size)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            lines = (tail + text).split('\n')
+            tail = lines.pop()
+            yield from lines
+        if not chunk:
+            break
+
+    if tail:
+        yield tail
+
+
+def peek_lines(lines: Iterable[str], max_chars: int) -> Tuple[List[str], Iterator[str]]:
+    """
+    Чтение начала потока строк для определения формата файла.
+    Возвращает прочитанные строки и итератор по всему потоку (включая их).
+    """
+    iterator = iter(lines)
+    head = []
+    size = 0
+
+    for line in iterator:
+        head.append(line)
+        size += len(line)
+        if size >= max_chars:
+            break
+
+    return head, _chain(head, iterator)
+
+
+def _chain(head: List[str], rest: Iterator[str]) -> Iterator[str]:
+    yield from head
+    yield from rest
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Разбиение потока на пачки фиксированного размера"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
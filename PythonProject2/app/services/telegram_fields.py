@@ -0,0 +1,84 @@
+import re
+from typing import Callable, Dict, List, Tuple
+
+
+class FieldPatterns:
+    """
+    Таблица скомпилированных шаблонов полей телеграмм.
+    Шаблон каждого поля (маркер, разделитель, значение) компилируется один раз
+    при создании таблицы, а текст просматривается отдельным поиском на каждое поле.
+    Результат совпадает с re.search(KEY + разделитель + значение) по каждому полю
+    (проверяется tests/test_telegram_parser.py).
+    """
+
+    def __init__(self, fields: Dict[str, str], separator: str):
+        """
+        fields - поле и шаблон его значения
+        separator - шаблон разделителя между полем и значением
+        """
+        self.fields: List[Tuple[str, Callable]] = [
+            (key, re.compile(f'{key}{separator}({value})').search)
+            for key, value in fields.items()
+        ]
+
+    def search(self, text: str) -> Dict[str, str]:
+        """Значения всех найденных полей телеграммы"""
+        values = {}
+
+        for key, search in self.fields:
+            match = search(text)
+            if match:
+                values[key] = match.group(1)
+
+        return values
+
+
+COORDINATES = r'\d{4}[NS]\d{5}[EW]'
+FREE_TEXT = r'[^/\s]+(?:\s+[^/\s]+)*'
+
+# Высоты M0000/M0000 не являются полем KEY/value и ищутся отдельным шаблоном
+ALTITUDE_RE = re.compile(r'M(\d{4})/M(\d{4})')
+
+# Зона полета ZONA: круг R<радиус, км> <центр> или полигон из трех и более точек
+ZONE_RE = re.compile(
+    rf'/ZONA\s+(?:R(\d+(?:[.,]\d+)?)\s+({COORDINATES})|((?:{COORDINATES}\s*){{3,}}))'
+)
+ZONE_POINT_RE = re.compile(COORDINATES)
+
+# Поля SHR телеграммы в формате KEY/value
+SHR_FIELDS = FieldPatterns(
+    {
+        'SID': r'\d+',
+        'DEP': COORDINATES,
+        'DEST': COORDINATES,
+        'DOF': r'\d{6}',
+        'OPR': FREE_TEXT,
+        'TYP': r'\w+',
+        'REG': FREE_TEXT,
+    },
+    separator='/'
+)
+
+# Поля DEP телеграммы в формате KEY value
+DEP_FIELDS = FieldPatterns(
+    {
+        'SID': r'\d+',
+        'ADD': r'\d{6}',
+        'ATD': r'\d{4}',
+        'ADEPZ': COORDINATES,
+        'REG': r'[^\s]+',
+    },
+    separator=r'\s+'
+)
+
+# Поля ARR телеграммы в формате KEY value
+ARR_FIELDS = FieldPatterns(
+    {
+        'SID': r'\d+',
+        'ADA': r'\d{6}',
+        'ATA': r'\d{4}',
+        'ADARRZ': COORDINATES,
+        'REG': r'[^\s]+',
+    },
+    separator=r'\s+'
+)
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from celery import Celery
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+from app.services.geo_service import GeoService
+from app.services.ingest_jobs import RedisJobStore, execute_job
+
+# Запуск: celery -A app.worker worker --loglevel=info
+celery_app = Celery("bas", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
+
+# Сервис геопривязки создается один раз на процесс воркера и переиспользуется задачами
+_geo_service: Optional[GeoService] = None
+
+
+def _get_geo_service() -> GeoService:
+    global _geo_service
+    if _geo_service is None:
+        _geo_service = GeoService()
+    return _geo_service
+
+
+async def _run(job_id: str, kind: str, file_path: str, options: Dict[str, Any]):
+    # Каждая задача выполняется в своем event loop, поэтому пул соединений не переиспользуется
+    engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    store = RedisJobStore()
+
+    try:
+        await execute_job(store, session_factory, _get_geo_service(), job_id, kind, file_path, options)
+    finally:
+        await store.close()
+        await engine.dispose()
+
+
+@celery_app.task(name="ingest.run_job")
+def run_ingest_job(job_id: str, kind: str, file_path: str, options: Dict[str, Any]):
+    """Фоновая загрузка файла в Celery воркере"""
+    asyncio.run(_run(job_id, kind, file_path, options))
@@ -0,0 +1,202 @@
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.services.shr_parser import SHRDataParser
+
+# Колонки Excel файла, которые читает ExcelParser
+EXCEL_COLUMNS = ['Дата', 'Рейс', 'Борт', 'Тип ВС', 'Т выл.факт', 'Т пос.факт',
+                 'А/В', 'АРВ', 'А/П', 'АРП', 'Маршрут', 'Поле 18']
+
+UAV_TYPES = ['BLA', 'AER', 'SHAR', 'GEO', 'MAVIC', 'ORLAN']
+OPERATORS = ['ООО АЭРОСЪЕМКА', 'АО ГЕОСКАН', 'ИП ИВАНОВ И.И.', 'ФГБУ АВИАЛЕСООХРАНА',
+             'ООО ДРОН СЕРВИС', 'МЧС РОССИИ', 'ГУ МВД', 'ПАО РОССЕТИ']
+
+# Строк документа между заголовками центров ЕС ОрВД
+ROWS_PER_CENTER = 1000
+
+
+class CorpusGenerator:
+    """
+    Генератор синтетических данных для бенчмарков парсеров.
+    При одинаковом seed генерирует одинаковый корпус.
+    Большая часть полетов выполняется с ограниченного набора площадок,
+    как в реальных данных, остальные - из случайных точек.
+    """
+
+    def __init__(self, seed: int = 42, sites: int = 200, site_share: float = 0.8):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.site_share = site_share
+        self.sites = [self.random_point() for _ in range(sites)]
+        self.start_date = datetime(2024, 1, 1)
+
+    def random_point(self) -> Tuple[float, float]:
+        """Случайная точка на территории РФ с точностью до минуты"""
+        lat = self.random.randint(43 * 60, 70 * 60) / 60.0
+        lon = self.random.randint(28 * 60, 135 * 60) / 60.0
+        return lat, lon
+
+    def point(self) -> Tuple[float, float]:
+        """Точка вылета или посадки"""
+        if self.random.random() < self.site_share:
+            return self.random.choice(self.sites)
+        return self.random_point()
+
+    def points(self, n: int) -> Iterator[Tuple[float, float]]:
+        """Поток координат для геопривязки"""
+        for _ in range(n):
+            yield self.point()
+
+    @staticmethod
+    def format_coordinates(lat: float, lon: float) -> str:
+        """Координаты в формате телеграмм: 5957N02905E"""
+        lat_minutes = round(abs(lat) * 60)
+        lon_minutes = round(abs(lon) * 60)
+        return (f"{lat_minutes // 60:02d}{lat_minutes % 60:02d}{'N' if lat >= 0 else 'S'}"
+                f"{lon_minutes // 60:03d}{lon_minutes % 60:02d}{'E' if lon >= 0 else 'W'}")
+
+    def flight(self, i: int) -> Dict[str, Any]:
+        """Параметры одного полета, общие для всех форматов"""
+        rnd = self.random
+        dep_time = self.start_date + timedelta(days=rnd.randint(0, 364), minutes=rnd.randint(0, 24 * 60 - 1))
+        dep = self.point()
+
+        return {
+            'sid': str(7770000000 + i),
+            'dep_time': dep_time,
+            'arr_time': dep_time + timedelta(minutes=rnd.randint(5, 240)),
+            'dep': dep,
+            # Большинство полетов возвращается в точку вылета
+            'arr': dep if rnd.random() < 0.7 else self.point(),
+            'operator': rnd.choice(OPERATORS),
+            'phone': f"+7{rnd.randint(9000000000, 9999999999)}",
+            'uav_type': rnd.choice(UAV_TYPES),
+            'registration': f"{rnd.randint(0, 9999):04d}{rnd.choice('ABCDEFGHJK')}",
+            'altitude': (0, rnd.choice([50, 150, 300, 500, 1000]))
+        }
+
+    def shr_telegram(self, flight: Dict[str, Any], separator: str = '\n') -> str:
+        """SHR телеграмма"""
+        dep = self.format_coordinates(*flight['dep'])
+        dest = self.format_coordinates(*flight['arr'])
+        dep_time = flight['dep_time']
+        arr_time = flight['arr_time']
+
+        return separator.join([
+            "(SHR-ZZZZZ",
+            f"-ZZZZ{dep_time:%H%M}",
+            f"-M{flight['altitude'][0]:04d}/M{flight['altitude'][1]:04d} /ZONA R0,5 {dep}/",
+            f"-ZZZZ{arr_time:%H%M}",
+            f"-DEP/{dep} DEST/{dest} DOF/{dep_time:%y%m%d} OPR/{flight['operator']} "
+            f"REG/{flight['registration']} TYP/{flight['uav_type']} "
+            f"RMK/ТЕЛ {flight['phone']} SID/{flight['sid']})"
+        ])
+
+    def dep_telegram(self, flight: Dict[str, Any], separator: str = '\n') -> str:
+        """DEP телеграмма"""
+        return separator.join([
+            "-TITLE IDEP",
+            f"-SID {flight['sid']}",
+            f"-ADD {flight['dep_time']:%y%m%d}",
+            f"-ATD {flight['dep_time']:%H%M}",
+            "-ADEP ZZZZ",
+            f"-ADEPZ {self.format_coordinates(*flight['dep'])}",
+            "-PAP 0",
+            f"-REG {flight['registration']}"
+        ])
+
+    def arr_telegram(self, flight: Dict[str, Any], separator: str = '\n') -> str:
+        """ARR телеграмма"""
+        return separator.join([
+            "-TITLE IARR",
+            f"-SID {flight['sid']}",
+            f"-ADA {flight['arr_time']:%y%m%d}",
+            f"-ATA {flight['arr_time']:%H%M}",
+            "-ADARR ZZZZ",
+            f"-ADARRZ {self.format_coordinates(*flight['arr'])}",
+            "-PAP 0",
+            f"-REG {flight['registration']}"
+        ])
+
+    def shr_telegrams(self, n: int, start: int = 0) -> Iterator[str]:
+        """Поток SHR телеграмм"""
+        for i in range(start, start + n):
+            yield self.shr_telegram(self.flight(i))
+
+    def shr_document_lines(self, n: int) -> Iterator[str]:
+        """
+        Строки документа центров ЕС ОрВД в формате SHRDataParser:
+        заголовок центра и строки "номер<TAB>SHR<TAB>DEP<TAB>ARR"
+        """
+        centers = SHRDataParser.CENTER_NAMES
+
+        for i in range(n):
+            if i % ROWS_PER_CENTER == 0:
+                yield f"{centers[(i // ROWS_PER_CENTER) % len(centers)]}\t\t\t"
+
+            flight = self.flight(i)
+            dep = self.dep_telegram(flight, ' ')
+            # Часть полетов еще не завершена и не имеет ARR
+            arr = self.arr_telegram(flight, ' ') if self.random.random() < 0.9 else ''
+
+            yield f"{i + 1}\t{self.shr_telegram(flight, ' ')}\t{dep}\t{arr}"
+
+    def excel_rows(self, n: int) -> Iterator[List[Optional[str]]]:
+        """Строки Excel файла в порядке EXCEL_COLUMNS"""
+        for i in range(n):
+            flight = self.flight(i)
+            dep = self.format_coordinates(*flight['dep'])
+            arr = self.format_coordinates(*flight['arr'])
+            has_arrival = self.random.random() < 0.9
+
+            yield [
+                f"{flight['dep_time']:%d.%m.%Y}",
+                f"{flight['sid']}",
+                flight['registration'],
+                flight['uav_type'],
+                f"{flight['dep_time']:%H:%M}",
+                f"{flight['arr_time']:%H:%M}" if has_arrival else None,
+                'ZZZZ',
+                dep,
+                'ZZZZ',
+                arr,
+                f"/ZONA R0,5 {dep}/",
+                f"OPR/{flight['operator']} /REG/{flight['registration']} /RMK/ТЕЛ {flight['phone']}"
+            ]
+
+    def write_shr_document(self, path: str, n: int):
+        """Запись документа с n полетами"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.shr_document_lines(n):
+                f.write(line)
+                f.write('\n')
+
+    def write_excel(self, path: str, n: int):
+        """Запись Excel файла с n полетами"""
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(EXCEL_COLUMNS)
+        for row in self.excel_rows(n):
+            sheet.append(row)
+        workbook.save(path)
+
+
+def cached_file(directory: str, name: str, seed: int, n: int, write) -> str:
+    """
+    Путь к файлу корпуса, сгенерированному один раз для (seed, n).
+    write(path, n) вызывается только при отсутствии файла.
+    """
+    os.makedirs(directory, exist_ok=True)
+    base, ext = os.path.splitext(name)
+    path = os.path.join(directory, f"{base}_{seed}_{n}{ext}")
+
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp{ext}"
+        write(tmp_path, n)
+        os.replace(tmp_path, path)
+
+    return path
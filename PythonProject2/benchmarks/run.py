@@ -0,0 +1,260 @@
+"""
+Микробенчмарки парсеров и геопривязки.
+
+Запуск из каталога PythonProject2:
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1000 100000 --only parse_shr_message
+    python -m benchmarks.run --compare benchmarks/results/<commit>.json
+
+Результаты пишутся в JSON (по умолчанию benchmarks/results/<commit>.json),
+чтобы сравнивать производительность между коммитами.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from app.services.excel_parser import ExcelParser
+from app.services.flight_paths import route_lengths_km
+from app.services.geo_service import GeoService
+from app.services.parser import TelegramParser
+from app.services.shr_parser import SHRDataParser
+from benchmarks.corpus import CorpusGenerator, cached_file
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, '.corpus')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+
+# Размер пачки входных данных, генерируемой вне замера времени
+BATCH_SIZE = 10000
+
+
+class Case:
+    """
+    Бенчмарк: batches(size) готовит входные данные пачками (вне замера),
+    run(batch) обрабатывает пачку и возвращает количество записей
+    """
+
+    def __init__(self, batches: Callable[[CorpusGenerator, int], Iterable[Any]],
+                 run: Callable[[Any], int]):
+        self.batches = batches
+        self.run = run
+
+
+def _in_batches(items: Iterator[Any]) -> Iterator[List[Any]]:
+    while True:
+        batch = list(islice(items, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def _parse_shr_messages(batch: List[str]) -> int:
+    for message in batch:
+        TelegramParser.parse_shr_message(message)
+    return len(batch)
+
+
+def _parse_shr_document(path: str) -> int:
+    with open(path, encoding='utf-8') as f:
+        return sum(1 for _ in SHRDataParser.parse_shr_document(f))
+
+
+def _parse_flight_data(path: str) -> int:
+    return len(ExcelParser.parse_flight_data(path))
+
+
+_geo_service: Optional[GeoService] = None
+
+
+def _resolve_regions(batch: List[tuple]) -> int:
+    for lat, lon in batch:
+        _geo_service.get_region_by_coordinates(lat, lon)
+    return len(batch)
+
+
+def _resolve_many(batch: List[tuple]) -> int:
+    lats, lons = zip(*batch)
+    _geo_service.resolve_many(lats, lons)
+    return len(batch)
+
+
+def _route_lengths(batch: List[tuple]) -> int:
+    lats, lons = zip(*batch)
+    # Пары точек корпуса: вылет - i-я точка, посадка - точка с конца пачки
+    route_lengths_km(lats, lons, lats[::-1], lons[::-1])
+    return len(batch)
+
+
+def _geo_batches(corpus: CorpusGenerator, size: int) -> Iterator[List[tuple]]:
+    global _geo_service
+    # Каждый замер начинается с холодного кэша геопривязки
+    _geo_service = GeoService()
+    return _in_batches(corpus.points(size))
+
+
+BENCHMARKS: Dict[str, Case] = {
+    'parse_shr_message': Case(
+        lambda corpus, size: _in_batches(corpus.shr_telegrams(size)),
+        _parse_shr_messages
+    ),
+    'parse_shr_document': Case(
+        lambda corpus, size: [cached_file(CORPUS_DIR, 'shr_document.txt', corpus.seed, size,
+                                          corpus.write_shr_document)],
+        _parse_shr_document
+    ),
+    'parse_flight_data': Case(
+        lambda corpus, size: [cached_file(CORPUS_DIR, 'flights.xlsx', corpus.seed, size,
+                                          corpus.write_excel)],
+        _parse_flight_data
+    ),
+    'get_region_by_coordinates': Case(_geo_batches, _resolve_regions),
+    'resolve_many': Case(_geo_batches, _resolve_many),
+    'route_lengths': Case(lambda corpus, size: _in_batches(corpus.points(size)), _route_lengths),
+}
+
+
+def measure(case: Case, size: int, seed: int, trace: bool) -> Dict[str, Any]:
+    """
+    Замер одного бенчмарка.
+    При trace=True считается пик памяти, выделенной во время обработки пачек,
+    и память, оставшаяся занятой после нее (tracemalloc замедляет выполнение,
+    поэтому время в этом режиме не используется).
+    """
+    records = 0
+    elapsed = 0.0
+    peak = 0
+    retained = 0
+
+    for batch in case.batches(CorpusGenerator(seed), size):
+        gc.collect()
+        if trace:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        started = time.perf_counter()
+        records += case.run(batch)
+        elapsed += time.perf_counter() - started
+
+        if trace:
+            current, batch_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, batch_peak - baseline)
+            retained = max(retained, current - baseline)
+
+    return {
+        'records': records,
+        'seconds': round(elapsed, 4),
+        'records_per_sec': round(records / elapsed, 1) if elapsed else None,
+        'us_per_record': round(elapsed / records * 1e6, 3) if records else None,
+        'peak_bytes': peak,
+        'retained_bytes': retained
+    }
+
+
+def run_benchmark(name: str, size: int, seed: int, alloc_limit: int) -> Dict[str, Any]:
+    """Замер скорости на size записях и памяти на не более чем alloc_limit записях"""
+    case = BENCHMARKS[name]
+    timing = measure(case, size, seed, trace=False)
+
+    alloc_size = min(size, alloc_limit)
+    tracemalloc.start()
+    try:
+        memory = measure(case, alloc_size, seed, trace=True)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'benchmark': name,
+        'size': size,
+        'records': timing['records'],
+        'seconds': timing['seconds'],
+        'records_per_sec': timing['records_per_sec'],
+        'us_per_record': timing['us_per_record'],
+        'alloc_size': alloc_size,
+        'peak_bytes': memory['peak_bytes'],
+        'retained_bytes': memory['retained_bytes']
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Текущий коммит, если запуск идет из git репозитория"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str):
+    """Вывод изменения скорости относительно ранее сохраненных результатов"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {
+            (item['benchmark'], item['size']): item
+            for item in json.load(f)['results']
+        }
+
+    for item in results:
+        previous = baseline.get((item['benchmark'], item['size']))
+        if not previous or not previous['records_per_sec'] or not item['records_per_sec']:
+            continue
+        ratio = item['records_per_sec'] / previous['records_per_sec']
+        print(f"{item['benchmark']:<28}{item['size']:>10}  {ratio:6.2f}x "
+              f"({previous['records_per_sec']:.0f} -> {item['records_per_sec']:.0f} rec/s)")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Бенчмарки парсеров БАС")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="количество записей")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS),
+                        help="запускаемые бенчмарки (по умолчанию все)")
+    parser.add_argument('--seed', type=int, default=42, help="seed генератора корпуса")
+    parser.add_argument('--alloc-limit', type=int, default=100000,
+                        help="максимум записей для замера памяти")
+    parser.add_argument('--output', help="файл результатов (JSON)")
+    parser.add_argument('--compare', help="файл результатов для сравнения")
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    results = []
+
+    for name in args.only or list(BENCHMARKS):
+        for size in args.sizes:
+            result = run_benchmark(name, size, args.seed, args.alloc_limit)
+            results.append(result)
+            print(f"{name:<28}{size:>10}  {result['records_per_sec'] or 0:>12.0f} rec/s  "
+                  f"{result['us_per_record'] or 0:>9.2f} us/rec  "
+                  f"peak {result['peak_bytes'] / 1024:>10.0f} KiB", flush=True)
+
+    report = {
+        'commit': commit,
+        'created_at': datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{(commit or 'local')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
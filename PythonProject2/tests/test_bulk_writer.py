@@ -0,0 +1,146 @@
+"""
+Пакетная запись полетов: политика MERGE, учет повторов SID внутри пачки
+и дней, агрегаты которых меняет загрузка.
+Запросы к БД подменяются: проверяется SQL upsert, счетчики записи и дни
+"""
+import asyncio
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql.elements import TextClause
+
+from app.models.flight import Flight
+from app.services.bulk_writer import ConflictPolicy, FlightBulkWriter
+
+
+class FakeResult:
+    def __init__(self, flags):
+        self.flags = flags
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.flags
+
+
+class FakeSession:
+    """
+    Сессия, которая запоминает upsert и возвращает флаги xmax = 0 (True - вставка),
+    а на запрос дней существующих полетов - existing_days
+    """
+
+    def __init__(self, flags, existing_days=()):
+        self.flags = flags
+        self.existing_days = list(existing_days)
+        self.upserts = []
+        self.day_queries = []
+
+    async def execute(self, statement, params=None):
+        if isinstance(statement, TextClause):
+            self.day_queries.append(params["sids"])
+            return FakeResult(self.existing_days)
+        self.upserts.append(statement)
+        return FakeResult(self.flags)
+
+
+def _row(sid, **values):
+    return {'sid': sid, 'flight_date': datetime(2024, 1, 15, 10), **values}
+
+
+def _compile(writer: FlightBulkWriter) -> str:
+    stmt = writer._upsert(pg_insert(Flight.__table__).values([_row('1')]))
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_merge_fills_only_empty_columns():
+    sql = _compile(FlightBulkWriter(None, method='insert', on_conflict=ConflictPolicy.MERGE))
+
+    assert 'dep_time = coalesce(flights.dep_time, excluded.dep_time)' in sql
+    assert 'flights.dep_time IS NULL AND excluded.dep_time IS NOT NULL' in sql
+    assert 'coalesce(excluded.dep_time' not in sql
+
+
+def test_merge_deduplicate_keeps_first_values():
+    writer = FlightBulkWriter(None, on_conflict=ConflictPolicy.MERGE)
+    first = writer._normalize(_row('1', dep_time='1000', raw_dep=None))
+    second = writer._normalize(_row('1', dep_time='1100', raw_dep='(DEP)'))
+
+    rows, duplicates = writer._deduplicate([first, second])
+
+    assert duplicates == 1
+    assert rows[0]['dep_time'] == '1000'
+    assert rows[0]['raw_dep'] == '(DEP)'
+
+
+def test_merge_duplicates_in_batch_are_not_updates():
+    db = FakeSession(flags=[True])
+    writer = FlightBulkWriter(db, method='insert', on_conflict=ConflictPolicy.MERGE)
+
+    async def run():
+        await writer.add_many([_row('1'), _row('1', dep_time='1000'), _row('1', raw_arr='(ARR)')])
+        await writer.flush()
+
+    asyncio.run(run())
+
+    assert (writer.inserted, writer.updated, writer.skipped, writer.merged_in_batch) == (1, 0, 0, 2)
+    assert writer.rows_written == 1
+
+
+def test_skip_duplicates_in_batch_are_skipped():
+    db = FakeSession(flags=[True])
+    writer = FlightBulkWriter(db, method='insert', on_conflict=ConflictPolicy.SKIP)
+
+    async def run():
+        await writer.add_many([_row('1'), _row('1')])
+        await writer.flush()
+
+    asyncio.run(run())
+
+    assert (writer.inserted, writer.updated, writer.skipped, writer.merged_in_batch) == (1, 0, 1, 0)
+
+
+def test_overwrite_tracks_previous_day():
+    # Полет с SID 1 был записан 10.01, перезапись переносит его на 15.01:
+    # агрегаты пересчитываются за оба дня
+    db = FakeSession(flags=[False], existing_days=[date(2024, 1, 10)])
+    writer = FlightBulkWriter(db, method='insert', on_conflict=ConflictPolicy.OVERWRITE)
+
+    async def run():
+        await writer.add(_row('1'))
+        await writer.flush()
+
+    asyncio.run(run())
+
+    assert db.day_queries == [['1']]
+    assert writer.flight_days == {date(2024, 1, 10), date(2024, 1, 15)}
+    assert writer.updated == 1
+
+
+def test_merge_tracks_existing_day():
+    # Дополнение меняет запись на ее прежний день, даже если у DEP/ARR нет даты
+    db = FakeSession(flags=[False], existing_days=[date(2024, 1, 10)])
+    writer = FlightBulkWriter(db, method='insert', on_conflict=ConflictPolicy.MERGE)
+
+    async def run():
+        await writer.add(_row('1', flight_date=None, dep_time='1000'))
+        await writer.flush()
+
+    asyncio.run(run())
+
+    assert writer.flight_days == {date(2024, 1, 10)}
+
+
+def test_skip_does_not_query_existing_days():
+    db = FakeSession(flags=[], existing_days=[date(2024, 1, 10)])
+    writer = FlightBulkWriter(db, method='insert', on_conflict=ConflictPolicy.SKIP)
+
+    async def run():
+        await writer.add(_row('1'))
+        await writer.flush()
+
+    asyncio.run(run())
+
+    assert db.day_queries == []
+    assert writer.flight_days == {date(2024, 1, 15)}
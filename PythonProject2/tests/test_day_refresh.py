@@ -0,0 +1,101 @@
+"""
+Пересчет производных данных при загрузке: пересчет идет в транзакции загрузки,
+а ошибка удаления из кэша после фиксации не отменяет загрузку -
+дни попадают в stale_days и пересчитываются позже
+"""
+import asyncio
+from datetime import date
+
+from app.services import day_refresh
+from app.services.ingest import IngestProgress
+
+
+class FakeSession:
+    def __init__(self):
+        self.rollbacks = 0
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+def _patch(monkeypatch, stale, fail=None):
+    """Подмена операций с БД и кэшем: stale - дни в stale_days, fail - ошибка удаления из кэша"""
+    calls = {"refreshed": [], "invalidated": [], "marked": []}
+
+    async def stale_days(db):
+        return list(stale)
+
+    async def refresh_days(db, geo_service, days, after_id=None):
+        calls["refreshed"].append(sorted(set(days)))
+        stale.difference_update(days)
+        return {"X"}
+
+    async def invalidate(days, regions):
+        calls["invalidated"].append((sorted(days), set(regions)))
+        if fail:
+            raise fail
+
+    async def mark_stale_days(db, days, error):
+        calls["marked"].append((sorted(set(days)), error))
+        stale.update(days)
+
+    monkeypatch.setattr(day_refresh, "stale_days", stale_days)
+    monkeypatch.setattr(day_refresh, "refresh_days", refresh_days)
+    monkeypatch.setattr(day_refresh.response_cache, "invalidate", invalidate)
+    monkeypatch.setattr(day_refresh, "mark_stale_days", mark_stale_days)
+    return calls
+
+
+def test_ingested_days_include_stale_days(monkeypatch):
+    stale = {date(2024, 1, 1)}
+    calls = _patch(monkeypatch, stale)
+
+    days, regions = asyncio.run(day_refresh.refresh_ingested_days(FakeSession(), None, [date(2024, 2, 1)]))
+
+    assert days == {date(2024, 1, 1), date(2024, 2, 1)}
+    assert regions == {"X"}
+    assert calls["refreshed"] == [[date(2024, 1, 1), date(2024, 2, 1)]]
+    assert stale == set()
+
+
+def test_invalidate_failure_marks_days_and_returns_warning(monkeypatch):
+    stale = set()
+    calls = _patch(monkeypatch, stale, fail=RuntimeError("redis"))
+    days = {date(2024, 1, 1), date(2024, 1, 2)}
+
+    warning = asyncio.run(day_refresh.invalidate_days(FakeSession(), days, {"X"}))
+
+    assert warning is not None and "redis" in warning
+    assert calls["invalidated"] == [([date(2024, 1, 1), date(2024, 1, 2)], {"X"})]
+    assert calls["marked"] == [([date(2024, 1, 1), date(2024, 1, 2)], "redis")]
+    assert stale == days
+
+
+def test_invalidate_success(monkeypatch):
+    calls = _patch(monkeypatch, set())
+
+    assert asyncio.run(day_refresh.invalidate_days(FakeSession(), {date(2024, 1, 1)}, {"X"})) is None
+    assert calls["marked"] == []
+
+
+def test_mark_failure_still_returns_warning(monkeypatch):
+    _patch(monkeypatch, set(), fail=RuntimeError("redis"))
+
+    async def mark_stale_days(db, days, error):
+        raise ConnectionError("db")
+
+    monkeypatch.setattr(day_refresh, "mark_stale_days", mark_stale_days)
+    db = FakeSession()
+
+    warning = asyncio.run(day_refresh.invalidate_days(db, {date(2024, 1, 1)}, {"X"}))
+
+    assert "redis" in warning
+    assert db.rollbacks == 1
+
+
+def test_progress_reports_warning():
+    progress = IngestProgress()
+    assert progress.as_dict()["warning"] is None
+
+    progress.warning = "Полеты сохранены"
+    assert progress.as_dict()["warning"] == "Полеты сохранены"
@@ -0,0 +1,105 @@
+"""Оценка HyperLogLog, сериализация и объединение скетчей"""
+import random
+
+import numpy as np
+import pytest
+
+from app.core.hll import HyperLogLog
+
+SEED = 12345
+
+
+def _values(n: int, seed: int = SEED, prefix: str = 'v'):
+    rng = random.Random(seed)
+    return [f"{prefix}{rng.getrandbits(64):x}" for _ in range(n)]
+
+
+@pytest.mark.parametrize('precision', [10, 12, 14])
+@pytest.mark.parametrize('n', [100, 5000, 200000])
+def test_estimate_within_error(precision, n):
+    values = _values(n)
+    sketch = HyperLogLog(precision).update(values)
+
+    # Три стандартные ошибки: при фиксированном seed проверка детерминирована
+    assert abs(sketch.count() - len(set(values))) <= 3 * sketch.error * n
+
+
+def test_repeated_values_do_not_change_estimate():
+    values = _values(3000)
+    once = HyperLogLog().update(values)
+    twice = HyperLogLog().update(values + values[::-1])
+
+    assert np.array_equal(once.registers, twice.registers)
+
+
+def test_sparse_dense_round_trip():
+    sketch = HyperLogLog().update(_values(500))
+
+    sparse = sketch.to_bytes()
+    dense = bytes((0, sketch.precision)) + sketch.registers.tobytes()
+    assert sparse[0] == 1 and len(sparse) < len(dense)
+
+    for data in (sparse, dense):
+        restored = HyperLogLog.from_bytes(data)
+        assert np.array_equal(restored.registers, sketch.registers)
+        assert restored.count() == sketch.count()
+
+
+def test_dense_round_trip():
+    sketch = HyperLogLog().update(_values(50000))
+
+    data = sketch.to_bytes()
+    assert data[0] == 0
+
+    restored = HyperLogLog.from_bytes(data)
+    assert np.array_equal(restored.registers, sketch.registers)
+    assert restored.count() == sketch.count()
+
+
+def test_empty_round_trip():
+    sketch = HyperLogLog()
+    assert sketch.count() == 0
+
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.precision == sketch.precision
+    assert restored.count() == 0
+
+
+def test_union_matches_set_union():
+    # Пересекающиеся множества: скетч объединения совпадает с объединением скетчей
+    parts = [_values(4000, seed) + _values(1000, SEED, 'shared') for seed in range(5)]
+    sketches = [HyperLogLog().update(part) for part in parts]
+
+    expected = HyperLogLog().update(set().union(*parts))
+    for union in (
+        HyperLogLog.union(sketches),
+        HyperLogLog.union(sketch.to_bytes() for sketch in sketches),
+        sketches[0] | sketches[1] | sketches[2] | sketches[3] | sketches[4]
+    ):
+        assert np.array_equal(union.registers, expected.registers)
+        assert union.count() == expected.count()
+
+    # Исходные скетчи не меняются
+    assert np.array_equal(sketches[0].registers, HyperLogLog().update(parts[0]).registers)
+
+
+def test_union_of_nothing_is_empty():
+    assert HyperLogLog.union([], precision=10).count() == 0
+    assert HyperLogLog.union([], precision=10).precision == 10
+
+
+def test_merge_requires_same_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    bytes((0, 12)) + bytes(10),
+    bytes((1, 12, 0, 0)),
+    bytes((1, 4)) + np.array([(16, 1)], dtype=[('index', '<u2'), ('value', 'u1')]).tobytes(),
+    bytes((7, 12)),
+])
+def test_corrupted_bytes(data):
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(data)
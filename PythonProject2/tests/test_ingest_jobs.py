@@ -0,0 +1,34 @@
+"""Хранилище состояния задач загрузки в памяти процесса"""
+import asyncio
+
+from app.services.ingest_jobs import JobStatus, MemoryJobStore
+
+
+def _job(job_id: str, status: str = JobStatus.QUEUED):
+    return {"job_id": job_id, "status": status}
+
+
+def test_unfinished_jobs_are_not_evicted():
+    async def run():
+        store = MemoryJobStore(max_jobs=2)
+        await store.save(_job("running"))
+        await store.update("running", status=JobStatus.RUNNING)
+        await store.save(_job("queued"))
+        await store.save(_job("new"))
+        return [await store.get(job_id) for job_id in ("running", "queued", "new")]
+
+    assert all(job is not None for job in asyncio.run(run()))
+
+
+def test_oldest_finished_jobs_are_evicted():
+    async def run():
+        store = MemoryJobStore(max_jobs=3)
+        await store.save(_job("queued"))
+        for job_id in ("done1", "done2", "failed"):
+            await store.save(_job(job_id))
+            await store.update(job_id, status=JobStatus.FAILED if job_id == "failed" else JobStatus.COMPLETED)
+        await store.save(_job("new"))
+        return {job_id: await store.get(job_id) is not None
+                for job_id in ("queued", "done1", "done2", "failed", "new")}
+
+    assert asyncio.run(run()) == {"queued": True, "done1": False, "done2": False, "failed": True, "new": True}
@@ -0,0 +1,52 @@
+"""
+Привязка к регионам в БД полетов загрузки: запросы ограничены днями загрузки
+и новыми полетами без даты, без обхода всей таблицы
+"""
+import asyncio
+from datetime import date, timedelta
+
+from app.services import region_assignment
+from app.services.region_assignment import assign_ingested_regions
+
+
+class FakeResult:
+    rowcount = 1
+
+
+class FakeSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return FakeResult()
+
+    async def commit(self):
+        raise AssertionError("привязка полетов загрузки не фиксирует транзакцию")
+
+
+def test_assign_ingested_regions_filters_by_days_and_new_ids():
+    db = FakeSession()
+    days = [date(2024, 1, 1) + timedelta(days=offset) for offset in range(40)]
+
+    updated = asyncio.run(assign_ingested_regions(db, reversed(days), after_id=500))
+
+    assert updated == 3
+    (first, first_params), (second, second_params), (undated, undated_params) = db.statements
+
+    assert "f.flight_date::date = ANY(:days)" in first
+    assert first_params["days"] == days[:region_assignment._BATCH_DAYS]
+    assert first_params["day_to"] == days[region_assignment._BATCH_DAYS - 1] + timedelta(days=1)
+    assert second_params["days"] == days[region_assignment._BATCH_DAYS:]
+
+    assert "f.id > :after_id AND f.flight_date IS NULL" in undated
+    assert undated_params["after_id"] == 500
+    assert all("f.dep_region IS NULL" in statement for statement, _ in db.statements)
+    assert not any(":start" in statement for statement, _ in db.statements)
+
+
+def test_assign_ingested_regions_without_days():
+    db = FakeSession()
+
+    assert asyncio.run(assign_ingested_regions(db, [])) == 0
+    assert db.statements == []
@@ -0,0 +1,63 @@
+"""
+Границы периода статистики регионов: последний день периода входит целиком
+и при чтении flights, и при чтении агрегатов flight_rollup
+"""
+import asyncio
+import types
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import settings
+from app.services.region_statistics import region_rating, region_statistics
+
+ROW = types.SimpleNamespace(
+    total_flights=0, total_duration=0, unique_operators=0, unique_uav_types=0,
+    peak_hour=None, peak_hour_flights=0, zero_flight_days=0, total_distance=0
+)
+
+
+class FakeResult(list):
+    def one(self):
+        return ROW
+
+
+class FakeSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        compiled = statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}) \
+            if params is None else statement
+        self.statements.append((str(compiled), params))
+        return FakeResult()
+
+
+@pytest.mark.parametrize('rollup_reads, until', [
+    (False, "f.flight_date < CAST(:end_date AS date) + interval '1 day'"),
+    (True, "day <= :end_date"),
+])
+def test_statistics_includes_last_day(monkeypatch, rollup_reads, until):
+    monkeypatch.setattr(settings, "ROLLUP_READS", rollup_reads)
+    db = FakeSession()
+
+    asyncio.run(region_statistics(db, "X", date(2024, 1, 1), date(2024, 1, 31)))
+
+    statement, params = db.statements[0]
+    assert until in statement
+    assert params["end_date"] == date(2024, 1, 31)
+
+
+@pytest.mark.parametrize('end_date, until', [
+    (date(2024, 1, 31), "flights.flight_date < '2024-02-01'"),
+    (datetime(2024, 1, 31), "flights.flight_date < '2024-02-01'"),
+    (datetime(2024, 1, 31, 12), "flights.flight_date <= '2024-01-31 12:00:00'"),
+])
+def test_rating_from_flights_includes_last_day(monkeypatch, end_date, until):
+    monkeypatch.setattr(settings, "ROLLUP_READS", False)
+    db = FakeSession()
+
+    asyncio.run(region_rating(db, date(2024, 1, 1), end_date))
+
+    assert until in db.statements[0][0]
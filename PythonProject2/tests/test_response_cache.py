@@ -0,0 +1,254 @@
+"""
+Кэш ответов аналитики: удаление записей по тегам периода и регионов,
+кэш процесса при недоступности Redis и single-flight одинаковых запросов
+"""
+import asyncio
+import types
+from datetime import date
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.core import cache as cache_module
+from app.core.cache import ANY, CACHE_COALESCED, ResponseCache, period_tags
+
+
+class Computations:
+    """compute() для get_or_compute с подсчетом вызовов по ключу"""
+
+    def __init__(self):
+        self.calls = {}
+
+    def __call__(self, name: str, delay: float = 0):
+        async def compute():
+            self.calls[name] = self.calls.get(name, 0) + 1
+            await asyncio.sleep(delay)
+            return {"name": name, "version": self.calls[name]}
+        return compute
+
+
+class FlakyRedis:
+    """Клиент Redis, который бросает ConnectionError, пока fail = True"""
+
+    def __init__(self, client):
+        self.client = client
+        self.fail = True
+        self.attempts = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            self.attempts += 1
+            if self.fail:
+                raise ConnectionError("redis unavailable")
+            return method(*args, **kwargs)
+        return call
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+# Записи: период, регионы и должна ли запись пережить загрузку за 15.01.2024 в регионе X
+ENTRIES = {
+    "january_x": (date(2024, 1, 1), date(2024, 1, 31), ["X"], False),
+    "february_x": (date(2024, 2, 1), date(2024, 2, 29), ["X"], True),
+    "january_y": (date(2024, 1, 1), date(2024, 1, 31), ["Y"], True),
+    "year_xy": (date(2023, 6, 1), date(2024, 6, 1), ["X", "Y"], False),
+    "january_all_regions": (date(2024, 1, 1), date(2024, 1, 31), None, False),
+    "open_period_x": (None, None, ["X"], False),
+    "open_period_y": (None, None, ["Y"], True),
+    "open_period_all_regions": (None, None, None, False),
+}
+
+
+async def _fill(cache: ResponseCache, computations: Computations, route: str):
+    for name, (start, end, regions, _) in ENTRIES.items():
+        await cache.get_or_compute(route, {"name": name}, computations(name), start, end, regions)
+
+
+@pytest.mark.parametrize('backend', ['redis', 'local'])
+def test_invalidate_by_tag_intersection(backend):
+    route = f"test_invalidate_{backend}"
+
+    async def run():
+        client = FakeAsyncRedis() if backend == 'redis' else FlakyRedis(FakeAsyncRedis())
+        cache = ResponseCache(ttl=60, retry=3600, client=client)
+        computations = Computations()
+
+        await _fill(cache, computations, route)
+        removed = await cache.invalidate([date(2024, 1, 15)], {"X"})
+        await _fill(cache, computations, route)
+
+        return removed, computations.calls
+
+    removed, calls = asyncio.run(run())
+
+    assert removed == sum(not survives for *_, survives in ENTRIES.values())
+    for name, (*_, survives) in ENTRIES.items():
+        assert calls[name] == (1 if survives else 2), name
+
+
+def test_invalidate_removes_keys_from_tags():
+    async def run():
+        client = FakeAsyncRedis()
+        cache = ResponseCache(ttl=60, client=client)
+        computations = Computations()
+
+        await _fill(cache, computations, "test_tags")
+        await cache.invalidate([date(2024, 1, 15)], {"X"})
+        return await client.smembers(cache_module.TAG_PREFIX + "m:2024-01")
+
+    remaining = asyncio.run(run())
+    assert len(remaining) == 1  # january_y
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    (date(2024, 1, 15), date(2024, 3, 1), ["m:2024-01", "m:2024-02", "m:2024-03"]),
+    (date(2024, 3, 1), date(2024, 1, 15), [f"m:{ANY}"]),
+    (date(2024, 1, 20), date(2024, 1, 10), ["m:2024-01"]),
+    (None, date(2024, 1, 10), [f"m:{ANY}"]),
+])
+def test_period_tags(start, end, expected):
+    assert period_tags(start, end) == expected
+
+
+def test_local_fallback_and_retry(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+
+    async def run():
+        client = FlakyRedis(FakeAsyncRedis())
+        cache = ResponseCache(ttl=60, retry=30, client=client)
+        computations = Computations()
+        get = lambda: cache.get_or_compute("test_fallback", {}, computations("a"))
+
+        # Redis недоступен: ответ сохраняется в кэше процесса
+        assert (await get())["version"] == 1
+        assert client.attempts == 1
+        assert cache.local.get(cache.key("test_fallback", {})) is not cache_module.MISSING
+
+        # До истечения retry к Redis не обращаются
+        clock.now += 29
+        assert (await get())["version"] == 1
+        assert client.attempts == 1
+
+        # После retry Redis снова используется: запись вычисляется и сохраняется в нем
+        client.fail = False
+        clock.now += 2
+        assert (await get())["version"] == 2
+        assert await client.client.exists(cache_module.KEY_PREFIX + cache.key("test_fallback", {}))
+        assert (await get())["version"] == 2
+
+        return computations.calls["a"]
+
+    assert asyncio.run(run()) == 2
+
+
+@pytest.mark.parametrize('ttl', [60, 0])
+def test_concurrent_misses_compute_once(ttl):
+    route = f"test_single_flight_{ttl}"
+
+    async def run():
+        cache = ResponseCache(ttl=ttl, client=FakeAsyncRedis())
+        computations = Computations()
+
+        results = await asyncio.gather(*(
+            cache.get_or_compute(route, {"q": 1}, computations("a", delay=0.05)) for _ in range(20)
+        ))
+        return results, computations.calls, cache._pending
+
+    results, calls, pending = asyncio.run(run())
+
+    assert calls == {"a": 1}
+    assert all(result == {"name": "a", "version": 1} for result in results)
+    assert not pending
+
+
+def test_error_is_shared_with_waiters():
+    async def run():
+        cache = ResponseCache(ttl=60, client=FakeAsyncRedis())
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            raise RuntimeError("db")
+
+        results = await asyncio.gather(
+            *(cache.get_or_compute("test_error", {}, compute) for _ in range(5)),
+            return_exceptions=True
+        )
+        return results, calls
+
+    results, calls = asyncio.run(run())
+
+    assert calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_leader_makes_waiter_recompute():
+    route = "test_cancelled_leader"
+
+    async def run():
+        cache = ResponseCache(ttl=60, client=FakeAsyncRedis())
+        started = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                started.set()
+                await asyncio.Event().wait()
+            return {"version": calls}
+
+        leader = asyncio.create_task(cache.get_or_compute(route, {}, compute))
+        await started.wait()
+
+        coalesced = CACHE_COALESCED.labels(route)._value.get()
+        waiter = asyncio.create_task(cache.get_or_compute(route, {}, compute))
+        while CACHE_COALESCED.labels(route)._value.get() == coalesced:
+            await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+        return await waiter, calls, cache._pending
+
+    value, calls, pending = asyncio.run(run())
+
+    assert value == {"version": 2}
+    assert calls == 2
+    assert not pending
+
+
+def test_cancelled_waiter_keeps_leader():
+    route = "test_cancelled_waiter"
+
+    async def run():
+        cache = ResponseCache(ttl=60, client=FakeAsyncRedis())
+        computations = Computations()
+
+        leader = asyncio.create_task(cache.get_or_compute(route, {}, computations("a", delay=0.05)))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_compute(route, {}, computations("a")))
+        await asyncio.sleep(0.01)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        return await leader, computations.calls
+
+    value, calls = asyncio.run(run())
+
+    assert value == {"name": "a", "version": 1}
+    assert calls == {"a": 1}
@@ -0,0 +1,237 @@
+"""
+Дифференциальная проверка разбора телеграмм: TelegramParser на таблицах
+шаблонов полей (app.services.telegram_fields) должен давать тот же результат,
+что и прежняя реализация с re.search по каждому полю (скопирована ниже без изменений).
+Поле zone сравнивается отдельно: разбор ZONA добавлен позже.
+"""
+import random
+import re
+from datetime import datetime
+
+import pytest
+
+from app.services.parser import TelegramParser
+from benchmarks.corpus import CorpusGenerator
+
+FUZZ_SEED = 20240601
+FUZZ_SIZE = 20000
+CORPUS_SIZE = 3000
+
+
+def reference_parse_coordinates(coord_str):
+    pattern = r'(\d{2})(\d{2})([NS])(\d{3})(\d{2})([EW])'
+    match = re.match(pattern, coord_str.strip())
+
+    if not match:
+        return None
+
+    lat = int(match.group(1)) + int(match.group(2)) / 60.0
+    if match.group(3) == 'S':
+        lat = -lat
+
+    lon = int(match.group(4)) + int(match.group(5)) / 60.0
+    if match.group(6) == 'W':
+        lon = -lon
+
+    return (lat, lon)
+
+
+def reference_parse_shr_message(shr_text):
+    result = {
+        'type': 'SHR',
+        'sid': None,
+        'dep_coords': None,
+        'arr_coords': None,
+        'date': None,
+        'operator': None,
+        'uav_type': None,
+        'registration': None,
+        'altitude': None,
+        'zone': None
+    }
+
+    sid_match = re.search(r'SID/(\d+)', shr_text)
+    if sid_match:
+        result['sid'] = sid_match.group(1)
+
+    dep_match = re.search(r'DEP/(\d{4}[NS]\d{5}[EW])', shr_text)
+    if dep_match:
+        result['dep_coords'] = reference_parse_coordinates(dep_match.group(1))
+
+    dest_match = re.search(r'DEST/(\d{4}[NS]\d{5}[EW])', shr_text)
+    if dest_match:
+        result['arr_coords'] = reference_parse_coordinates(dest_match.group(1))
+
+    dof_match = re.search(r'DOF/(\d{6})', shr_text)
+    if dof_match:
+        date_str = dof_match.group(1)
+        result['date'] = datetime(2000 + int(date_str[0:2]), int(date_str[2:4]), int(date_str[4:6]))
+
+    opr_match = re.search(r'OPR/([^/\s]+(?:\s+[^/\s]+)*)', shr_text)
+    if opr_match:
+        result['operator'] = opr_match.group(1).strip()
+
+    typ_match = re.search(r'TYP/(\w+)', shr_text)
+    if typ_match:
+        result['uav_type'] = typ_match.group(1)
+
+    reg_match = re.search(r'REG/([^/\s]+(?:\s+[^/\s]+)*)', shr_text)
+    if reg_match:
+        result['registration'] = reg_match.group(1).strip()
+
+    alt_match = re.search(r'M(\d{4})/M(\d{4})', shr_text)
+    if alt_match:
+        result['altitude'] = {'min': int(alt_match.group(1)), 'max': int(alt_match.group(2))}
+
+    return result
+
+
+def reference_parse_dep_message(dep_text):
+    result = {
+        'type': 'DEP',
+        'sid': None,
+        'add': None,
+        'atd': None,
+        'adep': None,
+        'adepz': None,
+        'registration': None
+    }
+
+    sid_match = re.search(r'SID\s+(\d+)', dep_text)
+    if sid_match:
+        result['sid'] = sid_match.group(1)
+
+    add_match = re.search(r'ADD\s+(\d{6})', dep_text)
+    if add_match:
+        result['add'] = add_match.group(1)
+
+    atd_match = re.search(r'ATD\s+(\d{4})', dep_text)
+    if atd_match:
+        result['atd'] = atd_match.group(1)
+
+    adepz_match = re.search(r'ADEPZ\s+(\d{4}[NS]\d{5}[EW])', dep_text)
+    if adepz_match:
+        result['adepz'] = reference_parse_coordinates(adepz_match.group(1))
+
+    reg_match = re.search(r'REG\s+([^\s]+)', dep_text)
+    if reg_match:
+        result['registration'] = reg_match.group(1)
+
+    return result
+
+
+def reference_parse_arr_message(arr_text):
+    result = {
+        'type': 'ARR',
+        'sid': None,
+        'ada': None,
+        'ata': None,
+        'adarr': None,
+        'adarrz': None,
+        'registration': None
+    }
+
+    sid_match = re.search(r'SID\s+(\d+)', arr_text)
+    if sid_match:
+        result['sid'] = sid_match.group(1)
+
+    ada_match = re.search(r'ADA\s+(\d{6})', arr_text)
+    if ada_match:
+        result['ada'] = ada_match.group(1)
+
+    ata_match = re.search(r'ATA\s+(\d{4})', arr_text)
+    if ata_match:
+        result['ata'] = ata_match.group(1)
+
+    adarrz_match = re.search(r'ADARRZ\s+(\d{4}[NS]\d{5}[EW])', arr_text)
+    if adarrz_match:
+        result['adarrz'] = reference_parse_coordinates(adarrz_match.group(1))
+
+    reg_match = re.search(r'REG\s+([^\s]+)', arr_text)
+    if reg_match:
+        result['registration'] = reg_match.group(1)
+
+    return result
+
+
+# Фрагменты случайных телеграмм: маркеры полей, разделители, координаты,
+# необычные пробелы и цифры других алфавитов
+_FRAGMENTS = [
+    'SID', 'DEP', 'DEST', 'DOF', 'OPR', 'TYP', 'REG', 'ADD', 'ATD', 'ADEPZ', 'ADA', 'ATA', 'ADARRZ',
+    'SHR-', '-', '(', ')', '/', '//', ' ', '  ', '\t', '\n', ' ', ' ',
+    'M0000/M0150', 'M12/M3', '5957N02905E', '0000S00000W', '9999N99999E', '5957N0290E',
+    '240115', '991332', '1230', '0', '7', '42', '123456789', '٣٤', '１２',
+    'ООО', 'АЭРО', 'BLA', 'MAVIC', '_', 'RA-1234', 'RMK', 'ZZZ', 'N', 'S', 'E', 'W',
+]
+
+
+def _fuzz_strings(seed: int, n: int):
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield ''.join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(0, 24)))
+
+
+def _corpus_telegrams(n: int):
+    generator = CorpusGenerator(seed=7)
+    for i in range(n):
+        flight = generator.flight(i)
+        separator = '\n' if i % 2 else ' '
+        yield (
+            generator.shr_telegram(flight, separator),
+            generator.dep_telegram(flight, separator),
+            generator.arr_telegram(flight, separator)
+        )
+
+
+def _assert_shr_equal(text: str):
+    expected = reference_parse_shr_message(text)
+    actual = TelegramParser.parse_shr_message(text)
+
+    zone = actual.pop('zone')
+    expected.pop('zone')
+    assert actual == expected, text
+    if '/ZONA' not in text:
+        assert zone is None, text
+
+
+def _parse_or_error(parse, text: str):
+    """Результат разбора или тип исключения (ошибки тоже должны совпадать)"""
+    try:
+        return parse(text)
+    except Exception as e:
+        return type(e)
+
+
+def test_fuzz_matches_reference():
+    for text in _fuzz_strings(FUZZ_SEED, FUZZ_SIZE):
+        expected = _parse_or_error(reference_parse_shr_message, text)
+        if isinstance(expected, type):
+            assert _parse_or_error(TelegramParser.parse_shr_message, text) is expected, text
+        else:
+            _assert_shr_equal(text)
+
+        assert _parse_or_error(TelegramParser.parse_dep_message, text) == \
+            _parse_or_error(reference_parse_dep_message, text), text
+        assert _parse_or_error(TelegramParser.parse_arr_message, text) == \
+            _parse_or_error(reference_parse_arr_message, text), text
+
+
+def test_corpus_matches_reference():
+    for shr, dep, arr in _corpus_telegrams(CORPUS_SIZE):
+        _assert_shr_equal(shr)
+        assert TelegramParser.parse_dep_message(dep) == reference_parse_dep_message(dep)
+        assert TelegramParser.parse_arr_message(arr) == reference_parse_arr_message(arr)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('/ZONA R0,5 5957N02905E/', {'radius_km': 0.5, 'center': [59.95, 29.0 + 5 / 60]}),
+    ('/ZONA 5957N02905E 6000N03000E 6000N02905E/',
+     {'polygon': [[59.95, 29.0 + 5 / 60], [60.0, 30.0], [60.0, 29.0 + 5 / 60]]}),
+])
+def test_zone(text, expected):
+    assert TelegramParser.parse_shr_message(f'(SHR-ZZZZZ -ZZZZ0600 {text}SID/1)')['zone'] == expected
+
+
+def test_route_path():
+    route = TelegramParser.parse_route('5957N02905E 6000N03000E')
+    assert route['path'] == [[59.95, 29.0 + 5 / 60], [60.0, 30.0]]
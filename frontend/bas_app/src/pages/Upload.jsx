@@ -4,10 +4,77 @@ import toast from 'react-hot-toast';
 import { CloudArrowUpIcon, DocumentTextIcon, TableCellsIcon } from '@heroicons/react/24/outline';
 import api from '../services/api';
 
+const JOB_POLL_INTERVAL = 2000;
+// Опрос прекращается после ошибок подряд или через час
+const JOB_POLL_MAX_ERRORS = 5;
+const JOB_POLL_MAX_ATTEMPTS = 1800;
+
+const JOB_STATUS = {
+  queued: { label: 'В очереди', className: 'bg-gray-100 text-gray-800' },
+  running: { label: 'Обрабатывается', className: 'bg-blue-100 text-blue-800' },
+  completed: { label: 'Готово', className: 'bg-green-100 text-green-800' },
+  failed: { label: 'Ошибка', className: 'bg-red-100 text-red-800' }
+};
+
 const Upload = () => {
   const [uploading, setUploading] = useState(false);
   const [uploadHistory, setUploadHistory] = useState([]);
 
+  const updateHistory = (jobId, job) => {
+    setUploadHistory(prev => prev.map(item => item.jobId === jobId ? {
+      ...item,
+      status: job.status,
+      processed: job.processed,
+      error: job.error,
+      warning: job.warning
+    } : item));
+  };
+
+  const stopPolling = (jobId, filename, message) => {
+    updateHistory(jobId, { status: 'failed', processed: 0, error: message });
+    toast.error(`${filename}: ${message}`);
+  };
+
+  // Опрос состояния задачи, пока она не завершится
+  const pollJob = async (jobId, filename, attempt = 1, errors = 0) => {
+    try {
+      const { data: job } = await api.get(`/flights/jobs/${jobId}`);
+      updateHistory(jobId, job);
+      errors = 0;
+
+      if (job.status === 'completed') {
+        if (job.warning) {
+          toast(`${filename}: ${job.warning}`, { icon: '⚠️' });
+        } else {
+          toast.success(`${filename}: обработано ${job.processed} записей`);
+        }
+        return;
+      }
+      if (job.status === 'failed') {
+        toast.error(`${filename}: ${job.error || 'ошибка обработки'}`);
+        return;
+      }
+    } catch (error) {
+      console.error(error);
+      // Задача удалена из хранилища (например, после перезапуска сервера)
+      if (error.response?.status === 404) {
+        stopPolling(jobId, filename, 'задача не найдена на сервере');
+        return;
+      }
+      errors += 1;
+      if (errors >= JOB_POLL_MAX_ERRORS) {
+        stopPolling(jobId, filename, 'не удалось получить состояние задачи');
+        return;
+      }
+    }
+
+    if (attempt >= JOB_POLL_MAX_ATTEMPTS) {
+      stopPolling(jobId, filename, 'превышено время ожидания задачи');
+      return;
+    }
+    setTimeout(() => pollJob(jobId, filename, attempt + 1, errors), JOB_POLL_INTERVAL);
+  };
+
   const handleUpload = async (files, type) => {
     setUploading(true);
     const formData = new FormData();
@@ -16,17 +83,22 @@ const Upload = () => {
     try {
       const endpoint = type === 'excel' ? '/flights/upload/excel' : '/flights/upload/shr';
       const response = await api.post(endpoint, formData);
+      const job = response.data;
       
-      toast.success(`Успешно обработано: ${response.data.processed} записей`);
+      toast.success(`Файл принят в обработку, задача ${job.job_id}`);
       
       setUploadHistory(prev => [{
         id: Date.now(),
         filename: files[0].name,
         type,
-        processed: response.data.processed,
+        processed: job.processed,
+        jobId: job.job_id,
         timestamp: new Date().toISOString(),
-        status: 'success'
+        status: job.status,
+        error: job.error
       }, ...prev]);
+
+      pollJob(job.job_id, files[0].name);
     } catch (error) {
       toast.error('Ошибка при загрузке файла');
       console.error(error);
@@ -144,12 +216,23 @@ const Upload = () => {
                   <div>
                     <p className="text-sm font-medium text-gray-900">{item.filename}</p>
                     <p className="text-xs text-gray-500">
-                      {new Date(item.timestamp).toLocaleString('ru-RU')}
+                      {new Date(item.timestamp).toLocaleString('ru-RU')} · задача {item.jobId}
                     </p>
+                    {item.error && (
+                      <p className="text-xs text-red-600">{item.error}</p>
+                    )}
+                    {item.warning && (
+                      <p className="text-xs text-yellow-700">{item.warning}</p>
+                    )}
                   </div>
-                  <div className="flex items-center">
-                    <span className="px-2 py-1 text-xs font-medium bg-green-100 text-green-800 rounded-full">
-                      {item.processed} записей
+                  <div className="flex items-center space-x-2">
+                    {item.status === 'completed' && (
+                      <span className="text-xs text-gray-600">{item.processed} записей</span>
+                    )}
+                    <span className={`px-2 py-1 text-xs font-medium rounded-full ${
+                      (JOB_STATUS[item.status] || JOB_STATUS.queued).className
+                    }`}>
+                      {(JOB_STATUS[item.status] || JOB_STATUS.queued).label}
                     </span>
                   </div>
                 </div>